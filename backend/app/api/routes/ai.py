@@ -2,14 +2,34 @@
 AI Routes - Mock版本 + OpenAI Proxy
 """
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+import asyncio
+import json
 import os
-import tempfile
-import math
-from openai import OpenAI
-from pydub import AudioSegment
-
+import orjson
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.services.audio_service import (
+    UploadTooLargeError,
+    cleanup_segments,
+    save_audio_upload,
+    split_audio_file,
+)
+from app.services.constraint_parser import coerce_constraint, parse_constraints
+from app.services.import_service import NDJSON_MEDIA_TYPE
+from app.services.llm_cache_service import get_llm_cache, is_cacheable, llm_cache_key, normalize_prompt
+from app.services.openai_service import chat_json, get_openai_client, transcribe_file
+from app.services.prompt_service import (
+    PromptTemplate,
+    get_template,
+    list_templates,
+    record_usage,
+    usage_summary,
+)
 from app.services.mock_ai_service import (
     generate_mock_insight,
     generate_schedule_suggestions,
@@ -21,11 +41,6 @@ from app.api.routes.auth import get_current_user
 
 router = APIRouter()
 
-# Initialize OpenAI client (API key from environment variable)
-openai_client = None
-if os.getenv("OPENAI_API_KEY"):
-    openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 
 class InsightRequest(BaseModel):
     content: str
@@ -149,7 +164,7 @@ async def ai_health_check():
         "service": "mock-ai",
         "version": "1.0.0",
         "note": "Mock AI服务运行正常",
-        "openai_configured": openai_client is not None
+        "openai_configured": get_openai_client() is not None
     }
 
 
@@ -158,11 +173,19 @@ async def ai_health_check():
 # ============================================
 
 class ConstraintParseRequest(BaseModel):
-    """Request body for parsing student constraints"""
-    system_prompt: str
-    user_prompt: str
+    """
+    Request body for parsing student constraints
+
+    Either template_id (see /ai/prompt-templates) with its variables, or an
+    explicit system_prompt and user_prompt.
+    """
+    template_id: Optional[str] = None
+    variables: Dict[str, Optional[str]] = {}
+    system_prompt: Optional[str] = None
+    user_prompt: Optional[str] = None
     model: str = "gpt-4o-mini"
     temperature: float = 0
+    bypass_cache: bool = False
 
 
 class ConstraintParseResponse(BaseModel):
@@ -170,6 +193,67 @@ class ConstraintParseResponse(BaseModel):
     content: str
     model: str
     usage: Dict
+    cached: Optional[str] = None
+
+
+def openai_not_configured() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail={
+            "error": "OpenAI API not configured on server",
+            "message": "请在服务器端配置 OPENAI_API_KEY 环境变量",
+            "instructions": [
+                "1. 在后端添加 OPENAI_API_KEY 到环境变量",
+                "2. 在 docker-compose.yml 的 backend 服务中添加环境变量",
+                "3. 重启后端服务"
+            ]
+        }
+    )
+
+
+def resolve_template(template_id: Optional[str]) -> Optional[PromptTemplate]:
+    if not template_id:
+        return None
+    template = get_template(template_id)
+    if template is None:
+        raise HTTPException(status_code=404, detail=f"Unknown prompt template: {template_id}")
+    return template
+
+
+async def cached_openai_json(
+    system_prompt: str, user_prompt: str, model: str, temperature: float, bypass_cache: bool = False,
+    usage_key: str = "custom"
+) -> Dict:
+    """
+    chat_json behind the LLM cache
+
+    Returns {content, model, usage, cached}; cached is "memory", "mongo" or
+    None. With bypass_cache the provider is always called and the cached
+    entry is refreshed. Token usage is accounted under usage_key (the
+    template key, or "custom" for client-supplied prompts).
+    """
+    cache = get_llm_cache()
+    db = get_database()
+    key = llm_cache_key(system_prompt, user_prompt, model, temperature) if is_cacheable(temperature) else None
+    if key and not bypass_cache:
+        hit = await cache.get(db, key)
+        if hit:
+            value, level = hit
+            await record_usage(db, usage_key, None, cache_hit=True)
+            return {**value, "cached": level}
+    elif key:
+        cache.record_bypass()
+    
+    response = await chat_json(system_prompt, user_prompt, model, temperature)
+    await record_usage(db, usage_key, response["usage"])
+    if key:
+        try:
+            json.loads(response["content"])
+        except (TypeError, ValueError):
+            pass  # never cache a malformed completion
+        else:
+            await cache.put(db, key, response, model)
+    return {**response, "cached": None}
 
 
 @router.post("/openai/parse-constraint")
@@ -181,7 +265,8 @@ async def parse_constraint_with_openai(request: ConstraintParseRequest):
     Frontend calls this endpoint, which then calls OpenAI API.
     
     Args:
-        request: Contains system_prompt, user_prompt, model, and temperature
+        request: Contains template_id and variables (or system_prompt and
+            user_prompt), model, and temperature
     
     Returns:
         Parsed constraint as JSON string
@@ -189,45 +274,23 @@ async def parse_constraint_with_openai(request: ConstraintParseRequest):
     Raises:
         HTTPException: If OpenAI client is not configured or API call fails
     """
+    template = resolve_template(request.template_id)
+    if template:
+        system_prompt, user_prompt = template.render(request.variables)
+    elif request.system_prompt and request.user_prompt:
+        system_prompt, user_prompt = request.system_prompt, request.user_prompt
+    else:
+        raise HTTPException(status_code=400, detail="template_id or both system_prompt and user_prompt are required")
+    
     # Check if OpenAI is configured
-    if not openai_client:
-        raise HTTPException(
-            status_code=503,
-            detail={
-                "error": "OpenAI API not configured on server",
-                "message": "请在服务器端配置 OPENAI_API_KEY 环境变量",
-                "instructions": [
-                    "1. 在后端添加 OPENAI_API_KEY 到环境变量",
-                    "2. 在 docker-compose.yml 的 backend 服务中添加环境变量",
-                    "3. 重启后端服务"
-                ]
-            }
-        )
+    if not get_openai_client():
+        raise openai_not_configured()
     
     try:
-        # Call OpenAI API
-        response = openai_client.chat.completions.create(
-            model=request.model,
-            messages=[
-                {"role": "system", "content": request.system_prompt},
-                {"role": "user", "content": request.user_prompt}
-            ],
-            temperature=request.temperature,
-            response_format={"type": "json_object"}
+        return await cached_openai_json(
+            system_prompt, user_prompt, request.model, request.temperature, request.bypass_cache,
+            template.key if template else "custom"
         )
-        
-        # Extract response
-        content = response.choices[0].message.content
-        
-        return {
-            "content": content,
-            "model": response.model,
-            "usage": {
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens
-            }
-        }
     
     except Exception as e:
         # Log the error (in production, use proper logging)
@@ -243,62 +306,267 @@ async def parse_constraint_with_openai(request: ConstraintParseRequest):
         )
 
 
+@router.get("/openai/cache-stats")
+async def get_llm_cache_stats():
+    """LLM 解析缓存命中统计（当前进程）"""
+    return get_llm_cache().metrics()
+
+
+@router.get("/prompt-templates")
+async def get_prompt_templates():
+    """服务端提示词模板（id、版本、前缀指纹）"""
+    return {"templates": list_templates()}
+
+
+@router.get("/prompt-templates/usage")
+async def get_prompt_template_usage(days: int = 30):
+    """按模板汇总最近 days 天的 token 用量（含前缀缓存命中的 cachedPromptTokens）"""
+    db = get_database()
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not connected")
+    since = (datetime.utcnow() - timedelta(days=max(days, 1) - 1)).strftime("%Y-%m-%d")
+    return {"since": since, "templates": await usage_summary(db, since)}
+
+
 # ============================================
-# Whisper Audio Transcription with Segmentation
+# Rule-based Constraint Parsing (batch)
 # ============================================
 
-def split_audio_file(file_path: str, max_size_mb: float = 24) -> List[str]:
+class ConstraintBatchItem(BaseModel):
+    """One student's time-preference text (user_prompt overrides the rendered template)"""
+    id: Optional[str] = None
+    text: str = ""
+    user_prompt: Optional[str] = None
+    student_name: Optional[str] = None
+    campus: Optional[str] = None
+
+
+# Templates whose reply is a single {allowedDays, allowedTimeRanges, ...} constraint
+ESCALATION_TEMPLATES = ("constraint-parsing",)
+
+
+class ConstraintBatchRequest(BaseModel):
     """
-    Split audio file into segments under max_size_mb.
+    Texts to parse with the rule-based parser
+
+    Results below settings.constraint_llm_threshold are escalated to OpenAI
+    when escalate is set, a template_id or system_prompt is given and the
+    server has a key. user_prompt_template may use {studentName}, {campus}
+    and {nlText}. Only templates in ESCALATION_TEMPLATES are accepted: the
+    reply must have the rule parser's constraint shape.
+    """
+    items: List[ConstraintBatchItem]
+    escalate: bool = True
+    template_id: Optional[str] = None
+    system_prompt: Optional[str] = None
+    user_prompt_template: Optional[str] = None
+    model: str = "gpt-4o-mini"
+    temperature: float = 0
+    bypass_cache: bool = False
+
+
+def render_user_prompt(template: Optional[str], item: ConstraintBatchItem) -> str:
+    if item.user_prompt:
+        return item.user_prompt
+    if not template:
+        return item.text
+    return (template
+            .replace("{studentName}", item.student_name or "未知学生")
+            .replace("{campus}", item.campus or "未知校区")
+            .replace("{nlText}", item.text or "无约束"))
+
+
+def item_prompts(
+    template: Optional[PromptTemplate], system_prompt: Optional[str],
+    user_prompt_template: Optional[str], item: ConstraintBatchItem
+) -> Tuple[str, str]:
+    """(system, user) prompts for one batch item"""
+    if template is None:
+        return system_prompt, render_user_prompt(user_prompt_template, item)
+    if item.user_prompt:
+        return template.system, item.user_prompt
+    return template.render({"studentName": item.student_name, "campus": item.campus, "nlText": item.text})
+
+
+@router.post("/parse-constraints/batch")
+async def parse_constraints_batch(
+    request: ConstraintBatchRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    批量规则解析学生时间偏好（rawData）
+
+    规则解析每秒可处理数千条，相同文本只解析一次；大批量时分发到进程池。
+    置信度低于阈值的结果（含具体日期、未识别表达等）才调用 LLM，
+    LLM 失败时保留规则结果并附带 llmError。
+    """
+    if len(request.items) > settings.constraint_batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.constraint_batch_max_items} items per batch"
+        )
     
-    Args:
-        file_path: Path to audio file
-        max_size_mb: Maximum size per segment in MB
+    template = resolve_template(request.template_id)
+    if template and template.id not in ESCALATION_TEMPLATES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Template {template.id} cannot be used for escalation; use one of {', '.join(ESCALATION_TEMPLATES)}"
+        )
+    texts = [item.text for item in request.items]
+    parsed = await parse_constraints(
+        texts, settings.constraint_parse_pool_min, settings.constraint_parse_workers
+    )
+    results = [dict(result) for result in parsed]
     
-    Returns:
-        List of temporary file paths for segments
-    """
-    try:
-        # Load audio file
-        audio = AudioSegment.from_file(file_path)
-        
-        # Get file size
-        file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
-        
-        # If file is small enough, return as is
-        if file_size_mb <= max_size_mb:
-            return [file_path]
-        
-        # Calculate number of segments needed
-        num_segments = math.ceil(file_size_mb / max_size_mb)
-        
-        # Calculate segment duration
-        total_duration_ms = len(audio)
-        segment_duration_ms = total_duration_ms // num_segments
+    escalate = [
+        index for index, result in enumerate(results)
+        if result["confidence"] < settings.constraint_llm_threshold
+    ]
+    llm_failed = 0
+    if escalate and request.escalate and (template or request.system_prompt) and get_openai_client():
+        # One LLM call per distinct prompt
+        system_prompt = template.system if template else request.system_prompt
+        prompts: Dict[str, List[int]] = {}
+        for index in escalate:
+            _, user_prompt = item_prompts(
+                template, request.system_prompt, request.user_prompt_template, request.items[index]
+            )
+            prompts.setdefault(user_prompt, []).append(index)
+        semaphore = asyncio.Semaphore(settings.constraint_llm_concurrency)
         
-        # Split audio
-        segment_paths = []
-        file_ext = os.path.splitext(file_path)[1]
+        async def escalate_prompt(user_prompt: str, indexes: List[int]):
+            nonlocal llm_failed
+            async with semaphore:
+                try:
+                    response = await cached_openai_json(
+                        system_prompt, user_prompt, request.model, request.temperature,
+                        request.bypass_cache, template.key if template else "custom"
+                    )
+                    constraint = coerce_constraint(json.loads(response["content"]))
+                except Exception as e:
+                    llm_failed += len(indexes)
+                    for index in indexes:
+                        results[index]["llmError"] = str(e)
+                    return
+            for index in indexes:
+                results[index] = dict(constraint)
         
-        for i in range(num_segments):
-            start_ms = i * segment_duration_ms
-            end_ms = (i + 1) * segment_duration_ms if i < num_segments - 1 else total_duration_ms
-            
-            segment = audio[start_ms:end_ms]
-            
-            # Export segment
-            temp_segment = tempfile.NamedTemporaryFile(suffix=file_ext, delete=False)
-            segment.export(temp_segment.name, format=file_ext[1:])  # Remove dot from extension
-            segment_paths.append(temp_segment.name)
-            temp_segment.close()
-        
-        return segment_paths
+        await asyncio.gather(*(escalate_prompt(prompt, indexes) for prompt, indexes in prompts.items()))
     
-    except Exception as e:
-        print(f"Audio splitting error: {str(e)}")
-        raise
+    for item, result in zip(request.items, results):
+        result["id"] = item.id
+    return {
+        "results": results,
+        "stats": {
+            "total": len(results),
+            "unique": len(set(texts)),
+            "lowConfidence": len(escalate),
+            "llmParsed": sum(1 for result in results if result["source"] == "llm"),
+            "llmFailed": llm_failed,
+        }
+    }
 
 
+# ============================================
+# OpenAI Constraint Parsing (batch, streamed)
+# ============================================
+
+class OpenAIBatchRequest(BaseModel):
+    """Many students parsed with one template (or one explicit system prompt)"""
+    items: List[ConstraintBatchItem]
+    template_id: Optional[str] = None
+    system_prompt: Optional[str] = None
+    user_prompt_template: Optional[str] = None
+    model: str = "gpt-4o-mini"
+    temperature: float = 0
+    bypass_cache: bool = False
+
+
+@router.post("/openai/parse-constraints/batch")
+async def parse_constraints_batch_with_openai(
+    request: OpenAIBatchRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    批量 LLM 解析，按完成顺序以 NDJSON 流式返回
+
+    规范化后相同的 rawData（且校区相同）只请求一次，结果分发给所有对应条目。请求并发受进程级
+    信号量与令牌桶限制，总耗时接近 条目数 / 并发上限 × 单次延迟。
+    每行：{"type": "result", "index", "id", "content", "cached"} 或
+    {"type": "error", "index", "id", "message"}，最后一行 {"type": "done", ...统计}。
+    """
+    template = resolve_template(request.template_id)
+    if template is None and not request.system_prompt:
+        raise HTTPException(status_code=400, detail="template_id or system_prompt is required")
+    if not get_openai_client():
+        raise openai_not_configured()
+    if len(request.items) > settings.constraint_batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.constraint_batch_max_items} items per batch"
+        )
+    usage_key = template.key if template else "custom"
+    
+    # Items sharing a text and campus share one call (the prompt derives campus
+    # constraints from {campus}), unless their prompts are overridden
+    groups: Dict[tuple, List[int]] = {}
+    for index, item in enumerate(request.items):
+        if item.user_prompt or not item.text.strip():
+            key = ("prompt", normalize_prompt(
+                item_prompts(template, request.system_prompt, request.user_prompt_template, item)[1]
+            ))
+        else:
+            key = ("text", normalize_prompt(item.text), (item.campus or "").strip())
+        groups.setdefault(key, []).append(index)
+    
+    async def parse_group(indexes: List[int]):
+        system_prompt, user_prompt = item_prompts(
+            template, request.system_prompt, request.user_prompt_template, request.items[indexes[0]]
+        )
+        try:
+            response = await cached_openai_json(
+                system_prompt, user_prompt, request.model, request.temperature, request.bypass_cache, usage_key
+            )
+            return indexes, response, None
+        except Exception as e:
+            return indexes, None, e
+    
+    async def stream():
+        stats = {"total": len(request.items), "unique": len(groups), "cached": 0, "failed": 0, "totalTokens": 0}
+        tasks = [asyncio.create_task(parse_group(indexes)) for indexes in groups.values()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                indexes, response, error = await next_done
+                if error is None:
+                    if response["cached"]:
+                        stats["cached"] += 1
+                    else:
+                        stats["totalTokens"] += response["usage"]["total_tokens"]
+                else:
+                    stats["failed"] += 1
+                lines = []
+                for index in indexes:
+                    item = request.items[index]
+                    if error is None:
+                        line = {"type": "result", "index": index, "id": item.id,
+                                "content": response["content"], "cached": response["cached"]}
+                    else:
+                        line = {"type": "error", "index": index, "id": item.id,
+                                "message": str(error), "errorType": type(error).__name__}
+                    lines.append(orjson.dumps(line) + b"\n")
+                yield b"".join(lines)
+            yield orjson.dumps({"type": "done", **stats}) + b"\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
+
+# ============================================
+# Whisper Audio Transcription with Segmentation
+# ============================================
+
 @router.post("/whisper/transcribe")
 async def transcribe_audio(
     file: UploadFile = File(...),
@@ -308,6 +576,9 @@ async def transcribe_audio(
     Transcribe audio file using OpenAI Whisper API.
     Supports files up to 100MB by automatic segmentation.
     
+    The upload is streamed to disk and segments are cut with ffmpeg stream
+    copy, so memory use does not grow with the file size.
+    
     Args:
         file: Audio file (mp3, mp4, mpeg, mpga, m4a, wav, webm)
     
@@ -318,7 +589,7 @@ async def transcribe_audio(
         HTTPException: If OpenAI client is not configured or transcription fails
     """
     # Check if OpenAI is configured
-    if not openai_client:
+    if not get_openai_client():
         raise HTTPException(
             status_code=503,
             detail={
@@ -341,32 +612,26 @@ async def transcribe_audio(
             }
         )
     
-    # Check file size (100MB absolute limit)
-    max_size = 100 * 1024 * 1024  # 100MB
-    file_content = await file.read()
-    file_size = len(file_content)
-    
-    if file_size > max_size:
+    # Stream to disk; rejected as soon as it passes the limit (100MB)
+    try:
+        temp_file_path, file_size = await save_audio_upload(
+            file, settings.whisper_max_upload_mb * 1024 * 1024
+        )
+    except UploadTooLargeError:
         raise HTTPException(
             status_code=400,
             detail={
                 "error": "File too large",
-                "message": "文件大小不能超过100MB",
-                "size": f"{file_size / 1024 / 1024:.2f}MB"
+                "message": f"文件大小不能超过{settings.whisper_max_upload_mb}MB",
+                "size": f">{settings.whisper_max_upload_mb}MB"
             }
         )
     
-    temp_file_path = None
     segment_paths = []
     
     try:
-        # Create temporary file for original audio
-        with tempfile.NamedTemporaryFile(suffix=file_ext, delete=False) as temp_file:
-            temp_file.write(file_content)
-            temp_file_path = temp_file.name
-        
         # Split audio into segments if necessary (24MB per segment)
-        segment_paths = split_audio_file(temp_file_path, max_size_mb=24)
+        segment_paths = await split_audio_file(temp_file_path, settings.whisper_segment_mb)
         
         # Transcribe each segment
         transcriptions = []
@@ -375,42 +640,21 @@ async def transcribe_audio(
         previous_text = ""  # For context prompt
         
         for i, segment_path in enumerate(segment_paths):
-            with open(segment_path, 'rb') as audio_file:
-                # Use previous segment's text as prompt for context continuity
-                transcript_params = {
-                    "model": "whisper-1",
-                    "file": audio_file,
-                    "response_format": "verbose_json"
-                }
-                
-                # Add prompt for context (helps with continuity across segments)
-                if previous_text and i > 0:
-                    # Use last 200 chars as prompt
-                    transcript_params["prompt"] = previous_text[-200:]
-                
-                transcript = openai_client.audio.transcriptions.create(**transcript_params)
-                
-                transcriptions.append(transcript.text)
-                total_duration += transcript.duration
-                
-                if not detected_language:
-                    detected_language = transcript.language
-                
-                previous_text = transcript.text
+            # Use previous segment's text (last 200 chars) as prompt for context continuity
+            prompt = previous_text[-200:] if previous_text and i > 0 else None
+            transcript = await transcribe_file(segment_path, prompt)
+            
+            transcriptions.append(transcript.text)
+            total_duration += transcript.duration
+            
+            if not detected_language:
+                detected_language = transcript.language
+            
+            previous_text = transcript.text
         
         # Combine all transcriptions
         full_text = " ".join(transcriptions)
         
-        # Clean up temporary files
-        if temp_file_path and temp_file_path not in segment_paths:
-            os.unlink(temp_file_path)
-        
-        for segment_path in segment_paths:
-            try:
-                os.unlink(segment_path)
-            except:
-                pass
-        
         return {
             "text": full_text,
             "language": detected_language,
@@ -422,19 +666,6 @@ async def transcribe_audio(
         }
     
     except Exception as e:
-        # Clean up temporary files if exists
-        if temp_file_path:
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
-        
-        for segment_path in segment_paths:
-            try:
-                os.unlink(segment_path)
-            except:
-                pass
-        
         print(f"Whisper API Error: {str(e)}")
         
         raise HTTPException(
@@ -445,4 +676,7 @@ async def transcribe_audio(
                 "type": type(e).__name__
             }
         )
-
+    
+    finally:
+        # Clean up temporary files
+        cleanup_segments(temp_file_path, segment_paths)
@@ -6,25 +6,81 @@ Scheduling Data API Routes
 支持多租户架构，通过JWT token获取userId进行数据隔离
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Optional
-from datetime import datetime
+import asyncio
+import os
+from fastapi import (
+    APIRouter, Depends, HTTPException, Header, Query, Response, status,
+    WebSocket, WebSocketDisconnect, UploadFile, File
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import Iterator, List, Optional
+from datetime import date, datetime
+import orjson
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 from app.models.scheduling import (
     StudentBase, StudentInDB, StudentResponse,
     TeacherBase, TeacherInDB, TeacherResponse,
     ClassroomBase, ClassroomInDB, ClassroomResponse,
     ScheduledCourseBase, ScheduledCourseInDB, ScheduledCourseResponse,
-    SchedulingMetadataBase, SchedulingMetadataInDB,
-    AdjustmentRecordBase, AdjustmentRecordInDB,
+    SchedulingMetadataBase, SchedulingMetadataInDB, SchedulingMetadataResponse,
+    AdjustmentRecordBase, AdjustmentRecordInDB, AdjustmentStateResponse,
     UserCountersInDB,
     BatchStudentCreate, BatchTeacherCreate, BatchClassroomCreate,
+    BatchSyncRequest, BatchSyncResponse, BatchDeleteRequest, BatchDeleteResponse,
+    PublishSessionRequest, PublishSessionResponse,
     ScheduledCourseFilter
 )
 from app.core.config import settings
 from app.api.routes.auth import get_current_user
+from app.services.auth_service import decode_token, get_user_by_id
+from app.services.live_updates import get_change_broadcaster
 from app.models.user import UserInDB
+from app.services.course_hours_service import (
+    hours_delta, merge_deltas, apply_hours_delta,
+    session_hours_by_student, reconcile_course_hours, total_hours_update
+)
+from app.services.teacher_hours_service import (
+    GROUP_BY_OPTIONS, refresh_teacher_hours_summary, get_teacher_hours_rows,
+    rollup_teacher_hours, report_table
+)
+from app.services.utilization_service import (
+    refresh_utilization_summary, get_utilization_summary
+)
+from app.services.sync_service import SYNC_COLLECTIONS, sync_collection
+from app.services.versioning_service import (
+    VersionConflictError, make_etag, parse_if_match, update_versioned
+)
+from app.services.listing_service import build_projection, apply_cursor, stream_page, iter_json_array
+from app.services.columnar_service import is_columnar_session, iter_columnar_courses
+from app.services.archive_service import (
+    archive_session, restore_session, is_archived_session, iter_archived_courses
+)
+from app.services.change_log_service import (
+    SYNCED_COLLECTIONS, get_changes, record_session_deletion,
+    to_watermark
+)
+from app.services.tabular_export import attachment_headers, tabular_response
+from app.services.export_service import (
+    EXPORT_FIELDS, EXPORT_FORMATS, EXPORT_MEDIA_TYPES, export_cache_key, export_filename,
+    get_export_cache, iter_csv_bytes, iter_ics_bytes, monday_of, session_version, tee_to_cache,
+    write_xlsx_file
+)
+from app.services.session_service import (
+    get_active_session_id, iter_session_courses, publish_session,
+    record_session_write, list_sessions, get_session, prune_sessions, is_retired_session
+)
+from app.services.adjustment_log_service import (
+    append_events, get_log_head, move_position, seq_at_time, state_at
+)
+from app.services.cascade_service import REFERENCES, delete_entities
+from app.services.import_service import (
+    NDJSON_MEDIA_TYPE, ImportFormatError, RowImporter, existing_keys, import_entities, iter_file_rows, save_upload
+)
+from app.services.counter_service import COUNTER_FIELDS, counter_names, reserve_counter_range
+from app.services.session_diff_service import DIFF_FIELDS, SessionDiff, kpi_delta, room_utilization
 
 router = APIRouter()
 
@@ -41,22 +97,132 @@ def get_db():
     return db
 
 
+# ============================================================================
+# 物化统计 (Materialized Session Summaries)
+# ============================================================================
+
+async def refresh_session_summaries(db, user_id: str, schedule_session_id: str):
+    """排课会话写入后刷新物化统计（教师课时、占用率）"""
+    await refresh_teacher_hours_summary(db, user_id, schedule_session_id)
+    await refresh_utilization_summary(db, user_id, schedule_session_id)
+
+
+# ============================================================================
+# 列表分页 (Projected, Keyset-Paginated Listing)
+# ============================================================================
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+ACTIVE_SESSION_HEADER = "X-Schedule-Session-Id"
+
+
+def page_size_query():
+    """每页条数参数（可选；省略时返回全部数据，上限见配置）"""
+    return Query(None, ge=1, le=settings.list_max_page_size)
+
+
+async def list_page(collection, query: dict, model, fields: Optional[str],
+                    cursor: Optional[str], limit: Optional[int]) -> StreamingResponse:
+    """
+    读取一页数据，直接将 Mongo 文档流式编码为 JSON 数组
+
+    文档均由本模块按响应模型写入，属于可信数据，因此跳过逐条模型校验。
+    下一页游标通过 X-Next-Cursor 响应头返回（最后一页不返回）。
+    """
+    try:
+        projection = build_projection(fields, model)
+        query = apply_cursor(query, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    body, next_cursor = await stream_page(collection, query, projection, limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    return StreamingResponse(body, media_type="application/json", headers=headers)
+
+
+async def packed_courses_response(reader, db, user_id: str, schedule_session_id: str, filters: dict,
+                                  fields: Optional[str], cursor: Optional[str]) -> StreamingResponse:
+    """
+    列式存储/归档会话：逐块解码并流式输出（过滤在打包列上完成）
+
+    reader 为 iter_columnar_courses 或 iter_archived_courses。
+    这类会话一次读取整个会话（块数很少），不支持游标分页。
+    """
+    if cursor:
+        raise HTTPException(status_code=400, detail="Columnar and archived sessions are returned in one page")
+    try:
+        projection = build_projection(fields, ScheduledCourseResponse)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    names = [name for name in projection if name != "_id"] if fields else None
+    courses = reader(db, user_id, schedule_session_id, filters, names)
+    return StreamingResponse(iter_json_array(courses), media_type="application/json")
+
+
+# ============================================================================
+# 乐观并发控制 (Optimistic Concurrency via ETag / If-Match)
+# ============================================================================
+
+def expected_version_from(if_match: Optional[str]) -> Optional[int]:
+    """解析 If-Match 请求头中的期望版本号"""
+    try:
+        return parse_if_match(if_match)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+
+
+async def update_entity_versioned(collection, entity_id: str, user_id: str,
+                                  fields: dict, if_match: Optional[str], label: str,
+                                  increments: Optional[dict] = None) -> dict:
+    """单次往返的版本化更新：404 不存在，412 版本冲突"""
+    if not ObjectId.is_valid(entity_id):
+        raise HTTPException(status_code=400, detail=f"Invalid {label.lower()} ID")
+    
+    try:
+        updated = await update_versioned(
+            collection, ObjectId(entity_id), user_id, fields,
+            expected_version=expected_version_from(if_match), increments=increments
+        )
+    except VersionConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail={"error": f"{label} was modified by someone else", "currentVersion": e.current_version},
+            headers={"ETag": make_etag(e.current_version or 1)}
+        )
+    
+    if not updated:
+        raise HTTPException(status_code=404, detail=f"{label} not found")
+    
+    updated["id"] = str(updated.pop("_id"))
+    return updated
+
+
+async def reserve_default_names(db, user_id: str, counter_type: str, entities: list) -> Iterator[str]:
+    """Names for every blank-named entity of a batch, from one counter reservation"""
+    blank = sum(1 for entity in entities if not entity.name.strip())
+    if not blank:
+        return iter(())
+    start, end, _ = await reserve_counter_range(db, user_id, counter_type, blank)
+    return iter(counter_names(counter_type, start, end))
+
+
 # ============================================================================
 # 学生API (Students API)
 # ============================================================================
 
 @router.get("/students", response_model=List[StudentResponse])
 async def get_students(
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = page_size_query(),
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """获取当前用户的所有学生"""
-    students = []
-    cursor = db.students.find({"userId": current_user["id"]})
-    async for doc in cursor:
-        doc["id"] = str(doc.pop("_id"))
-        students.append(StudentResponse(**doc))
-    return students
+    """获取当前用户的学生（支持 fields 投影和游标分页）"""
+    return await list_page(
+        db.students, {"userId": str(current_user["id"])}, StudentResponse,
+        fields, cursor, limit
+    )
 
 
 @router.post("/students", response_model=StudentResponse, status_code=status.HTTP_201_CREATED)
@@ -83,11 +249,14 @@ async def create_students_batch(
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """批量创建学生"""
+    """批量创建学生（name 为空的学生按预留的计数器区间自动命名）"""
+    names = await reserve_default_names(db, str(current_user["id"]), "student", batch.students)
     students_to_insert = []
     for student in batch.students:
         student_dict = student.model_dump()
-        student_dict["userId"] = current_user["id"]
+        if not student_dict["name"].strip():
+            student_dict["name"] = next(names)
+        student_dict["userId"] = str(current_user["id"])
         student_dict["createdAt"] = datetime.utcnow()
         student_dict["updatedAt"] = datetime.utcnow()
         student_dict["version"] = 1
@@ -107,21 +276,28 @@ async def create_students_batch(
 @router.get("/students/{student_id}", response_model=StudentResponse)
 async def get_student(
     student_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(default=None),
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """获取单个学生"""
+    """获取单个学生（ETag 为版本号，支持 If-None-Match）"""
     if not ObjectId.is_valid(student_id):
         raise HTTPException(status_code=400, detail="Invalid student ID")
     
     doc = await db.students.find_one({
         "_id": ObjectId(student_id),
-        "userId": str(current_user.id)
+        "userId": str(current_user["id"])
     })
     
     if not doc:
         raise HTTPException(status_code=404, detail="Student not found")
     
+    etag = make_etag(doc.get("version", 1))
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    response.headers["ETag"] = etag
     doc["id"] = str(doc.pop("_id"))
     return StudentResponse(**doc)
 
@@ -130,39 +306,31 @@ async def get_student(
 async def update_student(
     student_id: str,
     student: StudentBase,
+    response: Response,
+    if_match: Optional[str] = Header(default=None),
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """更新学生（支持并发版本控制）"""
-    if not ObjectId.is_valid(student_id):
-        raise HTTPException(status_code=400, detail="Invalid student ID")
-    
-    # 获取当前版本
-    existing = await db.students.find_one({
-        "_id": ObjectId(student_id),
-        "userId": str(current_user.id)
-    })
-    
-    if not existing:
-        raise HTTPException(status_code=404, detail="Student not found")
-    
-    # 更新数据
-    update_dict = student.model_dump(exclude_unset=True)
-    update_dict["updatedAt"] = datetime.utcnow()
-    update_dict["version"] = existing.get("version", 1) + 1
-    
-    result = await db.students.update_one(
-        {"_id": ObjectId(student_id), "userId": str(current_user.id)},
-        {"$set": update_dict}
+    """
+    更新学生（乐观并发控制）
+
+    携带 If-Match: "<version>" 时仅在版本一致时更新，否则返回 412。
+    courseHours 只接受 totalHours，已用/剩余课时由服务端维护。
+    """
+    user_id = str(current_user["id"])
+    fields = student.model_dump(exclude_unset=True)
+    increments = None
+    if "courseHours" in fields and ObjectId.is_valid(student_id):
+        stored = await db.students.find_one(
+            {"_id": ObjectId(student_id), "userId": user_id}, {"courseHours": 1}
+        ) or {}
+        hours_set, increments = total_hours_update(fields.pop("courseHours"), stored.get("courseHours"))
+        fields.update(hours_set)
+    updated = await update_entity_versioned(
+        db.students, student_id, user_id, fields, if_match, "Student", increments
     )
-    
-    if result.modified_count == 0:
-        raise HTTPException(status_code=400, detail="Update failed")
-    
-    # 返回更新后的数据
-    updated_doc = await db.students.find_one({"_id": ObjectId(student_id)})
-    updated_doc["id"] = str(updated_doc.pop("_id"))
-    return StudentResponse(**updated_doc)
+    response.headers["ETag"] = make_etag(updated["version"])
+    return StudentResponse(**updated)
 
 
 @router.delete("/students/{student_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -171,16 +339,13 @@ async def delete_student(
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """删除学生"""
+    """删除学生（级联删除引用该学生的课程与调整历史）"""
     if not ObjectId.is_valid(student_id):
         raise HTTPException(status_code=400, detail="Invalid student ID")
     
-    result = await db.students.delete_one({
-        "_id": ObjectId(student_id),
-        "userId": str(current_user.id)
-    })
+    result = await delete_entities(db, str(current_user["id"]), "students", [student_id])
     
-    if result.deleted_count == 0:
+    if result["deleted"] == 0:
         raise HTTPException(status_code=404, detail="Student not found")
     
     return None
@@ -192,16 +357,17 @@ async def delete_student(
 
 @router.get("/teachers", response_model=List[TeacherResponse])
 async def get_teachers(
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = page_size_query(),
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """获取当前用户的所有教师"""
-    teachers = []
-    cursor = db.teachers.find({"userId": str(current_user.id)})
-    async for doc in cursor:
-        doc["id"] = str(doc.pop("_id"))
-        teachers.append(TeacherResponse(**doc))
-    return teachers
+    """获取当前用户的教师（支持 fields 投影和游标分页）"""
+    return await list_page(
+        db.teachers, {"userId": str(current_user["id"])}, TeacherResponse,
+        fields, cursor, limit
+    )
 
 
 @router.post("/teachers", response_model=TeacherResponse, status_code=status.HTTP_201_CREATED)
@@ -212,7 +378,7 @@ async def create_teacher(
 ):
     """创建新教师"""
     teacher_dict = teacher.model_dump()
-    teacher_dict["userId"] = str(current_user.id)
+    teacher_dict["userId"] = str(current_user["id"])
     teacher_dict["createdAt"] = datetime.utcnow()
     teacher_dict["updatedAt"] = datetime.utcnow()
     teacher_dict["version"] = 1
@@ -228,11 +394,14 @@ async def create_teachers_batch(
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """批量创建教师"""
+    """批量创建教师（name 为空的教师按预留的计数器区间自动命名）"""
+    names = await reserve_default_names(db, str(current_user["id"]), "teacher", batch.teachers)
     teachers_to_insert = []
     for teacher in batch.teachers:
         teacher_dict = teacher.model_dump()
-        teacher_dict["userId"] = str(current_user.id)
+        if not teacher_dict["name"].strip():
+            teacher_dict["name"] = next(names)
+        teacher_dict["userId"] = str(current_user["id"])
         teacher_dict["createdAt"] = datetime.utcnow()
         teacher_dict["updatedAt"] = datetime.utcnow()
         teacher_dict["version"] = 1
@@ -252,33 +421,18 @@ async def create_teachers_batch(
 async def update_teacher(
     teacher_id: str,
     teacher: TeacherBase,
+    response: Response,
+    if_match: Optional[str] = Header(default=None),
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """更新教师"""
-    if not ObjectId.is_valid(teacher_id):
-        raise HTTPException(status_code=400, detail="Invalid teacher ID")
-    
-    existing = await db.teachers.find_one({
-        "_id": ObjectId(teacher_id),
-        "userId": str(current_user.id)
-    })
-    
-    if not existing:
-        raise HTTPException(status_code=404, detail="Teacher not found")
-    
-    update_dict = teacher.model_dump(exclude_unset=True)
-    update_dict["updatedAt"] = datetime.utcnow()
-    update_dict["version"] = existing.get("version", 1) + 1
-    
-    await db.teachers.update_one(
-        {"_id": ObjectId(teacher_id), "userId": str(current_user.id)},
-        {"$set": update_dict}
+    """更新教师（乐观并发控制，同学生）"""
+    updated = await update_entity_versioned(
+        db.teachers, teacher_id, str(current_user["id"]),
+        teacher.model_dump(exclude_unset=True), if_match, "Teacher"
     )
-    
-    updated_doc = await db.teachers.find_one({"_id": ObjectId(teacher_id)})
-    updated_doc["id"] = str(updated_doc.pop("_id"))
-    return TeacherResponse(**updated_doc)
+    response.headers["ETag"] = make_etag(updated["version"])
+    return TeacherResponse(**updated)
 
 
 @router.delete("/teachers/{teacher_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -287,16 +441,13 @@ async def delete_teacher(
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """删除教师"""
+    """删除教师（级联删除引用该教师的课程与调整历史）"""
     if not ObjectId.is_valid(teacher_id):
         raise HTTPException(status_code=400, detail="Invalid teacher ID")
     
-    result = await db.teachers.delete_one({
-        "_id": ObjectId(teacher_id),
-        "userId": str(current_user.id)
-    })
+    result = await delete_entities(db, str(current_user["id"]), "teachers", [teacher_id])
     
-    if result.deleted_count == 0:
+    if result["deleted"] == 0:
         raise HTTPException(status_code=404, detail="Teacher not found")
     
     return None
@@ -308,16 +459,17 @@ async def delete_teacher(
 
 @router.get("/classrooms", response_model=List[ClassroomResponse])
 async def get_classrooms(
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = page_size_query(),
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """获取当前用户的所有教室"""
-    classrooms = []
-    cursor = db.classrooms.find({"userId": str(current_user.id)})
-    async for doc in cursor:
-        doc["id"] = str(doc.pop("_id"))
-        classrooms.append(ClassroomResponse(**doc))
-    return classrooms
+    """获取当前用户的教室（支持 fields 投影和游标分页）"""
+    return await list_page(
+        db.classrooms, {"userId": str(current_user["id"])}, ClassroomResponse,
+        fields, cursor, limit
+    )
 
 
 @router.post("/classrooms", response_model=ClassroomResponse, status_code=status.HTTP_201_CREATED)
@@ -328,7 +480,7 @@ async def create_classroom(
 ):
     """创建新教室"""
     classroom_dict = classroom.model_dump()
-    classroom_dict["userId"] = str(current_user.id)
+    classroom_dict["userId"] = str(current_user["id"])
     classroom_dict["createdAt"] = datetime.utcnow()
     classroom_dict["updatedAt"] = datetime.utcnow()
     
@@ -347,7 +499,7 @@ async def create_classrooms_batch(
     classrooms_to_insert = []
     for classroom in batch.classrooms:
         classroom_dict = classroom.model_dump()
-        classroom_dict["userId"] = str(current_user.id)
+        classroom_dict["userId"] = str(current_user["id"])
         classroom_dict["createdAt"] = datetime.utcnow()
         classroom_dict["updatedAt"] = datetime.utcnow()
         classrooms_to_insert.append(classroom_dict)
@@ -368,21 +520,129 @@ async def delete_classroom(
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """删除教室"""
+    """删除教室（级联删除引用该教室的课程与调整历史）"""
     if not ObjectId.is_valid(classroom_id):
         raise HTTPException(status_code=400, detail="Invalid classroom ID")
     
-    result = await db.classrooms.delete_one({
-        "_id": ObjectId(classroom_id),
-        "userId": str(current_user.id)
-    })
+    result = await delete_entities(db, str(current_user["id"]), "classrooms", [classroom_id])
     
-    if result.deleted_count == 0:
+    if result["deleted"] == 0:
         raise HTTPException(status_code=404, detail="Classroom not found")
     
     return None
 
 
+# ============================================================================
+# 批量差异同步API (Bulk Diff-Sync API)
+# ============================================================================
+
+@router.post("/{collection}/sync", response_model=BatchSyncResponse)
+async def sync_entities(
+    collection: str,
+    request: BatchSyncRequest,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    批量差异同步学生/教师/教室
+
+    客户端提交完整列表，服务端计算新增/更新/删除并通过一次无序 bulk_write 执行。
+    """
+    config = SYNC_COLLECTIONS.get(collection)
+    if config is None:
+        raise HTTPException(status_code=404, detail=f"Unknown collection: {collection}")
+    
+    plan = await sync_collection(
+        db, config, str(current_user["id"]), request.items, request.deleteMissing
+    )
+    
+    if plan.errors:
+        raise HTTPException(status_code=422, detail=plan.errors)
+    
+    return BatchSyncResponse(
+        inserted=plan.inserted,
+        updated=plan.updated,
+        deleted=plan.deleted,
+        unchanged=plan.unchanged,
+        conflicts=plan.conflicts,
+        raced=plan.raced,
+        idMap=plan.id_map,
+        versions=plan.versions
+    )
+
+
+@router.post("/{collection}/batch-delete", response_model=BatchDeleteResponse)
+async def delete_entities_batch(
+    collection: str,
+    request: BatchDeleteRequest,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    批量删除学生/教师/教室
+
+    引用这些实体的课程与调整历史在同一批 delete_many 中级联删除（副本集上为同一事务）；
+    不存在或不属于当前用户的ID被忽略。
+    """
+    if collection not in REFERENCES:
+        raise HTTPException(status_code=404, detail=f"Unknown collection: {collection}")
+    
+    result = await delete_entities(db, str(current_user["id"]), collection, request.ids)
+    return BatchDeleteResponse(**result)
+
+
+# ============================================================================
+# 导入API (Excel / CSV Import API)
+# ============================================================================
+
+@router.post("/import")
+async def import_entities_file(
+    file: UploadFile = File(...),
+    kind: Optional[str] = Query(None, pattern="^(students|teachers|classrooms)$"),
+    skip_existing: bool = True,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    从 Excel (.xlsx) / CSV 导入学生、教师或教室
+
+    kind 省略时按表头识别（学生姓名 / 老师姓名 / 教室名）。文件按行流式读取，
+    每 1000 行 insert_many 一次；响应为 NDJSON，每批一行 progress，最后一行 done
+    （含被跳过行的错误明细）。skip_existing 时跳过已导入过的行
+    （学生/教师按整行内容、教室按名称判断）。文件读不出来（损坏的 xlsx、非 UTF-8
+    的 CSV）时返回 400；读到一半才出错则以一行 error 结束流。
+    """
+    user_id = str(current_user["id"])
+    path = await save_upload(file)
+    rows = None
+    try:
+        rows = iter_file_rows(path, file.filename or "")
+        importer = await run_in_threadpool(RowImporter, rows, kind)
+        if skip_existing:
+            importer.existing_keys = await existing_keys(db, user_id, importer.kind)
+    except BaseException as e:
+        if rows is not None:
+            rows.close()
+        os.unlink(path)
+        if isinstance(e, ImportFormatError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
+    
+    async def stream():
+        try:
+            async for report in import_entities(db, user_id, importer):
+                yield orjson.dumps(report) + b"\n"
+        except ImportFormatError as e:
+            yield orjson.dumps({**importer.report.as_dict("error"), "detail": str(e)}) + b"\n"
+        else:
+            yield orjson.dumps(importer.report.as_dict("done")) + b"\n"
+        finally:
+            importer.close()
+            os.unlink(path)
+    
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
+
 # ============================================================================
 # 排课课程API (Scheduled Courses API)
 # ============================================================================
@@ -392,26 +652,77 @@ async def get_courses(
     schedule_session_id: Optional[str] = None,
     student_id: Optional[str] = None,
     teacher_id: Optional[str] = None,
+    classroom_id: Optional[str] = None,
+    day: Optional[int] = None,
+    course_status: Optional[str] = Query(None, alias="status"),
+    confirmation_status: Optional[str] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = page_size_query(),
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """获取排课课程（支持过滤）"""
-    query = {"userId": str(current_user.id)}
-    
+    """获取排课课程（支持 ScheduledCourseFilter 全部字段过滤、fields 投影和游标分页）"""
+    course_filter = ScheduledCourseFilter(
+        scheduleSessionId=schedule_session_id,
+        studentId=student_id,
+        teacherId=teacher_id,
+        classroomId=classroom_id,
+        day=day,
+        status=course_status,
+        confirmationStatus=confirmation_status
+    )
+    user_id = str(current_user["id"])
     if schedule_session_id:
-        query["scheduleSessionId"] = schedule_session_id
-    if student_id:
-        query["studentId"] = student_id
-    if teacher_id:
-        query["teacherId"] = teacher_id
+        filters = course_filter.model_dump(exclude_none=True, exclude={"scheduleSessionId"})
+        if await is_columnar_session(db, user_id, schedule_session_id):
+            return await packed_courses_response(
+                iter_columnar_courses, db, user_id, schedule_session_id, filters, fields, cursor
+            )
+        if await is_archived_session(db, user_id, schedule_session_id):
+            return await packed_courses_response(
+                iter_archived_courses, db, user_id, schedule_session_id, filters, fields, cursor
+            )
     
-    courses = []
-    cursor = db.scheduled_courses.find(query)
-    async for doc in cursor:
-        doc["id"] = str(doc.pop("_id"))
-        courses.append(ScheduledCourseResponse(**doc))
+    query = {"userId": user_id, **course_filter.model_dump(exclude_none=True)}
     
-    return courses
+    return await list_page(
+        db.scheduled_courses, query, ScheduledCourseResponse,
+        fields, cursor, limit
+    )
+
+
+@router.get("/courses/active", response_model=List[ScheduledCourseResponse])
+async def get_active_courses(
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = page_size_query(),
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    获取当前活动会话的课程
+
+    实际读取的会话ID通过 X-Schedule-Session-Id 响应头返回；翻页时应改用
+    /courses?schedule_session_id=...，避免翻页期间发布新会话导致前后页不一致。
+    """
+    user_id = str(current_user["id"])
+    session_id = await get_active_session_id(db, user_id)
+    if session_id is None:
+        raise HTTPException(status_code=404, detail="No active schedule session")
+    
+    if await is_columnar_session(db, user_id, session_id):
+        response = await packed_courses_response(
+            iter_columnar_courses, db, user_id, session_id, {}, fields, cursor
+        )
+    else:
+        response = await list_page(
+            db.scheduled_courses,
+            {"userId": user_id, "scheduleSessionId": session_id},
+            ScheduledCourseResponse, fields, cursor, limit
+        )
+    response.headers[ACTIVE_SESSION_HEADER] = session_id
+    return response
 
 
 @router.post("/courses/batch", response_model=List[ScheduledCourseResponse])
@@ -425,14 +736,25 @@ async def create_courses_batch(
     courses_to_insert = []
     for course in courses:
         course_dict = course.model_dump()
-        course_dict["userId"] = str(current_user.id)
+        course_dict["userId"] = str(current_user["id"])
         course_dict["scheduleSessionId"] = schedule_session_id
         course_dict["createdAt"] = datetime.utcnow()
+        course_dict["updatedAt"] = course_dict["createdAt"]
         courses_to_insert.append(course_dict)
     
     if courses_to_insert:
         result = await db.scheduled_courses.insert_many(courses_to_insert)
         
+        # 已确认的课程立即扣除课时（已退役会话不再计入课时）
+        if not await is_retired_session(db, str(current_user["id"]), schedule_session_id):
+            deltas = merge_deltas(*(hours_delta(None, c) for c in courses_to_insert))
+            await apply_hours_delta(db, str(current_user["id"]), deltas)
+        await record_session_write(
+            db, str(current_user["id"]), schedule_session_id,
+            len(courses_to_insert), sum(c["duration"] for c in courses_to_insert)
+        )
+        await refresh_session_summaries(db, str(current_user["id"]), schedule_session_id)
+        
         created_courses = []
         for idx, inserted_id in enumerate(result.inserted_ids):
             courses_to_insert[idx]["id"] = str(inserted_id)
@@ -450,21 +772,33 @@ async def update_course(
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """更新单个课程"""
+    """更新单个课程（确认状态变化时同步扣除/退还课时）"""
     if not ObjectId.is_valid(course_id):
         raise HTTPException(status_code=400, detail="Invalid course ID")
     
     update_dict = course.model_dump(exclude_unset=True)
+    update_dict["updatedAt"] = datetime.utcnow()
+    user_id = str(current_user["id"])
     
-    result = await db.scheduled_courses.update_one(
-        {"_id": ObjectId(course_id), "userId": str(current_user.id)},
-        {"$set": update_dict}
+    # 原子更新并取回旧文档，用于计算课时增量
+    before = await db.scheduled_courses.find_one_and_update(
+        {"_id": ObjectId(course_id), "userId": user_id},
+        {"$set": update_dict},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Course not found or no changes")
+    if not before:
+        raise HTTPException(status_code=404, detail="Course not found")
+    
+    updated_doc = {**before, **update_dict}
+    if not await is_retired_session(db, user_id, before["scheduleSessionId"]):
+        await apply_hours_delta(db, user_id, hours_delta(before, updated_doc))
+    # Always bumps the catalog updatedAt, which versions the session's export cache
+    await record_session_write(
+        db, user_id, before["scheduleSessionId"], 0, updated_doc["duration"] - before["duration"]
+    )
+    await refresh_session_summaries(db, user_id, before["scheduleSessionId"])
     
-    updated_doc = await db.scheduled_courses.find_one({"_id": ObjectId(course_id)})
     updated_doc["id"] = str(updated_doc.pop("_id"))
     return ScheduledCourseResponse(**updated_doc)
 
@@ -475,15 +809,455 @@ async def delete_course_session(
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """删除整个排课会话的所有课程"""
+    """删除整个排课会话的所有课程（退还已确认课程的课时）"""
+    await delete_session_now(db, str(current_user["id"]), schedule_session_id)
+    return None
+
+
+async def delete_session_now(db, user_id: str, schedule_session_id: str) -> bool:
+    """立即删除会话的课程、目录条目与统计（返回是否删除了课程）"""
+    # 已退役会话的课时在退役时已退还
+    retired = await is_retired_session(db, user_id, schedule_session_id)
+    refunds = {} if retired else await session_hours_by_student(db, user_id, schedule_session_id)
+    
     result = await db.scheduled_courses.delete_many({
-        "userId": str(current_user.id),
+        "userId": user_id,
         "scheduleSessionId": schedule_session_id
     })
+    chunks = await db.scheduled_course_chunks.delete_many({
+        "userId": user_id,
+        "scheduleSessionId": schedule_session_id
+    })
+    archives = await db.session_archives.delete_many({
+        "userId": user_id,
+        "scheduleSessionId": schedule_session_id
+    })
+    deleted = bool(result.deleted_count or chunks.deleted_count or archives.deleted_count)
+    
+    if deleted:
+        await apply_hours_delta(
+            db, user_id, {sid: -hours for sid, hours in refunds.items()}
+        )
+        await record_session_deletion(db, user_id, schedule_session_id)
+    await db.active_sessions.delete_one({"userId": user_id, "scheduleSessionId": schedule_session_id})
+    await db.scheduling_metadata.delete_one({"userId": user_id, "scheduleSessionId": schedule_session_id})
+    await refresh_session_summaries(db, user_id, schedule_session_id)
+    
+    return deleted
+
+
+# ============================================================================
+# 排课会话发布 (Atomic Session Publishing)
+# ============================================================================
+
+@router.post("/sessions/publish", response_model=PublishSessionResponse, status_code=status.HTTP_201_CREATED)
+async def publish_schedule_session(
+    request: PublishSessionRequest,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    发布一次完整排课结果并原子切换为活动会话
+
+    替代「DELETE /courses/session/{id} + POST /courses/batch」：新课程全部写入后
+    才切换指针，读者不会看到空白或不完整的排课。旧会话由后台任务回收。
+    """
+    user_id = str(current_user["id"])
+    session_id, previous_id = await publish_session(
+        db, user_id,
+        [course.model_dump() for course in request.courses],
+        algorithm=request.algorithm,
+        conflicts_detected=request.conflictsDetected,
+        stats=request.stats,
+        storage=request.storage
+    )
+    await refresh_session_summaries(db, user_id, session_id)
+    
+    return PublishSessionResponse(
+        scheduleSessionId=session_id,
+        previousSessionId=previous_id,
+        totalCoursesScheduled=len(request.courses)
+    )
+
+
+@router.get("/sessions/{base_session_id}/diff/{target_session_id}")
+async def diff_sessions(
+    base_session_id: str,
+    target_session_id: str,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    对比两次排课会话：新增/删除/调整的课程、按学生汇总的变化与 KPI 差值
+
+    基准会话建哈希索引，目标会话流式读取探测，无需客户端下载两个会话。
+    """
+    user_id = str(current_user["id"])
+    diff = SessionDiff()
+    async for course in iter_session_courses(db, user_id, base_session_id, DIFF_FIELDS):
+        diff.add_base(course)
+    async for course in iter_session_courses(db, user_id, target_session_id, DIFF_FIELDS):
+        diff.add_target(course)
+    
+    result = diff.result()
+    kpis = result["kpis"]
+    for name, session_id in (("base", base_session_id), ("target", target_session_id)):
+        if kpis[name]["courses"] == 0:
+            # Neither storage format has this session
+            raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+        kpis[name]["roomUtilization"] = room_utilization(
+            await get_utilization_summary(db, user_id, session_id)
+        )
+    kpis["delta"] = kpi_delta(kpis["base"], kpis["target"])
+    
+    return Response(
+        content=orjson.dumps({"base": base_session_id, "target": target_session_id, **result}),
+        media_type="application/json"
+    )
+
+
+@router.get("/sessions/active")
+async def get_active_session(
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """获取当前活动排课会话ID"""
+    session_id = await get_active_session_id(db, str(current_user["id"]))
+    if session_id is None:
+        raise HTTPException(status_code=404, detail="No active schedule session")
+    return {"scheduleSessionId": session_id}
+
+
+# ============================================================================
+# 排课会话目录 (Schedule Session Catalog)
+# ============================================================================
+
+@router.get("/sessions", response_model=List[SchedulingMetadataResponse])
+async def get_sessions(
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """列出排课会话及其统计（读取会话目录，不扫描课程）"""
+    return await list_sessions(db, str(current_user["id"]), limit)
+
+
+@router.post("/sessions/prune")
+async def prune_schedule_sessions(
+    keep: Optional[int] = Query(None, ge=0),
+    max_age_days: Optional[int] = Query(None, ge=0),
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    按保留策略批量清理当前用户的旧会话（默认值见配置，0 表示不按该条件清理）
+
+    被清理的会话立即从目录中隐藏，课程由后台任务回收；活动会话不会被清理。
+    """
+    retired = await prune_sessions(db, str(current_user["id"]), keep=keep, max_age_days=max_age_days)
+    return {"retired": retired}
+
+
+@router.get("/sessions/{schedule_session_id}", response_model=SchedulingMetadataResponse)
+async def get_session_metadata(
+    schedule_session_id: str,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """获取单个会话的目录条目"""
+    session = await get_session(db, str(current_user["id"]), schedule_session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
+
+
+@router.post("/sessions/{schedule_session_id}/archive")
+async def archive_schedule_session(
+    schedule_session_id: str,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """立即将会话移至压缩冷存储（活动会话、已归档会话不可归档）"""
+    user_id = str(current_user["id"])
+    session = await get_session(db, user_id, schedule_session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.get("archivedAt") or await is_archived_session(db, user_id, schedule_session_id):
+        raise HTTPException(status_code=409, detail="The session is already archived")
+    if schedule_session_id == await get_active_session_id(db, user_id):
+        raise HTTPException(status_code=409, detail="The active session cannot be archived")
+    return {"archived": await archive_session(db, user_id, schedule_session_id)}
+
+
+@router.post("/sessions/{schedule_session_id}/restore")
+async def restore_schedule_session(
+    schedule_session_id: str,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """将归档会话恢复为在线会话（归档会话也可直接通过 /courses 读取，无需恢复）"""
+    user_id = str(current_user["id"])
+    restored = await restore_session(db, user_id, schedule_session_id)
+    if not restored:
+        raise HTTPException(status_code=404, detail="Archived session not found")
+    return {"restored": restored}
+
+
+@router.get("/sessions/{schedule_session_id}/export")
+async def export_schedule_session(
+    schedule_session_id: str,
+    format: str = "csv",
+    teacher_id: Optional[str] = None,
+    student_id: Optional[str] = None,
+    week_start: Optional[date] = None,
+    weeks: Optional[int] = Query(None, ge=1, le=104),
+    if_none_match: Optional[str] = Header(default=None),
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    导出会话课表（csv / xlsx / ics），可按教师或学生筛选
+
+    直接从会话游标流式编码，内存占用与会话大小无关。ics 为每周重复的日历订阅：
+    首次上课在 week_start 所在周（默认本周），weeks 限制重复次数（默认不限）。
+    会话未变化时重复导出直接返回磁盘缓存；ETag 为缓存键，支持 If-None-Match。
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
     
+    user_id = str(current_user["id"])
+    session = await get_session(db, user_id, schedule_session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    filters = {}
+    if teacher_id:
+        filters["teacherId"] = teacher_id
+    if student_id:
+        filters["studentId"] = student_id
+    week_start = monday_of(week_start or date.today())
+    params = {"format": format, "filters": filters}
+    if format == "ics":
+        params.update({"weekStart": week_start, "weeks": weeks})
+    
+    key = export_cache_key(user_id, schedule_session_id, session_version(session), params)
+    etag = f'"{key}"'
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    label = "-".join(filter(None, (teacher_id and f"teacher-{teacher_id}", student_id and f"student-{student_id}")))
+    filename = export_filename(schedule_session_id, label, format)
+    headers = {"ETag": etag}
+    cache = get_export_cache()
+    
+    cached = cache.get(key, format)
+    if cached:
+        return FileResponse(cached, media_type=EXPORT_MEDIA_TYPES[format], filename=filename, headers=headers)
+    
+    courses = iter_session_courses(db, user_id, schedule_session_id, EXPORT_FIELDS, filters)
+    if format == "xlsx":
+        temp_path = cache.temp_path(format)
+        try:
+            await write_xlsx_file(courses, temp_path, "课表")
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        path = cache.commit(temp_path, key, format)
+        return FileResponse(path, media_type=EXPORT_MEDIA_TYPES[format], filename=filename, headers=headers)
+    
+    if format == "ics":
+        stamp = session.get("updatedAt") or datetime.utcnow()
+        chunks = iter_ics_bytes(courses, label or schedule_session_id, week_start, stamp, weeks)
+    else:
+        chunks = iter_csv_bytes(courses)
+    return StreamingResponse(
+        tee_to_cache(chunks, cache, key, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={**headers, **attachment_headers(filename)}
+    )
+
+
+@router.delete("/sessions/{schedule_session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_session(
+    schedule_session_id: str,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """删除会话（课程、目录条目与统计；退还已确认课程的课时）"""
+    user_id = str(current_user["id"])
+    if await get_session(db, user_id, schedule_session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    await delete_session_now(db, user_id, schedule_session_id)
     return None
 
 
+@router.post("/course-hours/reconcile")
+async def reconcile_student_course_hours(
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """按已确认课程全量重算当前用户所有学生的课时（单条聚合管道）"""
+    count = await reconcile_course_hours(db, str(current_user["id"]))
+    return {"reconciled": count}
+
+
+# ============================================================================
+# 增量同步API (Delta Sync API)
+# ============================================================================
+
+@router.get("/changes")
+async def get_changes_since(
+    since: Optional[int] = None,
+    collections: Optional[str] = None,
+    schedule_session_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    返回水位之后新增/更新/删除的数据
+
+    since 为上次响应中的 watermark（毫秒时间戳），省略时返回全部数据。
+    响应 reset=true 表示水位过旧（删除记录已过期），客户端需全量重新加载。
+    """
+    names = None
+    if collections:
+        names = [name.strip() for name in collections.split(",") if name.strip()]
+        unknown = [name for name in names if name not in SYNCED_COLLECTIONS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown collections: {', '.join(unknown)}")
+    
+    result = await get_changes(db, str(current_user["id"]), since, names, schedule_session_id)
+    return Response(content=orjson.dumps(result, default=str), media_type="application/json")
+
+
+# ============================================================================
+# 实时推送 (Live Updates over WebSocket)
+# ============================================================================
+
+@router.websocket("/ws")
+async def live_updates(websocket: WebSocket, token: Optional[str] = None):
+    """
+    实时推送当前用户的数据变更
+
+    浏览器 WebSocket 无法设置请求头，token 通过查询参数传入。
+    消息格式：{"type": "changes", "watermark", "changes": {...ids}, "deleted": {...ids}}
+    或 {"type": "resync"}（推送积压被丢弃，需调用 /changes 补齐）。
+    连接建立时先发送 {"type": "hello", "watermark"}，客户端用它调用 /changes 补齐连接前的变更。
+    """
+    payload = decode_token(token) if token else None
+    user = await get_user_by_id(payload["sub"]) if payload and payload.get("sub") else None
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    user_id = str(user["id"])
+    broadcaster = get_change_broadcaster()
+    queue = broadcaster.subscribe(user_id)
+    
+    async def drain_client():
+        # 客户端无需发送数据；读取只用于感知断开
+        while True:
+            await websocket.receive_text()
+    
+    receiver = asyncio.create_task(drain_client())
+    try:
+        await websocket.send_json({"type": "hello", "watermark": to_watermark(datetime.utcnow())})
+        while not receiver.done():
+            getter = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            await websocket.send_json(getter.result())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        broadcaster.unsubscribe(user_id, queue)
+        try:
+            await receiver
+        except (asyncio.CancelledError, WebSocketDisconnect):
+            pass
+        except Exception as e:
+            print(f"Live updates receiver failed for user {user_id}: {e!r}")
+
+
+# ============================================================================
+# 报表API (Reports API)
+# ============================================================================
+
+@router.get("/reports/teacher-hours")
+async def get_teacher_hours_report(
+    schedule_session_id: str,
+    group_by: str = "week",
+    month: Optional[str] = None,
+    confirmed_only: bool = False,
+    format: str = "json",
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    教师课时报表（按日/周/月/校区汇总，支持 json/csv/xlsx）
+
+    数据来自物化的 teacher_hours_summaries，排课写入时自动刷新。
+    按月汇总时按该月每个星期几出现的次数展开周课表。
+    """
+    if group_by not in GROUP_BY_OPTIONS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(GROUP_BY_OPTIONS)}")
+    if format not in ("json", "csv", "xlsx"):
+        raise HTTPException(status_code=400, detail="format must be json, csv or xlsx")
+    if group_by == "month":
+        try:
+            datetime.strptime(month or "", "%Y-%m")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="month must be YYYY-MM when group_by=month")
+    
+    rows = await get_teacher_hours_rows(db, str(current_user["id"]), schedule_session_id)
+    report = rollup_teacher_hours(rows, group_by, month=month, confirmed_only=confirmed_only)
+    
+    if format == "json":
+        return {
+            "scheduleSessionId": schedule_session_id,
+            "groupBy": group_by,
+            "month": month,
+            "rows": report
+        }
+    
+    header, table = report_table(report, group_by)
+    suffix = month if group_by == "month" else group_by
+    return await tabular_response(
+        format,
+        f"teacher-hours-{suffix}",
+        header,
+        table,
+        sheet_title="教师课时"
+    )
+
+
+# ============================================================================
+# 分析API (Analytics API)
+# ============================================================================
+
+@router.get("/analytics/utilization")
+async def get_utilization(
+    schedule_session_id: str,
+    recompute: bool = False,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    教室/教师/校区/时段占用率
+
+    默认读取排课写入时物化的统计文档；recompute=true 时从课程重新计算。
+    未知或已删除的会话返回 404。
+    """
+    user_id = str(current_user["id"])
+    if await get_session(db, user_id, schedule_session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return await get_utilization_summary(db, user_id, schedule_session_id, recompute=recompute)
+
+
 # ============================================================================
 # 计数器API (Counters API)
 # ============================================================================
@@ -494,12 +1268,12 @@ async def get_counters(
     db = Depends(get_db)
 ):
     """获取用户的计数器"""
-    doc = await db.user_counters.find_one({"userId": str(current_user.id)})
+    doc = await db.user_counters.find_one({"userId": str(current_user["id"])})
     
     if not doc:
         # 创建默认计数器
         default_counters = {
-            "userId": str(current_user.id),
+            "userId": str(current_user["id"]),
             "studentCounter": 0,
             "teacherCounter": 0,
             "updatedAt": datetime.utcnow()
@@ -520,22 +1294,38 @@ async def increment_counter(
     db = Depends(get_db)
 ):
     """递增计数器"""
-    if counter_type not in ["student", "teacher"]:
+    if counter_type not in COUNTER_FIELDS:
         raise HTTPException(status_code=400, detail="Invalid counter type")
     
-    field = f"{counter_type}Counter"
+    _, _, result = await reserve_counter_range(db, str(current_user["id"]), counter_type, 1)
     
-    result = await db.user_counters.find_one_and_update(
-        {"userId": current_user["id"]},
-        {
-            "$inc": {field: 1},
-            "$set": {"updatedAt": datetime.utcnow()}
-        },
-        upsert=True,
-        return_document=True
-    )
+    return {
+        "studentCounter": result.get("studentCounter", 0),
+        "teacherCounter": result.get("teacherCounter", 0)
+    }
+
+
+@router.post("/counters/reserve")
+async def reserve_counters(
+    counter_type: str,  # "student" or "teacher"
+    count: int = Query(..., ge=1, le=10000),
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    预留一段连续的计数器值 [start, end)，一次请求代替 count 次递增
+    names 为该区间对应的默认名称
+    """
+    if counter_type not in COUNTER_FIELDS:
+        raise HTTPException(status_code=400, detail="Invalid counter type")
+    
+    start, end, result = await reserve_counter_range(db, str(current_user["id"]), counter_type, count)
     
     return {
+        "counterType": counter_type,
+        "start": start,
+        "end": end,
+        "names": counter_names(counter_type, start, end),
         "studentCounter": result.get("studentCounter", 0),
         "teacherCounter": result.get("teacherCounter", 0)
     }
@@ -548,17 +1338,23 @@ async def increment_counter(
 @router.get("/adjustments")
 async def get_adjustment_history(
     conflict_id: Optional[str] = None,
+    schedule_session_id: Optional[str] = None,
     limit: int = 100,
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """获取调整历史"""
-    query = {"userId": str(current_user.id)}
+    """获取调整历史（指定会话时按事件顺序返回）"""
+    query = {"userId": str(current_user["id"])}
     if conflict_id:
         query["conflictId"] = conflict_id
+    if schedule_session_id:
+        query["scheduleSessionId"] = schedule_session_id
+        sort = [("seq", -1)]
+    else:
+        sort = [("timestamp", -1)]
     
     records = []
-    cursor = db.adjustment_history.find(query).sort("timestamp", -1).limit(limit)
+    cursor = db.adjustment_history.find(query).sort(sort).limit(limit)
     async for doc in cursor:
         doc["id"] = str(doc.pop("_id"))
         records.append(doc)
@@ -572,11 +1368,81 @@ async def create_adjustment_record(
     current_user: dict = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """创建调整历史记录"""
+    """创建调整历史记录（追加到所属会话的事件日志）"""
     record_dict = record.model_dump()
-    record_dict["userId"] = str(current_user.id)
-    
-    result = await db.adjustment_history.insert_one(record_dict)
-    record_dict["id"] = str(result.inserted_id)
-    
-    return record_dict
+    events = await append_events(
+        db, str(current_user["id"]), record_dict.pop("scheduleSessionId"), [record_dict]
+    )
+    return events[0]
+
+
+@router.post("/adjustments/batch")
+async def create_adjustment_records_batch(
+    records: List[AdjustmentRecordBase],
+    schedule_session_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """批量追加调整记录（一次插入，按提交顺序分配 seq）"""
+    events = await append_events(
+        db, str(current_user["id"]), schedule_session_id,
+        [record.model_dump(exclude={"scheduleSessionId"}) for record in records]
+    )
+    return {"inserted": len(events), "events": events}
+
+
+async def adjustment_state_response(db, user_id: str, schedule_session_id: Optional[str], seq: int, head: dict) -> dict:
+    """State at seq plus the log head, as AdjustmentStateResponse"""
+    state = await state_at(db, user_id, schedule_session_id, seq)
+    return AdjustmentStateResponse(
+        scheduleSessionId=schedule_session_id, seq=seq, state=state, **head
+    ).model_dump()
+
+
+@router.post("/adjustments/undo", response_model=AdjustmentStateResponse)
+async def undo_adjustment(
+    schedule_session_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """撤销最近一次调整，返回撤销后的状态"""
+    user_id = str(current_user["id"])
+    head = await move_position(db, user_id, schedule_session_id, -1)
+    if head is None:
+        raise HTTPException(status_code=409, detail="Nothing to undo")
+    return await adjustment_state_response(db, user_id, schedule_session_id, head["position"], head)
+
+
+@router.post("/adjustments/redo", response_model=AdjustmentStateResponse)
+async def redo_adjustment(
+    schedule_session_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """重做最近一次被撤销的调整，返回重做后的状态"""
+    user_id = str(current_user["id"])
+    head = await move_position(db, user_id, schedule_session_id, 1)
+    if head is None:
+        raise HTTPException(status_code=409, detail="Nothing to redo")
+    return await adjustment_state_response(db, user_id, schedule_session_id, head["position"], head)
+
+
+@router.get("/adjustments/state", response_model=AdjustmentStateResponse)
+async def get_adjustment_state(
+    schedule_session_id: Optional[str] = None,
+    seq: Optional[int] = Query(None, ge=0),
+    at: Optional[datetime] = None,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    获取调整状态：默认为当前位置；seq 指定事件序号，at 指定时间点
+    （时间点之前最后一个事件之后的状态）
+    """
+    user_id = str(current_user["id"])
+    head = await get_log_head(db, user_id, schedule_session_id)
+    if seq is None:
+        seq = await seq_at_time(db, user_id, schedule_session_id, at, head["position"]) if at else head["position"]
+    return await adjustment_state_response(
+        db, user_id, schedule_session_id, min(seq, head["lastSeq"]), head
+    )
@@ -24,12 +24,67 @@ class Settings(BaseSettings):
     admin_password: str = "admin123"
     admin_username: str = "Administrator"
     
+    # List endpoints (keyset pagination, opt-in with ?limit=)
+    list_max_page_size: int = 5000
+    
+    # Delta sync: how long deletions are remembered
+    tombstone_retention_days: int = 30
+    
+    # Live updates (WebSocket push)
+    live_coalesce_ms: int = 250
+    live_poll_interval_seconds: float = 2.0
+    
+    # Schedule session publishing (retired sessions are deleted after the grace period)
+    session_gc_grace_seconds: int = 120
+    session_gc_interval_seconds: int = 300
+    
+    # Schedule session retention (0 disables a rule; the active session is always kept)
+    session_retention_keep: int = 20
+    session_retention_days: int = 0
+    
+    # Schedule session archival to compressed cold storage (0 disables a rule)
+    archive_keep_latest: int = 5
+    archive_after_days: int = 60
+    
+    # Adjustment history: a state snapshot every N events bounds undo/redo replay
+    adjustment_snapshot_interval: int = 50
+    
+    # Orphan sweep: courses/adjustments referencing deleted entities, older than the grace period
+    orphan_sweep_grace_hours: int = 24
+    
     # Backup Settings
     backup_enabled: bool = False
     backup_path: str = "./backups"
     
+    # Schedule exports cached on disk, keyed by session version
+    export_cache_path: str = "./export_cache"
+    export_cache_ttl_hours: int = 24
+    
+    # Rule-based constraint parsing: results below the threshold are escalated to the LLM
+    constraint_llm_threshold: float = 0.6
+    constraint_batch_max_items: int = 20000
+    constraint_parse_pool_min: int = 5000  # distinct texts before fanning out to processes
+    constraint_parse_workers: int = 0  # 0 = os.cpu_count()
+    constraint_llm_concurrency: int = 5
+    
+    # LLM parse cache: in-process LRU in front of a Mongo collection with a TTL index
+    llm_cache_max_entries: int = 5000
+    llm_cache_ttl_days: int = 30
+    
     # OpenAI API (optional)
     openai_api_key: Optional[str] = None
+    openai_max_concurrency: int = 8  # in-flight requests per process
+    openai_requests_per_minute: int = 500  # token bucket per process; 0 disables
+    openai_max_connections: int = 16
+    openai_timeout_seconds: float = 60
+    openai_transcribe_timeout_seconds: float = 300
+    openai_max_retries: int = 3
+    openai_retry_base_seconds: float = 0.5
+    openai_retry_max_seconds: float = 20
+
+    # Whisper transcription: uploads streamed to disk, cut by ffmpeg stream copy
+    whisper_max_upload_mb: int = 100
+    whisper_segment_mb: float = 24  # the API rejects files over 25MB
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,17 @@
+"""
+Scheduling Constants
+排课时间常量（与前端 Function/utils/constants.js 保持一致）
+"""
+
+TIME_GRANULARITY = 5  # 5 minutes per slot (每个时间槽5分钟)
+STANDARD_START = 9  # 9:00
+STANDARD_END = 21.5  # 21:30
+SLOTS_PER_HOUR = 60 // TIME_GRANULARITY  # 12 slots per hour
+SLOTS_PER_DAY = int((STANDARD_END - STANDARD_START) * SLOTS_PER_HOUR)  # 150 slots per day
+DAYS_PER_WEEK = 7
+
+# 日系配色（与前端 JAPANESE_COLORS 一致）
+ENTITY_COLORS = [
+    '#5A6C7D', '#6B7C6E', '#A08B7A', '#7A8C9E',
+    '#8B7C6E', '#6E7C8B', '#9E7676', '#7A9E76'
+]
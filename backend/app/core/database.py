@@ -1,9 +1,86 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
 from app.core.config import settings
 
 client: AsyncIOMotorClient = None
 db = None
 
+# Index definitions: collection -> list of (keys, options)
+INDEXES = {
+    "students": [
+        ([("userId", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("updatedAt", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("clientId", ASCENDING)], {"sparse": True}),
+    ],
+    "teachers": [
+        ([("userId", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("updatedAt", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("clientId", ASCENDING)], {"sparse": True}),
+    ],
+    "classrooms": [
+        ([("userId", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("updatedAt", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("clientId", ASCENDING)], {"sparse": True}),
+    ],
+    "scheduled_courses": [
+        ([("userId", ASCENDING), ("updatedAt", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING), ("teacherId", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("studentId", ASCENDING), ("confirmationStatus", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING), ("classroomId", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING), ("day", ASCENDING), ("startSlot", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING),
+          ("status", ASCENDING), ("confirmationStatus", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("teacherId", ASCENDING)], {}),
+        ([("userId", ASCENDING), ("classroomId", ASCENDING)], {}),
+    ],
+    "scheduled_course_chunks": [
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING), ("chunk", ASCENDING)], {"unique": True}),
+    ],
+    "session_archives": [
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING), ("chunk", ASCENDING)], {"unique": True}),
+    ],
+    "teacher_hours_summaries": [
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING)], {"unique": True}),
+    ],
+    "tombstones": [
+        ([("userId", ASCENDING), ("deletedAt", ASCENDING)], {}),
+        ([("deletedAt", ASCENDING)], {"expireAfterSeconds": settings.tombstone_retention_days * 86400}),
+    ],
+    "active_sessions": [
+        ([("userId", ASCENDING)], {"unique": True}),
+    ],
+    "retired_sessions": [
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING)], {"unique": True}),
+        ([("retiredAt", ASCENDING)], {}),
+    ],
+    "scheduling_metadata": [
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING)], {"unique": True}),
+        ([("userId", ASCENDING), ("lastScheduledAt", DESCENDING)], {}),
+    ],
+    "utilization_summaries": [
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING)], {"unique": True}),
+    ],
+    "adjustment_history": [
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING), ("seq", ASCENDING)],
+         {"unique": True, "partialFilterExpression": {"seq": {"$exists": True}}}),
+        ([("userId", ASCENDING), ("timestamp", DESCENDING)], {}),
+        ([("userId", ASCENDING), ("targetType", ASCENDING), ("targetId", ASCENDING)], {}),
+    ],
+    "adjustment_snapshots": [
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING), ("seq", ASCENDING)], {"unique": True}),
+    ],
+    "adjustment_logs": [
+        ([("userId", ASCENDING), ("scheduleSessionId", ASCENDING)], {"unique": True}),
+    ],
+    "llm_cache": [
+        ([("createdAt", ASCENDING)], {"expireAfterSeconds": settings.llm_cache_ttl_days * 86400}),
+    ],
+    "llm_usage": [
+        ([("template", ASCENDING), ("day", ASCENDING)], {"unique": True}),
+    ],
+}
+
 
 async def connect_to_mongodb():
     """Connect to MongoDB database."""
@@ -13,6 +90,14 @@ async def connect_to_mongodb():
     print(f"Connected to MongoDB: {settings.mongodb_db_name}")
 
 
+async def ensure_indexes():
+    """Create indexes declared in INDEXES (idempotent)."""
+    for collection_name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            await db[collection_name].create_index(keys, **options)
+    print("MongoDB indexes ensured")
+
+
 async def close_mongodb_connection():
     """Close MongoDB connection."""
     global client
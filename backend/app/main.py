@@ -1,9 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import auth, ai, users, backup, scheduling
-from app.core.database import connect_to_mongodb, close_mongodb_connection
+from app.core.database import connect_to_mongodb, close_mongodb_connection, ensure_indexes, get_database
 from app.services.auth_service import initialize_admin_user
 from app.services.backup_scheduler import get_backup_scheduler
+from app.services.constraint_parser import shutdown_parse_pool
+from app.services.live_updates import get_change_broadcaster
+from app.services.openai_service import close_openai_client
+from app.services.session_maintenance import get_session_maintenance
+from app.services.session_service import backfill_session_catalog
 import os
 
 app = FastAPI(
@@ -23,6 +28,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Schedule-Session-Id"],
 )
 
 # Startup and shutdown events
@@ -32,6 +38,13 @@ async def startup_db_client():
     await connect_to_mongodb()
     print("✅ MongoDB connected")
     
+    await ensure_indexes()
+    
+    # Catalog entries for sessions written before the catalog existed (once)
+    backfilled = await backfill_session_catalog(get_database())
+    if backfilled:
+        print(f"✅ Backfilled {backfilled} schedule session catalog entries")
+    
     # Initialize admin user
     await initialize_admin_user()
     
@@ -39,6 +52,9 @@ async def startup_db_client():
     backup_scheduler = get_backup_scheduler()
     backup_scheduler.start()
     
+    # Start session maintenance (retired session GC)
+    get_session_maintenance().start()
+    
     print("✅ Application started successfully")
 
 
@@ -49,6 +65,18 @@ async def shutdown_db_client():
     backup_scheduler = get_backup_scheduler()
     backup_scheduler.stop()
     
+    # Stop session maintenance
+    get_session_maintenance().stop()
+    
+    # Stop live update stream
+    await get_change_broadcaster().stop()
+    
+    # Stop constraint parser workers
+    shutdown_parse_pool()
+    
+    # Close pooled OpenAI connections
+    await close_openai_client()
+    
     await close_mongodb_connection()
     print("👋 Application shutdown")
 
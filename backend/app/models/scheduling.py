@@ -9,7 +9,7 @@ Scheduling Data Models
 """
 
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any, Literal
+from typing import Optional, List, Dict, Any, Literal, Union
 from datetime import datetime
 from bson import ObjectId
 
@@ -120,6 +120,7 @@ class StudentResponse(StudentBase):
     id: str
     createdAt: datetime
     updatedAt: datetime
+    version: int = 1  # 同时通过 ETag 响应头返回
 
     class Config:
         from_attributes = True
@@ -162,6 +163,7 @@ class TeacherResponse(TeacherBase):
     id: str
     createdAt: datetime
     updatedAt: datetime
+    version: int = 1  # 同时通过 ETag 响应头返回
 
     class Config:
         from_attributes = True
@@ -176,7 +178,11 @@ class ClassroomBase(BaseModel):
     name: str
     capacity: int = 20
     notes: Optional[str] = None
-    availableTimeRanges: Optional[Dict[str, Any]] = None
+    # 前端格式为 [{day, startSlot, endSlot}]
+    availableTimeRanges: Optional[Union[List[Dict[str, Any]], Dict[str, Any]]] = None
+    campus: Optional[str] = None
+    type: Optional[str] = None  # 班课教室 / 1v1教室 / 自习室 ...
+    priority: Optional[int] = None
 
 
 class ClassroomInDB(ClassroomBase):
@@ -239,6 +245,7 @@ class ScheduledCourseInDB(ScheduledCourseBase):
     userId: str  # 🔥 关键字段：用户隔离
     scheduleSessionId: str  # 🔥 关键字段：排课会话ID（一次排课生成的所有课程共享同一个sessionId）
     createdAt: datetime = Field(default_factory=datetime.utcnow)
+    updatedAt: datetime = Field(default_factory=datetime.utcnow)  # 增量同步水位
 
     class Config:
         populate_by_name = True
@@ -251,6 +258,7 @@ class ScheduledCourseResponse(ScheduledCourseBase):
     id: str
     scheduleSessionId: str
     createdAt: datetime
+    updatedAt: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -269,6 +277,7 @@ class SchedulingMetadataBase(BaseModel):
     totalHoursScheduled: float = 0
     conflictsDetected: int = 0
     stats: Optional[Dict[str, Any]] = None
+    storage: Literal["documents", "columnar"] = "documents"  # 课程存储格式
 
 
 class SchedulingMetadataInDB(SchedulingMetadataBase):
@@ -283,6 +292,32 @@ class SchedulingMetadataInDB(SchedulingMetadataBase):
         json_encoders = {ObjectId: str}
 
 
+class SchedulingMetadataResponse(SchedulingMetadataBase):
+    """会话目录条目"""
+    id: str
+    isActive: bool = False
+    archivedAt: Optional[datetime] = None  # 已移至冷存储（课程仍可读取/恢复）
+    archivedBytes: Optional[int] = None
+    createdAt: datetime
+    updatedAt: Optional[datetime] = None
+
+
+class PublishSessionRequest(BaseModel):
+    """发布一次完整排课结果（替换当前活动会话）"""
+    courses: List[ScheduledCourseBase]
+    algorithm: str = "triple-match"
+    conflictsDetected: int = 0
+    stats: Optional[Dict[str, Any]] = None
+    storage: Literal["documents", "columnar"] = "documents"  # columnar: 只读快照，存储与读取更快
+
+
+class PublishSessionResponse(BaseModel):
+    """发布结果"""
+    scheduleSessionId: str
+    previousSessionId: Optional[str] = None
+    totalCoursesScheduled: int
+
+
 # ============================================================================
 # 排课调整历史模型 (Adjustment History Model)
 # ============================================================================
@@ -294,10 +329,11 @@ class AdjustmentRecordBase(BaseModel):
     targetId: str
     targetName: str
     modificationType: str  # manual, smart_recommendation
-    modificationData: Dict[str, Any]
+    modificationData: Dict[str, Any]  # field / oldValue / newValue 参与状态重放
     result: str  # success, failed
     errorMessage: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+    scheduleSessionId: Optional[str] = None  # 所属排课会话（事件日志按会话划分）
 
 
 class AdjustmentRecordInDB(AdjustmentRecordBase):
@@ -311,6 +347,15 @@ class AdjustmentRecordInDB(AdjustmentRecordBase):
         json_encoders = {ObjectId: str}
 
 
+class AdjustmentStateResponse(BaseModel):
+    """调整日志在某一位置的状态 {targetType: {targetId: {field: value}}}"""
+    scheduleSessionId: Optional[str] = None
+    seq: int
+    position: int
+    lastSeq: int
+    state: Dict[str, Dict[str, Dict[str, Any]]]
+
+
 # ============================================================================
 # 用户计数器模型 (User Counters Model)
 # ============================================================================
@@ -348,6 +393,37 @@ class BatchClassroomCreate(BaseModel):
     classrooms: List[ClassroomBase]
 
 
+class BatchSyncRequest(BaseModel):
+    """批量差异同步：客户端提交完整列表（含 id / version），服务端计算增删改"""
+    items: List[Dict[str, Any]]
+    deleteMissing: bool = False  # 删除服务端存在但列表中缺失的记录（级联删除课程与调整历史，需显式开启）
+
+
+class BatchSyncResponse(BaseModel):
+    """批量差异同步结果"""
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    conflicts: List[str] = []  # 客户端版本落后、被跳过的记录ID
+    raced: int = 0  # 写入时版本已被并发修改、未生效的更新数
+    idMap: Dict[str, str] = {}  # 客户端本地ID -> 数据库ID
+    versions: Dict[str, int] = {}  # 新增/更新记录的数据库ID -> 当前版本号
+
+
+class BatchDeleteRequest(BaseModel):
+    """批量删除（级联删除引用的课程与调整历史）"""
+    ids: List[str] = Field(..., min_length=1, max_length=10000)
+
+
+class BatchDeleteResponse(BaseModel):
+    """批量删除结果"""
+    deleted: int = 0
+    deletedIds: List[str] = []
+    coursesDeleted: int = 0
+    adjustmentsDeleted: int = 0
+
+
 # ============================================================================
 # 查询过滤器 (Query Filters)
 # ============================================================================
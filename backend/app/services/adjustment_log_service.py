@@ -0,0 +1,169 @@
+"""
+Adjustment Log Service
+排课调整历史的事件溯源
+
+每个排课会话的调整记录是一条有序事件流（seq 从 1 递增）。状态是所有已应用
+事件折叠得到的覆盖表 {targetType: {targetId: {field: value}}}。
+每 adjustment_snapshot_interval 个事件物化一次快照，任意位置的状态都从最近的
+快照开始重放，最多重放一个间隔的事件。
+
+日志头文档（adjustment_logs）记录 lastSeq 与当前位置 position：
+撤销/重做只移动 position；在撤销后追加新事件会丢弃原来的重做分支。
+每次追加还领取一个递增的批次号（batches），事件与快照带上 batch，
+并发追加清理重做分支时只删除更早批次写入的文档。
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+
+State = Dict[str, Dict[str, Dict[str, object]]]
+
+
+def apply_event(state: State, event: dict) -> State:
+    """Fold one event into the state (in place); failed or field-less records are no-ops"""
+    data = event.get("modificationData") or {}
+    field = data.get("field")
+    if event.get("result") != "success" or not field:
+        return state
+    target = state.setdefault(event["targetType"], {}).setdefault(event["targetId"], {})
+    target[field] = data.get("newValue")
+    return state
+
+
+def replay(events: List[dict], state: Optional[State] = None) -> State:
+    """Fold events (in seq order) onto a copy of state"""
+    result: State = {
+        target_type: {target_id: dict(fields) for target_id, fields in targets.items()}
+        for target_type, targets in (state or {}).items()
+    }
+    for event in events:
+        apply_event(result, event)
+    return result
+
+
+def _log_key(user_id: str, schedule_session_id: Optional[str]) -> dict:
+    return {"userId": user_id, "scheduleSessionId": schedule_session_id}
+
+
+async def get_log_head(db, user_id: str, schedule_session_id: Optional[str]) -> dict:
+    """Current position and last seq of a session's log"""
+    head = await db.adjustment_logs.find_one(
+        _log_key(user_id, schedule_session_id), {"_id": 0, "position": 1, "lastSeq": 1}
+    )
+    return head or {"position": 0, "lastSeq": 0}
+
+
+async def state_at(db, user_id: str, schedule_session_id: Optional[str], seq: int) -> State:
+    """State after event `seq`, replaying at most one snapshot interval"""
+    key = _log_key(user_id, schedule_session_id)
+    snapshot = await db.adjustment_snapshots.find_one(
+        {**key, "seq": {"$lte": seq}}, sort=[("seq", -1)]
+    )
+    base_seq = snapshot["seq"] if snapshot else 0
+    events = await db.adjustment_history.find(
+        {**key, "seq": {"$gt": base_seq, "$lte": seq}}
+    ).sort("seq", 1).to_list(length=None)
+    return replay(events, snapshot["state"] if snapshot else None)
+
+
+async def seq_at_time(
+    db, user_id: str, schedule_session_id: Optional[str], moment: datetime, position: int
+) -> int:
+    """Last applied seq (at most position, never the undone redo branch) recorded at or before a moment"""
+    event = await db.adjustment_history.find_one(
+        {**_log_key(user_id, schedule_session_id), "seq": {"$lte": position}, "timestamp": {"$lte": moment}},
+        {"seq": 1},
+        sort=[("seq", -1)]
+    )
+    return event["seq"] if event else 0
+
+
+async def append_events(
+    db, user_id: str, schedule_session_id: Optional[str], records: List[dict]
+) -> List[dict]:
+    """
+    Append records to a session's log in one insert
+
+    The seq range is reserved with a single pipeline update on the log head
+    (position + N); a redo branch beyond the current position is discarded.
+    The discard is bounded by the head as it was before the reservation and
+    by batch number, so a concurrent append that reserved a later range is
+    never deleted. Snapshots are written for every interval boundary the
+    batch crosses.
+
+    Returns:
+        The inserted events with id and seq
+    """
+    if not records:
+        return []
+    key = _log_key(user_id, schedule_session_id)
+    count = len(records)
+
+    before = await db.adjustment_logs.find_one_and_update(
+        key,
+        [{"$set": {
+            "position": {"$add": [{"$ifNull": ["$position", 0]}, count]},
+            "lastSeq": {"$add": [{"$ifNull": ["$position", 0]}, count]},
+            "batches": {"$add": [{"$ifNull": ["$batches", 0]}, 1]},
+            "updatedAt": "$$NOW",
+        }}],
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    ) or {}
+    first_seq = before.get("position", 0) + 1
+    last_seq = first_seq + count - 1
+    batch = before.get("batches", 0) + 1
+
+    # Discard the redo branch (and any snapshot of it) written by earlier batches
+    stale = {
+        **key,
+        "seq": {"$gte": first_seq, "$lte": max(last_seq, before.get("lastSeq", 0))},
+        "batch": {"$not": {"$gte": batch}},
+    }
+    await db.adjustment_history.delete_many(stale)
+    await db.adjustment_snapshots.delete_many(stale)
+
+    events = [
+        {**record, **key, "seq": first_seq + offset, "batch": batch}
+        for offset, record in enumerate(records)
+    ]
+    result = await db.adjustment_history.insert_many(events)
+
+    interval = settings.adjustment_snapshot_interval
+    boundaries = [seq for seq in range(first_seq, last_seq + 1) if seq % interval == 0]
+    if boundaries:
+        state = await state_at(db, user_id, schedule_session_id, first_seq - 1)
+        snapshots = []
+        for event in events:
+            apply_event(state, event)
+            if event["seq"] in boundaries:
+                snapshots.append({**key, "seq": event["seq"], "batch": batch, "state": replay([], state)})
+        await db.adjustment_snapshots.insert_many(snapshots)
+
+    for event, inserted_id in zip(events, result.inserted_ids):
+        event["id"] = str(inserted_id)
+        event.pop("_id", None)
+    return events
+
+
+async def move_position(db, user_id: str, schedule_session_id: Optional[str], step: int) -> Optional[dict]:
+    """
+    Undo (step=-1) or redo (step=+1) by moving the log position
+
+    Returns:
+        The new head, or None if there is nothing to undo/redo
+    """
+    key = _log_key(user_id, schedule_session_id)
+    if step < 0:
+        query = {**key, "position": {"$gt": 0}}
+    else:
+        query = {**key, "$expr": {"$lt": ["$position", "$lastSeq"]}}
+    return await db.adjustment_logs.find_one_and_update(
+        query,
+        {"$inc": {"position": step}, "$set": {"updatedAt": datetime.utcnow()}},
+        projection={"_id": 0, "position": 1, "lastSeq": 1},
+        return_document=ReturnDocument.AFTER
+    )
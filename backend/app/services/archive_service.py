@@ -0,0 +1,156 @@
+"""
+Archive Service
+历史排课会话冷存储
+
+超出保留窗口的会话从 scheduled_courses / scheduled_course_chunks 移到
+session_archives：课程按列式格式（columnar_service）编码，再整体 BSON + zlib
+压缩，每块一个文档。会话目录条目与物化统计保留，报表和会话列表不受影响；
+读取归档会话的课程时直接解压解码，也可以按需恢复为在线会话。
+"""
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, Optional
+
+import bson
+from bson import Binary
+
+from app.services.change_log_service import record_session_deletion
+from app.services.columnar_service import (
+    CHUNK_ROWS, STORAGE_COLUMNAR, decode_chunk, encode_chunk, is_columnar_session
+)
+
+COMPRESSION_LEVEL = 6
+
+# Chunk fields that make up the packed body (everything else is envelope)
+CHUNK_BODY_FIELDS = ("count", "ids", "tables", "dictionaries", "columns")
+
+
+def compress_chunk(body: dict) -> Binary:
+    return Binary(zlib.compress(bson.encode(body), COMPRESSION_LEVEL))
+
+
+def decompress_chunk(data: bytes) -> dict:
+    return bson.decode(zlib.decompress(data))
+
+
+async def is_archived_session(db, user_id: str, schedule_session_id: str) -> bool:
+    """Whether a session currently lives in cold storage"""
+    archive = await db.session_archives.find_one(
+        {"userId": user_id, "scheduleSessionId": schedule_session_id}, {"_id": 1}
+    )
+    return archive is not None
+
+
+async def iter_archived_courses(
+    db,
+    user_id: str,
+    schedule_session_id: str,
+    filters: Optional[Dict[str, object]] = None,
+    fields: Optional[Iterable[str]] = None
+) -> AsyncIterator[dict]:
+    """Read an archived session without restoring it"""
+    cursor = db.session_archives.find(
+        {"userId": user_id, "scheduleSessionId": schedule_session_id}
+    ).sort("chunk", 1)
+    async for archive in cursor:
+        chunk = decompress_chunk(archive["data"])
+        chunk.update({
+            "scheduleSessionId": schedule_session_id,
+            "createdAt": archive["createdAt"],
+            "updatedAt": archive["createdAt"],
+        })
+        for course in decode_chunk(chunk, filters, fields):
+            yield course
+
+
+async def _live_chunk_bodies(db, key: dict) -> AsyncIterator[tuple]:
+    """(packed body, createdAt) per chunk of a live session in either storage format"""
+    if await is_columnar_session(db, key["userId"], key["scheduleSessionId"]):
+        async for chunk in db.scheduled_course_chunks.find(key).sort("chunk", 1):
+            yield {field: chunk[field] for field in CHUNK_BODY_FIELDS}, chunk["createdAt"]
+        return
+
+    batch = []
+    async for course in db.scheduled_courses.find(key, {"userId": 0}).sort("_id", 1):
+        batch.append(course)
+        if len(batch) == CHUNK_ROWS:
+            yield encode_chunk(batch), batch[0]["createdAt"]
+            batch = []
+    if batch:
+        yield encode_chunk(batch), batch[0]["createdAt"]
+
+
+async def archive_session(db, user_id: str, schedule_session_id: str) -> int:
+    """
+    Move a session's courses into compressed cold storage
+
+    Archive documents are written before the live copies are deleted, so a
+    crash in between leaves the session readable; re-running replaces the
+    partial archive. A session without live courses (e.g. one that is
+    already archived) is left untouched. Per-course createdAt collapses to
+    the chunk's.
+
+    Returns:
+        Number of courses archived (0 if the session has no live courses)
+    """
+    key = {"userId": user_id, "scheduleSessionId": schedule_session_id}
+    now = datetime.utcnow()
+
+    archives = []
+    async for body, created_at in _live_chunk_bodies(db, key):
+        archives.append({
+            **key,
+            "chunk": len(archives),
+            "count": body["count"],
+            "data": compress_chunk(body),
+            "createdAt": created_at,
+            "archivedAt": now,
+        })
+    if not archives:
+        return 0
+
+    # Only now drop a partial archive left by an interrupted run
+    await db.session_archives.delete_many(key)
+    await db.session_archives.insert_many(archives, ordered=False)
+    await db.scheduling_metadata.update_one(key, {"$set": {
+        "archivedAt": now,
+        "archivedBytes": sum(len(archive["data"]) for archive in archives),
+    }})
+    await db.scheduled_courses.delete_many(key)
+    await db.scheduled_course_chunks.delete_many(key)
+    # Live clients drop the session; it stays listed in the catalog
+    await record_session_deletion(db, user_id, schedule_session_id)
+    return sum(archive["count"] for archive in archives)
+
+
+async def restore_session(db, user_id: str, schedule_session_id: str) -> int:
+    """
+    Bring an archived session back online in its original storage format
+
+    Returns:
+        Number of courses restored (0 if the session is not archived)
+    """
+    key = {"userId": user_id, "scheduleSessionId": schedule_session_id}
+    archives = await db.session_archives.find(key).sort("chunk", 1).to_list(length=None)
+    if not archives:
+        return 0
+
+    metadata = await db.scheduling_metadata.find_one(key, {"storage": 1}) or {}
+    now = datetime.utcnow()
+    restored = 0
+    for archive in archives:
+        body = decompress_chunk(archive["data"])
+        envelope = {**key, "createdAt": archive["createdAt"], "updatedAt": now}
+        if metadata.get("storage") == STORAGE_COLUMNAR:
+            await db.scheduled_course_chunks.insert_one({**envelope, "chunk": archive["chunk"], **body})
+        else:
+            courses = [{**course, **envelope} for course in decode_chunk(body)]
+            await db.scheduled_courses.insert_many(courses, ordered=False)
+        restored += body["count"]
+
+    await db.scheduling_metadata.update_one(key, {
+        "$unset": {"archivedAt": "", "archivedBytes": ""},
+        "$set": {"updatedAt": now},
+    })
+    await db.session_archives.delete_many(key)
+    return restored
@@ -0,0 +1,142 @@
+"""
+Audio Service
+Whisper 转写前的音频上传与分段
+
+上传按块写入临时文件，边写边检查大小上限，内存占用与文件大小无关。
+超过单段上限的文件用 ffmpeg segment 复用器按时间切分并直接复制音频流
+（-c copy），不解码为 PCM；分段时长由 ffprobe 读出的总时长按大小比例估算，
+个别分段仍超限（码率不均）时缩短时长重切。
+"""
+import asyncio
+import math
+import os
+import shutil
+import tempfile
+from typing import List, Tuple
+
+from app.services.import_service import UPLOAD_CHUNK_SIZE
+
+# Output extensions ffmpeg can't infer a muxer from
+SEGMENT_EXTENSIONS = {".mpga": ".mp3"}
+# Segments are sized for this fraction of the limit to absorb bitrate variation
+SEGMENT_SIZE_MARGIN = 0.9
+MAX_SEGMENT_ATTEMPTS = 3
+
+
+class UploadTooLargeError(ValueError):
+    """Upload exceeded the size limit while being received"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"File exceeds {max_bytes / 1024 / 1024:.0f}MB")
+        self.max_bytes = max_bytes
+
+
+class AudioProcessingError(RuntimeError):
+    """ffmpeg / ffprobe missing or failed"""
+
+
+async def save_audio_upload(upload, max_bytes: int) -> Tuple[str, int]:
+    """
+    Copy an UploadFile to a temporary file chunk by chunk
+
+    Returns:
+        (path, size in bytes); the partial file is removed when the limit is hit
+    """
+    suffix = os.path.splitext(upload.filename or "")[1].lower()
+    size = 0
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+        try:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+                temp_file.write(chunk)
+        except BaseException:
+            temp_file.close()
+            os.unlink(temp_file.name)
+            raise
+    return temp_file.name, size
+
+
+async def run_tool(*args: str) -> bytes:
+    """Run ffmpeg / ffprobe; returns stdout, raises AudioProcessingError on failure"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+    except FileNotFoundError:
+        raise AudioProcessingError(f"{args[0]} is not installed")
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        message = stderr.decode("utf-8", "replace").strip().splitlines()
+        raise AudioProcessingError(f"{args[0]} failed: {message[-1] if message else process.returncode}")
+    return stdout
+
+
+async def probe_duration(path: str) -> float:
+    """Container duration in seconds (read from headers, no decoding)"""
+    output = await run_tool(
+        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", path
+    )
+    try:
+        return float(output.strip())
+    except ValueError:
+        raise AudioProcessingError("Could not read audio duration")
+
+
+async def segment_audio(path: str, segment_seconds: float, output_dir: str) -> List[str]:
+    """Cut path into consecutive segment_seconds pieces with stream copy"""
+    extension = os.path.splitext(path)[1].lower()
+    extension = SEGMENT_EXTENSIONS.get(extension, extension)
+    await run_tool(
+        "ffmpeg", "-v", "error", "-y", "-i", path,
+        "-map", "0:a", "-c", "copy",
+        "-f", "segment", "-segment_time", f"{segment_seconds:.3f}", "-reset_timestamps", "1",
+        os.path.join(output_dir, f"segment%03d{extension}")
+    )
+    return [os.path.join(output_dir, name) for name in sorted(os.listdir(output_dir))]
+
+
+async def split_audio_file(path: str, max_size_mb: float) -> List[str]:
+    """
+    Split an audio file into segments no larger than max_size_mb
+
+    Returns:
+        Segment paths in order; [path] when the file already fits. Segments
+        live in a fresh temporary directory — remove it with cleanup_segments.
+    """
+    max_bytes = max_size_mb * 1024 * 1024
+    size = os.path.getsize(path)
+    if size <= max_bytes:
+        return [path]
+
+    duration = await probe_duration(path)
+    # Rounded up a whole second so frame alignment doesn't leave a sliver at the end
+    segment_seconds = math.floor(duration / math.ceil(size / (max_bytes * SEGMENT_SIZE_MARGIN))) + 1
+    output_dir = tempfile.mkdtemp(prefix="whisper-")
+    try:
+        for _ in range(MAX_SEGMENT_ATTEMPTS):
+            segments = await segment_audio(path, segment_seconds, output_dir)
+            largest = max(os.path.getsize(segment) for segment in segments)
+            if largest <= max_bytes:
+                return segments
+            for segment in segments:
+                os.unlink(segment)
+            segment_seconds *= max_bytes * SEGMENT_SIZE_MARGIN / largest
+        raise AudioProcessingError(f"Could not cut segments under {max_size_mb}MB")
+    except BaseException:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+
+
+def cleanup_segments(original_path: str, segment_paths: List[str]) -> None:
+    """Remove the uploaded file and the segment directory, if any"""
+    for segment_path in segment_paths:
+        if segment_path != original_path:
+            shutil.rmtree(os.path.dirname(segment_path), ignore_errors=True)
+            break
+    try:
+        os.unlink(original_path)
+    except OSError:
+        pass
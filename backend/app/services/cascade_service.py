@@ -0,0 +1,242 @@
+"""
+Cascade Service
+删除学生/教师/教室时级联清理引用数据
+
+课程（scheduled_courses）通过 studentId / teacherId / classroomId 引用实体，
+调整历史（adjustment_history）通过 targetType + targetId 引用。引用值可能是
+数据库 ID，也可能是同步前的客户端本地 ID（clientId），两者都会被清理。
+副本集/分片集群上实体与引用在同一事务中删除；单机 MongoDB 不支持事务，
+按 实体 → 课程 → 调整历史 的顺序执行，中途失败留下的孤儿由后台清理任务回收。
+
+列式存储与已归档的会话是只读快照，不做级联修改。
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+
+from app.core.config import settings
+from app.services.change_log_service import record_deletions
+from app.services.course_hours_service import apply_hours_delta, hours_delta, merge_deltas
+from app.services.session_service import record_session_write, retired_session_ids
+from app.services.teacher_hours_service import refresh_teacher_hours_summary
+from app.services.utilization_service import refresh_utilization_summary
+
+# Entity collection -> (adjustment targetType, course reference field)
+REFERENCES = {
+    "students": ("student", "studentId"),
+    "teachers": ("teacher", "teacherId"),
+    "classrooms": ("classroom", "classroomId"),
+}
+
+# Course fields needed to refund hours and refresh session summaries
+COURSE_CASCADE_PROJECTION = {
+    "scheduleSessionId": 1, "studentId": 1, "duration": 1,
+    "status": 1, "confirmationStatus": 1, "isVirtual": 1,
+}
+
+_transactions_supported: Optional[bool] = None
+
+
+async def transactions_supported(db) -> bool:
+    """Whether the deployment is a replica set or sharded cluster (checked once)"""
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = await db.command("hello")
+            _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            _transactions_supported = False
+    return _transactions_supported
+
+
+async def run_in_transaction(db, operation: Callable[[object], Awaitable]):
+    """Run operation(session) in a transaction where available, else with session=None"""
+    if not await transactions_supported(db):
+        return await operation(None)
+    async with await db.client.start_session() as session:
+        return await session.with_transaction(operation)
+
+
+def entity_refs(doc: dict) -> List[str]:
+    """Every value a course or adjustment may use to reference this entity"""
+    refs = [str(doc["_id"])]
+    if doc.get("clientId"):
+        refs.append(doc["clientId"])
+    return refs
+
+
+async def delete_references(
+    db, user_id: str, collection: str, refs: List[str], session=None
+) -> Tuple[List[dict], int]:
+    """
+    Delete the courses and adjustment records referencing the given entities
+
+    Returns:
+        (deleted courses with COURSE_CASCADE_PROJECTION fields, adjustments deleted)
+    """
+    target_type, field = REFERENCES[collection]
+
+    courses = await db.scheduled_courses.find(
+        {"userId": user_id, field: {"$in": refs}}, COURSE_CASCADE_PROJECTION, session=session
+    ).to_list(length=None)
+    if courses:
+        await db.scheduled_courses.delete_many(
+            {"_id": {"$in": [course["_id"] for course in courses]}}, session=session
+        )
+
+    adjustments = await db.adjustment_history.delete_many(
+        {"userId": user_id, "targetType": target_type, "targetId": {"$in": refs}}, session=session
+    )
+    if adjustments.deleted_count:
+        await db.adjustment_snapshots.update_many(
+            {"userId": user_id},
+            {"$unset": {f"state.{target_type}.{ref}": "" for ref in refs}},
+            session=session
+        )
+    return courses, adjustments.deleted_count
+
+
+async def _after_course_deletion(db, user_id: str, courses: List[dict]) -> None:
+    """Refund hours, tombstone the courses and update the affected sessions' catalog and summaries"""
+    if not courses:
+        return
+    # Retired sessions were refunded when they were retired
+    retired = await retired_session_ids(db, user_id, (course.get("scheduleSessionId") for course in courses))
+    await apply_hours_delta(db, user_id, merge_deltas(*(
+        hours_delta(course, None) for course in courses if course.get("scheduleSessionId") not in retired
+    )))
+    await record_deletions(db, user_id, "scheduled_courses", [course["_id"] for course in courses])
+    removed: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    for course in courses:
+        if course.get("scheduleSessionId"):
+            totals = removed[course["scheduleSessionId"]]
+            totals[0] += 1
+            totals[1] += course.get("duration") or 0
+    for schedule_session_id, (count, slots) in removed.items():
+        await record_session_write(db, user_id, schedule_session_id, -count, -slots, create=False)
+        await refresh_teacher_hours_summary(db, user_id, schedule_session_id)
+        await refresh_utilization_summary(db, user_id, schedule_session_id)
+
+
+async def cascade_references(db, user_id: str, collection: str, refs: List[str]) -> Tuple[int, int]:
+    """
+    Delete references to entities that are already gone (no transaction)
+
+    Returns:
+        (courses deleted, adjustments deleted)
+    """
+    courses, adjustments = await delete_references(db, user_id, collection, refs)
+    await _after_course_deletion(db, user_id, courses)
+    return len(courses), adjustments
+
+
+async def delete_entities(db, user_id: str, collection: str, entity_ids: Iterable[str]) -> dict:
+    """
+    Delete entities and everything referencing them
+
+    Returns:
+        {"deleted", "deletedIds", "coursesDeleted", "adjustmentsDeleted"}
+    """
+    object_ids = [ObjectId(entity_id) for entity_id in entity_ids if ObjectId.is_valid(entity_id)]
+    docs = await db[collection].find(
+        {"_id": {"$in": object_ids}, "userId": user_id}, {"clientId": 1}
+    ).to_list(length=None)
+    if not docs:
+        return {"deleted": 0, "deletedIds": [], "coursesDeleted": 0, "adjustmentsDeleted": 0}
+
+    refs = [ref for doc in docs for ref in entity_refs(doc)]
+
+    async def cascade(session):
+        await db[collection].delete_many(
+            {"_id": {"$in": [doc["_id"] for doc in docs]}, "userId": user_id}, session=session
+        )
+        return await delete_references(db, user_id, collection, refs, session)
+
+    courses, adjustments = await run_in_transaction(db, cascade)
+
+    deleted_ids = [str(doc["_id"]) for doc in docs]
+    await record_deletions(db, user_id, collection, deleted_ids)
+    await _after_course_deletion(db, user_id, courses)
+    return {
+        "deleted": len(docs),
+        "deletedIds": deleted_ids,
+        "coursesDeleted": len(courses),
+        "adjustmentsDeleted": adjustments,
+    }
+
+
+async def find_orphan_refs(
+    db, source: str, match: dict, ref_field: str, target: str
+) -> Dict[str, List[str]]:
+    """
+    References in `source` whose entity no longer exists in `target`
+
+    Rows are grouped by (userId, reference) first, so the $lookup runs once
+    per distinct referenced entity rather than once per row.
+
+    Returns:
+        userId -> orphaned reference values
+    """
+    pipeline = [
+        {"$match": {**match, ref_field: {"$type": "string", "$ne": ""}}},
+        {"$group": {"_id": {"userId": "$userId", "ref": f"${ref_field}"}}},
+        {"$lookup": {
+            "from": target,
+            "let": {
+                "userId": "$_id.userId",
+                "ref": "$_id.ref",
+                "oid": {"$convert": {"input": "$_id.ref", "to": "objectId", "onError": None, "onNull": None}},
+            },
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$userId", "$$userId"]},
+                    {"$or": [{"$eq": ["$_id", "$$oid"]}, {"$eq": ["$clientId", "$$ref"]}]},
+                ]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 1}},
+            ],
+            "as": "owner",
+        }},
+        {"$match": {"owner": {"$size": 0}}},
+    ]
+    orphans: Dict[str, List[str]] = defaultdict(list)
+    async for row in db[source].aggregate(pipeline):
+        orphans[row["_id"]["userId"]].append(row["_id"]["ref"])
+    return orphans
+
+
+async def sweep_orphans(db, grace: Optional[timedelta] = None) -> Dict[str, int]:
+    """
+    Delete courses and adjustment records whose entity is gone
+
+    Rows younger than the grace period are skipped, so references to an
+    entity that is still being synced from a client are left alone.
+
+    Returns:
+        {"courses": n, "adjustments": n}
+    """
+    if grace is None:
+        grace = timedelta(hours=settings.orphan_sweep_grace_hours)
+    cutoff = datetime.utcnow() - grace
+    totals = {"courses": 0, "adjustments": 0}
+
+    for collection, (target_type, field) in REFERENCES.items():
+        refs_by_user: Dict[str, set] = defaultdict(set)
+        course_orphans = await find_orphan_refs(
+            db, "scheduled_courses", {"createdAt": {"$lt": cutoff}}, field, collection
+        )
+        adjustment_orphans = await find_orphan_refs(
+            db, "adjustment_history", {"targetType": target_type, "timestamp": {"$lt": cutoff}},
+            "targetId", collection
+        )
+        for orphans in (course_orphans, adjustment_orphans):
+            for user_id, refs in orphans.items():
+                refs_by_user[user_id].update(refs)
+
+        for user_id, refs in refs_by_user.items():
+            courses, adjustments = await cascade_references(db, user_id, collection, sorted(refs))
+            totals["courses"] += courses
+            totals["adjustments"] += adjustments
+    return totals
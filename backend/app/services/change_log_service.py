@@ -0,0 +1,143 @@
+"""
+Change Log Service
+增量同步：按 updatedAt 查询变更，删除操作记录到 tombstones 集合
+
+水位（watermark）为服务端毫秒时间戳。查询时向前重叠 WATERMARK_OVERLAP，
+避免与查询同时提交的写入被漏掉；客户端按 id 幂等合并，重复返回无副作用。
+tombstones 通过 TTL 索引自动过期；客户端水位早于保留期时返回 reset，
+要求其全量重新加载。
+
+列式存储的会话（columnar_service）课程不在 scheduled_courses 中，按会话返回
+changes.courseSessions 条目（会话目录 updatedAt 变化即列出），客户端据此
+整体重新读取该会话；归档会话以 deleted.courseSessions 墓碑通知客户端丢弃，
+恢复后再作为普通变更出现。
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.services.columnar_service import STORAGE_COLUMNAR
+
+WATERMARK_OVERLAP = timedelta(seconds=5)
+
+# API name -> Mongo collection
+SYNCED_COLLECTIONS = {
+    "students": "students",
+    "teachers": "teachers",
+    "classrooms": "classrooms",
+    "courses": "scheduled_courses",
+}
+
+COURSE_SESSION_KIND = "courseSession"
+
+
+def to_watermark(moment: datetime) -> int:
+    """datetime (UTC) -> epoch milliseconds"""
+    return int((moment - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+
+def from_watermark(watermark: int) -> datetime:
+    """epoch milliseconds -> naive UTC datetime"""
+    return datetime(1970, 1, 1) + timedelta(milliseconds=watermark)
+
+
+async def record_deletions(db, user_id: str, collection: str, entity_ids: Iterable[str]) -> None:
+    """Write one tombstone per deleted entity (single insert_many)"""
+    now = datetime.utcnow()
+    tombstones = [
+        {"userId": user_id, "collection": collection, "entityId": str(entity_id), "deletedAt": now}
+        for entity_id in entity_ids
+    ]
+    if tombstones:
+        await db.tombstones.insert_many(tombstones, ordered=False)
+
+
+async def record_session_deletion(db, user_id: str, schedule_session_id: str) -> None:
+    """Tombstone a whole schedule session instead of every course in it"""
+    await db.tombstones.insert_one({
+        "userId": user_id,
+        "collection": COURSE_SESSION_KIND,
+        "entityId": schedule_session_id,
+        "deletedAt": datetime.utcnow(),
+    })
+
+
+async def get_changes(
+    db,
+    user_id: str,
+    since: Optional[int],
+    collections: Optional[List[str]] = None,
+    schedule_session_id: Optional[str] = None
+) -> dict:
+    """
+    Collect documents changed and ids deleted since a watermark
+
+    Args:
+        db: Database handle
+        user_id: Tenant id
+        since: Watermark from a previous call (None = everything, acts as a full load)
+        collections: Subset of SYNCED_COLLECTIONS keys
+        schedule_session_id: Restrict course changes to one session
+
+    Returns:
+        {"watermark", "reset", "changes": {name: [docs]}, "deleted": {name: [ids]}};
+        with courses, changes["courseSessions"] lists changed columnar sessions
+    """
+    now = datetime.utcnow()
+    names = collections or list(SYNCED_COLLECTIONS)
+    result = {
+        "watermark": to_watermark(now),
+        "reset": False,
+        "changes": {},
+        "deleted": {},
+    }
+
+    since_at = None
+    if since is not None:
+        since_at = from_watermark(since) - WATERMARK_OVERLAP
+        retention = timedelta(days=settings.tombstone_retention_days)
+        if since_at < now - retention:
+            # Tombstones may have expired: the client must reload everything
+            result["reset"] = True
+            return result
+
+    for name in names:
+        query = {"userId": user_id}
+        if since_at is not None:
+            query["updatedAt"] = {"$gt": since_at}
+        if name == "courses" and schedule_session_id:
+            query["scheduleSessionId"] = schedule_session_id
+
+        docs = await db[SYNCED_COLLECTIONS[name]].find(
+            query, {"userId": 0, "clientId": 0}
+        ).to_list(length=None)
+        for doc in docs:
+            doc["id"] = str(doc.pop("_id"))
+        result["changes"][name] = docs
+
+    if "courses" in names:
+        # Columnar courses have no per-course updatedAt: report the session instead
+        query = {"userId": user_id, "storage": STORAGE_COLUMNAR,
+                 "archivedAt": {"$exists": False}, "retiredAt": {"$exists": False}}
+        if since_at is not None:
+            query["updatedAt"] = {"$gt": since_at}
+        if schedule_session_id:
+            query["scheduleSessionId"] = schedule_session_id
+        result["changes"]["courseSessions"] = await db.scheduling_metadata.find(
+            query, {"_id": 0, "scheduleSessionId": 1, "storage": 1, "updatedAt": 1}
+        ).to_list(length=None)
+
+    if since_at is not None:
+        kinds: Dict[str, str] = {SYNCED_COLLECTIONS[name]: name for name in names}
+        if "courses" in names:
+            kinds[COURSE_SESSION_KIND] = "courseSessions"
+        deleted: Dict[str, List[str]] = {name: [] for name in kinds.values()}
+        cursor = db.tombstones.find(
+            {"userId": user_id, "deletedAt": {"$gt": since_at}, "collection": {"$in": list(kinds)}},
+            {"collection": 1, "entityId": 1}
+        )
+        async for tombstone in cursor:
+            deleted[kinds[tombstone["collection"]]].append(tombstone["entityId"])
+        result["deleted"] = deleted
+
+    return result
@@ -0,0 +1,259 @@
+"""
+Columnar Service
+排课会话的列式存储格式
+
+一个会话保存为少量块文档（scheduled_course_chunks，每块最多 CHUNK_ROWS 门课程），
+不再是每门课程一个文档：
+
+- 学生/教师/教室保存为块内字典表（id + 名称各一次），课程只存表下标
+- subject/campus/mode/status/confirmationStatus/color 按取值字典编码
+- day/startSlot/duration/下标等数值列用 numpy 打包为 uint8/uint16 二进制
+- 课程ID（ObjectId）连续存放为 12 字节一组的二进制列，读取时保持稳定
+
+列式会话是只读快照：单门课程的修改仍针对文档存储的会话，
+修改列式会话应重新发布一个新会话。
+"""
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+import numpy as np
+from bson import Binary, ObjectId
+
+from app.core.constants import SLOTS_PER_HOUR
+
+STORAGE_DOCUMENTS = "documents"
+STORAGE_COLUMNAR = "columnar"
+STORAGE_MODES = (STORAGE_DOCUMENTS, STORAGE_COLUMNAR)
+
+# Rows per chunk document (~30 bytes/row keeps chunks far below the 16MB limit)
+CHUNK_ROWS = 50000
+
+# Resource references: course field -> (table, name field)
+REFERENCE_COLUMNS = {
+    "studentId": ("students", "studentName"),
+    "teacherId": ("teachers", "teacherName"),
+    "classroomId": ("classrooms", "classroomName"),
+}
+
+# Low-cardinality values stored as codes into a per-chunk dictionary
+CATEGORICAL_COLUMNS = ("subject", "campus", "mode", "status", "confirmationStatus", "color")
+
+# Fixed-width numeric columns
+NUMERIC_COLUMNS = {"day": "u1", "startSlot": "u2", "duration": "u2", "isVirtual": "u1"}
+
+ID_BYTES = 12
+
+
+def _code_dtype(size: int) -> str:
+    return "u2" if size <= 0xFFFF else "u4"
+
+
+def _pack(values, dtype: str) -> dict:
+    return {"dtype": dtype, "data": Binary(np.asarray(values, dtype=dtype).tobytes())}
+
+
+def _unpack(column: dict) -> np.ndarray:
+    return np.frombuffer(column["data"], dtype=column["dtype"])
+
+
+def _dictionary_encode(values: list) -> tuple:
+    """Distinct values (first-seen order) and the code of every value"""
+    distinct = list(dict.fromkeys(values))
+    index = {value: code for code, value in enumerate(distinct)}
+    return distinct, [index[value] for value in values]
+
+
+def encode_chunk(courses: List[dict]) -> dict:
+    """
+    Encode courses (ScheduledCourseBase dumps with "_id") as one chunk body
+
+    Returns:
+        {"count", "ids", "tables", "dictionaries", "columns"}
+    """
+    tables: Dict[str, dict] = {}
+    dictionaries: Dict[str, list] = {}
+    columns: Dict[str, dict] = {}
+
+    for field, (table, name_field) in REFERENCE_COLUMNS.items():
+        ids, codes = _dictionary_encode([course.get(field) for course in courses])
+        names = dict(zip((course.get(field) for course in courses), (course.get(name_field) for course in courses)))
+        tables[table] = {"ids": ids, "names": [names[key] for key in ids]}
+        columns[field] = _pack(codes, _code_dtype(len(ids)))
+
+    for field in CATEGORICAL_COLUMNS:
+        dictionaries[field], codes = _dictionary_encode([course.get(field) for course in courses])
+        columns[field] = _pack(codes, _code_dtype(len(dictionaries[field])))
+
+    for field, dtype in NUMERIC_COLUMNS.items():
+        columns[field] = _pack([int(course.get(field) or 0) for course in courses], dtype)
+
+    columns["score"] = _pack(
+        [np.nan if course.get("score") is None else course["score"] for course in courses], "f8"
+    )
+
+    return {
+        "count": len(courses),
+        "ids": Binary(b"".join(course["_id"].binary for course in courses)),
+        "tables": tables,
+        "dictionaries": dictionaries,
+        "columns": columns,
+    }
+
+
+def _row_mask(chunk: dict, filters: Dict[str, object]) -> Optional[np.ndarray]:
+    """Boolean mask for equality filters, evaluated on the packed columns"""
+    mask = None
+    for field, value in filters.items():
+        if field in REFERENCE_COLUMNS:
+            ids = chunk["tables"][REFERENCE_COLUMNS[field][0]]["ids"]
+            selected = _unpack(chunk["columns"][field]) == (ids.index(value) if value in ids else -1)
+        elif field in CATEGORICAL_COLUMNS:
+            values = chunk["dictionaries"][field]
+            selected = _unpack(chunk["columns"][field]) == (values.index(value) if value in values else -1)
+        elif field in NUMERIC_COLUMNS:
+            selected = _unpack(chunk["columns"][field]) == int(value)
+        else:
+            raise ValueError(f"Unsupported filter on columnar session: {field}")
+        mask = selected if mask is None else mask & selected
+    return mask
+
+
+def decode_chunk(
+    chunk: dict,
+    filters: Optional[Dict[str, object]] = None,
+    fields: Optional[Iterable[str]] = None
+) -> List[dict]:
+    """
+    Decode a chunk back into course documents
+
+    Args:
+        chunk: Stored chunk document
+        filters: Equality filters on course fields, applied before decoding
+        fields: Course fields to materialize (None = all); "_id" is always set
+
+    Returns:
+        Course dicts shaped like scheduled_courses documents
+    """
+    rows = np.arange(chunk["count"])
+    mask = _row_mask(chunk, filters or {})
+    if mask is not None:
+        rows = rows[mask]
+
+    wanted = set(fields) if fields is not None else None
+
+    def want(field: str) -> bool:
+        return wanted is None or field in wanted
+
+    def codes(field: str) -> list:
+        return _unpack(chunk["columns"][field])[rows].tolist()
+
+    id_bytes = bytes(chunk["ids"])
+    keys = ["_id"]
+    values = [[ObjectId(id_bytes[row * ID_BYTES:(row + 1) * ID_BYTES]) for row in rows.tolist()]]
+
+    for field, (table, name_field) in REFERENCE_COLUMNS.items():
+        if not (want(field) or want(name_field)):
+            continue
+        field_codes = codes(field)
+        if want(field):
+            ids = chunk["tables"][table]["ids"]
+            keys.append(field)
+            values.append([ids[code] for code in field_codes])
+        if want(name_field):
+            names = chunk["tables"][table]["names"]
+            keys.append(name_field)
+            values.append([names[code] for code in field_codes])
+
+    for field in CATEGORICAL_COLUMNS:
+        if want(field):
+            distinct = chunk["dictionaries"][field]
+            keys.append(field)
+            values.append([distinct[code] for code in codes(field)])
+
+    for field in NUMERIC_COLUMNS:
+        if want(field):
+            keys.append(field)
+            column = codes(field)
+            values.append([bool(v) for v in column] if field == "isVirtual" else column)
+
+    if want("score"):
+        keys.append("score")
+        values.append([None if s != s else s for s in codes("score")])
+
+    for field in ("scheduleSessionId", "createdAt", "updatedAt"):
+        if want(field) and field in chunk:
+            keys.append(field)
+            values.append([chunk[field]] * len(rows))
+
+    return [dict(zip(keys, row)) for row in zip(*values)]
+
+
+async def write_columnar_session(
+    db, user_id: str, schedule_session_id: str, courses: List[dict]
+) -> List[dict]:
+    """
+    Store a session as chunk documents
+
+    Returns:
+        The courses with their assigned "_id"
+    """
+    now = datetime.utcnow()
+    for course in courses:
+        course.setdefault("_id", ObjectId())
+
+    chunks = [
+        {
+            "userId": user_id,
+            "scheduleSessionId": schedule_session_id,
+            "chunk": index,
+            "createdAt": now,
+            "updatedAt": now,
+            **encode_chunk(courses[start:start + CHUNK_ROWS]),
+        }
+        for index, start in enumerate(range(0, len(courses), CHUNK_ROWS))
+    ]
+    if chunks:
+        await db.scheduled_course_chunks.insert_many(chunks, ordered=False)
+    return courses
+
+
+async def is_columnar_session(db, user_id: str, schedule_session_id: str) -> bool:
+    """Whether a session is stored in columnar format"""
+    chunk = await db.scheduled_course_chunks.find_one(
+        {"userId": user_id, "scheduleSessionId": schedule_session_id}, {"_id": 1}
+    )
+    return chunk is not None
+
+
+async def iter_columnar_courses(
+    db,
+    user_id: str,
+    schedule_session_id: str,
+    filters: Optional[Dict[str, object]] = None,
+    fields: Optional[Iterable[str]] = None
+) -> AsyncIterator[dict]:
+    """Decode a columnar session chunk by chunk"""
+    cursor = db.scheduled_course_chunks.find(
+        {"userId": user_id, "scheduleSessionId": schedule_session_id}
+    ).sort("chunk", 1)
+    async for chunk in cursor:
+        for course in decode_chunk(chunk, filters, fields):
+            yield course
+
+
+async def load_columnar_courses(db, user_id: str, schedule_session_id: str,
+                                fields: Optional[Iterable[str]] = None) -> List[dict]:
+    """Decode a whole columnar session into a list"""
+    return [course async for course in iter_columnar_courses(db, user_id, schedule_session_id, fields=fields)]
+
+
+def confirmed_hours_by_student(courses: Iterable[dict]) -> Dict[str, float]:
+    """Python counterpart of course_hours_service.session_hours_by_student"""
+    slots: Dict[str, int] = {}
+    for course in courses:
+        if (course.get("confirmationStatus") == "confirmed"
+                and course.get("status", "scheduled") == "scheduled"
+                and not course.get("isVirtual")
+                and course.get("studentId")):
+            slots[course["studentId"]] = slots.get(course["studentId"], 0) + course.get("duration", 0)
+    return {student_id: total / SLOTS_PER_HOUR for student_id, total in slots.items() if total}
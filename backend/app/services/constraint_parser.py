@@ -0,0 +1,532 @@
+"""
+Constraint Parser
+学生时间偏好（rawData）规则解析器
+
+移植自前端 NLPTimeParser / SubjectParser：正则在模块加载时编译，星期、时段、
+中文数字等均为查表。输出与 LLM 解析（/ai/openai/parse-constraint）相同的约束
+结构，外加 confidence：按未识别文字占比与日期等特殊表达估算，低于阈值的
+结果再交给 LLM。
+
+解析是纯 CPU 计算且无外部依赖，大批量时按块分发到进程池。
+"""
+import asyncio
+import math
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.constants import DAYS_PER_WEEK, SLOTS_PER_DAY, SLOTS_PER_HOUR, STANDARD_START, TIME_GRANULARITY
+
+ALL_DAYS = frozenset(range(DAYS_PER_WEEK))
+WEEKDAYS = frozenset({1, 2, 3, 4, 5})
+WEEKEND = frozenset({0, 6})
+
+# ============================================================================
+# Lookup tables
+# ============================================================================
+
+CN_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+DAY_CHARS = {
+    "日": 0, "天": 0, "一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6,
+    "1": 1, "2": 2, "3": 3, "4": 4, "5": 5, "6": 6, "7": 0,
+}
+
+DAY_GROUPS = {
+    "平日": WEEKDAYS, "工作日": WEEKDAYS, "周内": WEEKDAYS, "周中": WEEKDAYS,
+    "周末": WEEKEND, "双休": WEEKEND, "双休日": WEEKEND,
+    "每天": ALL_DAYS, "天天": ALL_DAYS, "每日": ALL_DAYS, "全周": ALL_DAYS,
+}
+
+# Period -> (start slot, end slot); slot 0 is 9:00
+PERIODS = {
+    "上午": (0, 36), "早上": (0, 36), "早晨": (0, 36),
+    "中午": (24, 60),
+    "下午": (60, 108),
+    "傍晚": (96, 120),
+    "晚上": (108, SLOTS_PER_DAY), "夜里": (108, SLOTS_PER_DAY),
+    "白天": (0, 108),
+    "全天": (0, SLOTS_PER_DAY), "早中晚": (0, SLOTS_PER_DAY),
+}
+MORNING_PERIODS = {"上午", "早上", "早晨"}
+PM_PERIODS = {"中午", "下午", "傍晚", "晚上", "夜里"}
+
+# ============================================================================
+# Precompiled patterns
+# ============================================================================
+
+NORMALIZE = str.maketrans({
+    "：": ":", "～": "~", "〜": "~", "－": "-", "—": "-", "–": "-", "，": ",", "；": ";",
+    "（": "(", "）": ")", "０": "0", "１": "1", "２": "2", "３": "3", "４": "4",
+    "５": "5", "６": "6", "７": "7", "８": "8", "９": "9",
+})
+
+DATE_RE = re.compile(
+    r"\d{1,2}/\d{1,2}(?:\s*[-~到至]\s*\d{1,2}/\d{1,2})?"
+    r"|\d{1,2}月(?:\d{1,2}(?:\s*[-~到至]\s*\d{1,2})?[日号]?)?"
+    r"|\d{1,2}(?:\s*[-~到至]\s*\d{1,2})?[日号]"
+    r"|[一二三四五六七八九十]{1,3}号"
+    r"|(?<![\d:])(?:0?[1-9]|1[0-2])(?:[0-2]\d|3[01])(?:\s*-\s*(?:0?[1-9]|1[0-2])(?:[0-2]\d|3[01]))?(?![\d:点时])"
+)
+# "、" only ends a clause when no day follows it ("周二、周四晚上" stays one clause)
+CLAUSE_SPLIT_RE = re.compile(r"[,;。!?！？\n]+|、+(?!\s*(?:周|星期|礼拜|[一二三四五六日天1-7]))")
+PAREN_RE = re.compile(r"\(([^()]*)\)")
+
+_CN_HOUR = r"[一二两三四五六七八九十]{1,3}"
+
+
+def _clock(p: str) -> str:
+    """Clock time pattern with group names prefixed by p: 14, 14:30, 2点半, 两点"""
+    return (
+        rf"(?:(?P<{p}h>\d{{1,2}})(?:[:.](?P<{p}m>\d{{2}})|\s*[点时](?P<{p}half>半)?(?:(?P<{p}m2>\d{{1,2}})分?)?)?"
+        rf"|(?P<{p}cn>{_CN_HOUR})[点时](?P<{p}cnhalf>半)?)"
+    )
+
+
+RANGE_RE = re.compile(
+    _clock("a") + r"\s*(?:[-~到至]|～)\s*" + _clock("b") + r"(?![号日月/])"
+)
+BOUND_RE = re.compile(
+    r"(?P<earliest>最早)?\s*" + _clock("a")
+    + r"\s*(?P<rel>之后|以后|后|开始|以前|之前|前|以内)"
+)
+WEEKDAY_RANGE_RE = re.compile(
+    r"(?:周|星期|礼拜)([一二三四五六日天1-7])\s*[-~到至]\s*(?:周|星期|礼拜)?([一二三四五六日天1-7])"
+)
+WEEKDAY_LIST_RE = re.compile(
+    r"(?:每)?(?:周|星期|礼拜)((?:[一二三四五六日天1-7](?![次回节个])[、和及与跟]?)+)"
+)
+DAY_GROUP_RE = re.compile("|".join(sorted(DAY_GROUPS, key=len, reverse=True)))
+PERIOD_RE = re.compile("|".join(sorted(PERIODS, key=len, reverse=True)))
+
+NEGATION_RE = re.compile(r"除了|除去|除外|出了|排除|以外|之外|不行|不能|不可以|不要|不排|不方便|没空|别|除")
+PREFERENCE_RE = re.compile(r"尽量|最好|优先|希望|尤其|更好|能.{0,3}就")
+ONLY_RE = re.compile(r"只有|只能|仅|只")
+FLEXIBLE_RE = re.compile(r"都可以|都行|均可|随意|随时|都ok|都OK|皆可")
+FREQUENCY_RE = re.compile(
+    r"(?P<weeks>[一两二三1-3])?\s*周\s*(?P<times>\d|[一两二三四五六七])\s*[次回节]"
+    r"|每周\s*(?P<weekly>\d|[一两二三四五六七])\s*[次回节]"
+)
+DURATION_RE = re.compile(r"(?P<hours>\d+(?:\.\d+)?|[一两二三四五六])\s*(?:个)?\s*(?:小时|时间|h\b)")
+# Joins two day expressions that share the times after the second ("周二和周四晚上")
+DAY_JOINER_RE = re.compile(r"[\s、和及与跟]*")
+# Words that carry no scheduling information; excluded from the coverage estimate
+FILLER_RE = re.compile(
+    r"可以|就行|也行|ok|OK|语校|其他|其余|的话|时间|之间|排课|上课|课程|接受|也|都|的|需|要|能|想|排|在|是|有|和|或者|或|or|课|/|\s|\d+\s*次|[()\-~.:]"
+)
+
+
+# ============================================================================
+# Primitive parsers
+# ============================================================================
+
+def cn_number(text: str) -> Optional[int]:
+    """一..九十九 -> int"""
+    if text.isdigit():
+        return int(text)
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        value = (CN_DIGITS.get(tens, 0) if tens else 1) * 10
+        return value + (CN_DIGITS.get(ones, 0) if ones else 0)
+    return CN_DIGITS.get(text)
+
+
+def clock_minutes(match: re.Match, prefix: str) -> Optional[Tuple[int, int]]:
+    """(hour, minute) of a _CLOCK group, or None if the group did not match"""
+    groups = match.groupdict()
+    if groups.get(f"{prefix}h") is not None:
+        hour = int(groups[f"{prefix}h"])
+        if groups.get(f"{prefix}half"):
+            minute = 30
+        else:
+            minute = int(groups.get(f"{prefix}m") or groups.get(f"{prefix}m2") or 0)
+    elif groups.get(f"{prefix}cn") is not None:
+        hour = cn_number(groups[f"{prefix}cn"])
+        minute = 30 if groups.get(f"{prefix}cnhalf") else 0
+    else:
+        return None
+    if hour is None or hour > 24 or minute >= 60:
+        return None
+    return hour, minute
+
+
+def to_slot(hour: int, minute: int, pm: bool) -> int:
+    """Clock time -> slot; hours before opening (or in a PM context) are read as afternoon"""
+    if hour < 12 and (pm or hour < STANDARD_START):
+        hour += 12
+    slot = (hour - STANDARD_START) * SLOTS_PER_HOUR + minute // TIME_GRANULARITY
+    return max(0, min(SLOTS_PER_DAY, slot))
+
+
+def merge_ranges(ranges: Iterable[dict]) -> List[dict]:
+    """Merge overlapping ranges per day (day None sorts first)"""
+    by_day: Dict[Optional[int], List[Tuple[int, int]]] = {}
+    for entry in ranges:
+        by_day.setdefault(entry["day"], []).append((entry["start"], entry["end"]))
+    merged = []
+    for day in sorted(by_day, key=lambda value: -1 if value is None else value):
+        spans = sorted(by_day[day])
+        start, end = spans[0]
+        for next_start, next_end in spans[1:]:
+            if next_start <= end:
+                end = max(end, next_end)
+            else:
+                merged.append({"day": day, "start": start, "end": end})
+                start, end = next_start, next_end
+        merged.append({"day": day, "start": start, "end": end})
+    return merged
+
+
+# ============================================================================
+# Segments
+# ============================================================================
+
+class Segment:
+    """One day expression and the times that follow it"""
+
+    __slots__ = ("days", "ranges", "negated", "preferred", "spans")
+
+    def __init__(self):
+        self.days: Optional[Set[int]] = None
+        self.ranges: List[Tuple[int, int]] = []
+        self.negated = False
+        self.preferred = False
+        self.spans: List[Tuple[int, int]] = []
+
+
+def day_matches(clause: str) -> List[Tuple[int, int, Set[int]]]:
+    """(start, end, days) of every day expression in a clause, in order"""
+    found = []
+    taken: List[Tuple[int, int]] = []
+
+    def free(start, end):
+        return all(end <= s or start >= e for s, e in taken)
+
+    for match in WEEKDAY_RANGE_RE.finditer(clause):
+        first, last = DAY_CHARS[match.group(1)], DAY_CHARS[match.group(2)]
+        # Sunday (0) as an end means the end of the week
+        last = 7 if last == 0 and first > 0 else last
+        days = {day % 7 for day in range(first, last + 1)} if first <= last else \
+            {day % 7 for day in range(first, last + 8)}
+        found.append((match.start(), match.end(), days))
+        taken.append(match.span())
+    for match in DAY_GROUP_RE.finditer(clause):
+        if free(*match.span()):
+            found.append((match.start(), match.end(), set(DAY_GROUPS[match.group()])))
+            taken.append(match.span())
+    for match in WEEKDAY_LIST_RE.finditer(clause):
+        if free(*match.span()):
+            days = {DAY_CHARS[char] for char in match.group(1) if char in DAY_CHARS}
+            found.append((match.start(), match.end(), days))
+            taken.append(match.span())
+    return sorted(found, key=lambda item: item[0])
+
+
+def parse_segment(text: str, offset: int, segment: Segment) -> None:
+    """Times, periods, negation and preference within one segment"""
+    periods = [(match.span(), match.group()) for match in PERIOD_RE.finditer(text)]
+    pm = any(name in PM_PERIODS for _, name in periods)
+    for (start, end), _ in periods:
+        segment.spans.append((offset + start, offset + end))
+
+    explicit: List[Tuple[int, int]] = []
+    consumed: List[Tuple[int, int]] = []
+    for match in RANGE_RE.finditer(text):
+        first, second = clock_minutes(match, "a"), clock_minutes(match, "b")
+        if not first or not second:
+            continue
+        start_slot = to_slot(*first, pm)
+        end_slot = to_slot(*second, pm or first[0] >= 12 or first[0] < STANDARD_START)
+        if end_slot <= start_slot:
+            continue
+        explicit.append((start_slot, end_slot))
+        consumed.append(match.span())
+        segment.spans.append((offset + match.start(), offset + match.end()))
+
+    for match in BOUND_RE.finditer(text):
+        if any(match.start() < e and match.end() > s for s, e in consumed):
+            continue
+        clock = clock_minutes(match, "a")
+        if not clock:
+            continue
+        slot = to_slot(*clock, pm)
+        if match.group("rel") in ("之后", "以后", "后", "开始") or match.group("earliest"):
+            morning = [PERIODS[name] for _, name in periods if name in MORNING_PERIODS]
+            end = max(end for _, end in morning) if morning and slot < morning[0][1] else SLOTS_PER_DAY
+            span = (slot, end)
+        else:
+            starts = [PERIODS[name][0] for _, name in periods]
+            span = (min(starts) if starts and min(starts) < slot else 0, slot)
+        if span[0] < span[1]:
+            explicit.append(span)
+            segment.spans.append((offset + match.start(), offset + match.end()))
+
+    if explicit:
+        segment.ranges.extend(explicit)
+    else:
+        segment.ranges.extend(PERIODS[name] for _, name in periods)
+
+    for pattern in (NEGATION_RE, PREFERENCE_RE):
+        for match in pattern.finditer(text):
+            segment.spans.append((offset + match.start(), offset + match.end()))
+    segment.negated = NEGATION_RE.search(text) is not None
+    segment.preferred = PREFERENCE_RE.search(text) is not None
+
+
+def split_segments(clause: str) -> List[Segment]:
+    """Cut a clause at each day expression: '平日上午晚上周末全天' -> [平日上午晚上][周末全天]"""
+    matches = day_matches(clause)
+    bounds = [start for start, _, _ in matches]
+    if not bounds or bounds[0] != 0:
+        bounds.insert(0, 0)
+    segments = []
+    bare = []  # segments holding nothing but a day expression and a joiner
+    for index, start in enumerate(bounds):
+        end = bounds[index + 1] if index + 1 < len(bounds) else len(clause)
+        segment = Segment()
+        day_end = start
+        for match_start, match_end, days in matches:
+            if match_start == start:
+                segment.days = days
+                segment.spans.append((match_start, match_end))
+                day_end = match_end
+        parse_segment(clause[start:end], start, segment)
+        segments.append(segment)
+        bare.append(segment.days is not None and DAY_JOINER_RE.fullmatch(clause[day_end:end]) is not None)
+    # A leading negation ("除了平日下午") applies to the segment that follows it
+    if len(segments) > 1 and segments[0].days is None and not segments[0].ranges and segments[0].negated:
+        segments[1].negated = True
+        segments[1].preferred = segments[1].preferred or segments[0].preferred
+        segments[1].spans.extend(segments[0].spans)
+        segments.pop(0)
+        bare.pop(0)
+    # Bare days share the times of the day expression after them: "周二、周四晚上"
+    for index in range(len(segments) - 2, -1, -1):
+        segment, following = segments[index], segments[index + 1]
+        if bare[index] and following.days is not None and following.ranges:
+            segment.ranges = list(following.ranges)
+            segment.negated = following.negated = segment.negated or following.negated
+            segment.preferred = following.preferred = segment.preferred or following.preferred
+    return segments
+
+
+def split_clauses(text: str) -> List[str]:
+    """Clauses split at punctuation; parenthesised remarks join their clause unless they hold a date"""
+    def inline(match):
+        inner = match.group(1)
+        return f",{inner}," if "\x00" in inner else f" {inner} "
+    return [clause.strip() for clause in CLAUSE_SPLIT_RE.split(PAREN_RE.sub(inline, text)) if clause.strip()]
+
+
+# ============================================================================
+# Parser
+# ============================================================================
+
+def parse_frequency(text: str) -> Optional[float]:
+    match = FREQUENCY_RE.search(text)
+    if not match:
+        return None
+    times = cn_number(match.group("weekly") or match.group("times"))
+    weeks = cn_number(match.group("weeks")) if match.group("weeks") else 1
+    if not times or not weeks:
+        return None
+    return round(times / weeks, 2)
+
+
+def parse_duration_slots(text: str) -> Optional[int]:
+    match = DURATION_RE.search(text)
+    if not match:
+        return None
+    hours = match.group("hours")
+    value = float(hours) if hours[0].isdigit() else cn_number(hours)
+    return int(value * SLOTS_PER_HOUR) if value else None
+
+
+def parse_constraint(raw_text: Optional[str]) -> dict:
+    """
+    Parse one rawData string into a constraint
+
+    Returns:
+        {allowedDays, allowedTimeRanges, excludedTimeRanges, strictness,
+         confidence, reasoning, source, [timesPerWeek], [durationSlots]}
+    """
+    text = (raw_text or "").strip().translate(NORMALIZE)
+    result = {
+        "allowedDays": sorted(ALL_DAYS),
+        "allowedTimeRanges": [],
+        "excludedTimeRanges": [],
+        "strictness": "flexible",
+        "confidence": 1.0,
+        "reasoning": "无约束",
+        "source": "rules",
+    }
+    if not text:
+        return result
+
+    text, date_count = DATE_RE.subn("\x00", text)
+    segments: List[Segment] = []
+    recognized = 0
+    inherited: Optional[Set[int]] = None
+    for clause in split_clauses(text):
+        clause_segments = split_segments(clause)
+        for segment in clause_segments:
+            if segment.days is None and segment.ranges and inherited is not None:
+                segment.days = inherited
+            if segment.days is not None and not segment.negated:
+                inherited = segment.days
+        covered = set()
+        for segment in clause_segments:
+            for start, end in segment.spans:
+                covered.update(range(start, end))
+        leftover = "".join(char for index, char in enumerate(clause) if index not in covered)
+        leftover = FLEXIBLE_RE.sub("", ONLY_RE.sub("", FILLER_RE.sub("", leftover)))
+        leftover = FREQUENCY_RE.sub("", DURATION_RE.sub("", leftover)).replace("\x00", "")
+        recognized += len(clause) - len(leftover)
+        segments.extend(clause_segments)
+
+    meaningful = len(text.replace(" ", "")) or 1
+    unknown_ratio = 1 - min(recognized, meaningful) / meaningful
+
+    positive = [segment for segment in segments if not segment.negated and (segment.days is not None or segment.ranges)]
+    negative = [segment for segment in segments if segment.negated and (segment.days is not None or segment.ranges)]
+    if positive:
+        # "周末全天，平日除了早上": the weekdays are available apart from the excluded time
+        for segment in negative:
+            if segment.days is not None and segment.ranges:
+                available = Segment()
+                available.days = segment.days
+                positive.append(available)
+    preferred = any(segment.preferred for segment in segments)
+
+    allowed_days: Set[int] = set()
+    for segment in positive:
+        allowed_days.update(segment.days if segment.days is not None else ALL_DAYS)
+    if not allowed_days:
+        allowed_days = set(ALL_DAYS)
+
+    excluded = []
+    for segment in negative:
+        ranges = segment.ranges or [(0, SLOTS_PER_DAY)]
+        if not segment.ranges and not segment.preferred and segment.days is not None:
+            allowed_days -= segment.days
+            continue
+        for start, end in ranges:
+            if segment.days is None:
+                excluded.append({"day": None, "start": start, "end": end})
+            else:
+                excluded.extend({"day": day, "start": start, "end": end} for day in sorted(segment.days))
+
+    ranged = [segment for segment in positive if segment.ranges]
+    per_day = any(segment.days is not None and segment.days != allowed_days for segment in ranged)
+    allowed = []
+    for segment in positive:
+        ranges = segment.ranges or ([(0, SLOTS_PER_DAY)] if per_day else [])
+        for start, end in ranges:
+            if per_day:
+                days = segment.days if segment.days is not None else allowed_days
+                allowed.extend({"day": day, "start": start, "end": end} for day in sorted(days & allowed_days))
+            else:
+                allowed.append({"day": None, "start": start, "end": end})
+
+    result["allowedDays"] = sorted(allowed_days) or sorted(ALL_DAYS)
+    result["allowedTimeRanges"] = merge_ranges(allowed)
+    result["excludedTimeRanges"] = merge_ranges(excluded)
+    if preferred:
+        result["strictness"] = "preferred"
+    elif ONLY_RE.search(text) or result["allowedTimeRanges"] or set(result["allowedDays"]) != ALL_DAYS:
+        result["strictness"] = "strict"
+
+    confidence = 0.95 - 0.8 * unknown_ratio
+    if date_count:
+        confidence = min(confidence, 0.5)  # specific dates don't map onto a weekly pattern
+    if not segments or not (positive or negative or FLEXIBLE_RE.search(text)):
+        confidence = min(confidence, 0.4 if not FREQUENCY_RE.search(text) else 0.9)
+    result["confidence"] = round(max(0.1, confidence), 2)
+
+    notes = []
+    if positive:
+        notes.append(f"可排 {len(result['allowedTimeRanges'])} 段")
+    if result["excludedTimeRanges"]:
+        notes.append(f"排除 {len(result['excludedTimeRanges'])} 段")
+    if date_count:
+        notes.append("含具体日期")
+    if unknown_ratio > 0.2:
+        notes.append("部分文字未识别")
+    result["reasoning"] = "规则解析：" + ("，".join(notes) or "无时间限制")
+
+    times_per_week = parse_frequency(text)
+    if times_per_week:
+        result["timesPerWeek"] = times_per_week
+    duration = parse_duration_slots(text)
+    if duration:
+        result["durationSlots"] = duration
+    return result
+
+
+def coerce_constraint(data: dict) -> dict:
+    """Validate an LLM-produced constraint into the same shape (mirrors the frontend's extractJSON)"""
+    confidence = data.get("confidence")
+    return {
+        "allowedDays": data["allowedDays"] if isinstance(data.get("allowedDays"), list) else sorted(ALL_DAYS),
+        "allowedTimeRanges": data["allowedTimeRanges"] if isinstance(data.get("allowedTimeRanges"), list) else [],
+        "excludedTimeRanges": data["excludedTimeRanges"] if isinstance(data.get("excludedTimeRanges"), list) else [],
+        "strictness": (
+            data["strictness"] if data.get("strictness") in ("strict", "flexible", "preferred") else "flexible"
+        ),
+        "confidence": max(0.0, min(1.0, confidence)) if isinstance(confidence, (int, float)) else 0.5,
+        "reasoning": data.get("reasoning") or "无推理说明",
+        "source": "llm",
+    }
+
+
+def parse_chunk(texts: List[str]) -> List[dict]:
+    """Process-pool entry point"""
+    return [parse_constraint(text) for text in texts]
+
+
+# ============================================================================
+# Batch parsing
+# ============================================================================
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_parse_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Get the parser process pool (spawned, so no event-loop threads are forked)"""
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=workers or None, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _parse_pool
+
+
+def shutdown_parse_pool() -> None:
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+
+async def parse_constraints(texts: List[str], pool_threshold: int, workers: int = 0) -> List[dict]:
+    """
+    Parse many texts; identical texts are parsed once
+
+    Below pool_threshold distinct texts the work runs inline (it is a few
+    milliseconds); above it the texts are split into one chunk per worker.
+    """
+    unique = list(dict.fromkeys(texts))
+    if pool_threshold <= 0 or len(unique) < pool_threshold or (workers or os.cpu_count() or 1) < 2:
+        parsed = parse_chunk(unique)
+    else:
+        pool = get_parse_pool(workers)
+        size = math.ceil(len(unique) / (pool._max_workers * 4))
+        loop = asyncio.get_running_loop()
+        chunks = await asyncio.gather(*(
+            loop.run_in_executor(pool, parse_chunk, unique[start:start + size])
+            for start in range(0, len(unique), size)
+        ))
+        parsed = [result for chunk in chunks for result in chunk]
+    by_text = dict(zip(unique, parsed))
+    return [by_text[text] for text in texts]
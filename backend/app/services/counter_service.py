@@ -0,0 +1,53 @@
+"""
+Counter Service
+学生/教师命名计数器
+
+计数器值按区间预留：一次 $inc N 原子地占用 [start, end)，批量创建或导入时
+不再为每个实体单独请求一次计数器。名称与前端一致：学生A、学生B ……，
+超过 Z 后继续为 AA、AB ……
+"""
+from datetime import datetime
+from typing import List, Tuple
+
+from pymongo import ReturnDocument
+
+COUNTER_FIELDS = {"student": "studentCounter", "teacher": "teacherCounter"}
+NAME_PREFIXES = {"student": "学生", "teacher": "教师"}
+
+
+def counter_label(value: int) -> str:
+    """0 -> A, 25 -> Z, 26 -> AA (spreadsheet-style column letters)"""
+    label = ""
+    value += 1
+    while value:
+        value, remainder = divmod(value - 1, 26)
+        label = chr(65 + remainder) + label
+    return label
+
+
+def counter_names(counter_type: str, start: int, end: int) -> List[str]:
+    """Default names for a reserved range"""
+    prefix = NAME_PREFIXES[counter_type]
+    return [f"{prefix}{counter_label(value)}" for value in range(start, end)]
+
+
+async def reserve_counter_range(db, user_id: str, counter_type: str, count: int) -> Tuple[int, int, dict]:
+    """
+    Atomically reserve `count` consecutive counter values
+
+    Returns:
+        (start, end, counters) — the block is [start, end); counters is the
+        user's counter document after the reservation
+    """
+    field = COUNTER_FIELDS[counter_type]
+    counters = await db.user_counters.find_one_and_update(
+        {"userId": user_id},
+        {
+            "$inc": {field: count},
+            "$set": {"updatedAt": datetime.utcnow()}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    end = counters[field]
+    return end - count, end, counters
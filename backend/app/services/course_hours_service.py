@@ -0,0 +1,256 @@
+"""
+Course Hours Service
+学生课时增量记账
+
+课程确认（confirmationStatus → confirmed）时扣除课时，取消确认或删除时退还。
+所有计数器更新都是服务端求值的原子增量；reconcile_course_hours 用一条聚合管道
+全量重算，用于修复历史数据或人工编辑导致的偏差。只有未退役会话的课程计入
+课时（退役时已退还，见 session_service）。
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.core.constants import SLOTS_PER_HOUR
+from app.services.archive_service import is_archived_session, iter_archived_courses
+from app.services.columnar_service import (
+    STORAGE_COLUMNAR, confirmed_hours_by_student, is_columnar_session, load_columnar_courses
+)
+
+
+# Course fields that decide the hours a course consumes
+HOURS_FIELDS = ("studentId", "duration", "status", "confirmationStatus", "isVirtual")
+
+
+def course_hours(course: Optional[dict]) -> float:
+    """
+    Hours a course consumes from the student's balance
+
+    Only confirmed, scheduled, non-virtual courses count.
+    """
+    if not course:
+        return 0.0
+    if course.get("confirmationStatus") != "confirmed":
+        return 0.0
+    if course.get("status", "scheduled") != "scheduled" or course.get("isVirtual"):
+        return 0.0
+    return course.get("duration", 0) / SLOTS_PER_HOUR
+
+
+def hours_delta(before: Optional[dict], after: Optional[dict]) -> Dict[str, float]:
+    """
+    Compute per-student usedHours change between two versions of a course
+
+    Args:
+        before: Course document before the change (None for inserts)
+        after: Course document after the change (None for deletes)
+
+    Returns:
+        Mapping studentId -> hours to add to usedHours (zero entries dropped)
+    """
+    deltas: Dict[str, float] = defaultdict(float)
+    if before and before.get("studentId"):
+        deltas[before["studentId"]] -= course_hours(before)
+    if after and after.get("studentId"):
+        deltas[after["studentId"]] += course_hours(after)
+    return {student_id: delta for student_id, delta in deltas.items() if delta}
+
+
+def merge_deltas(*delta_maps: Dict[str, float]) -> Dict[str, float]:
+    """Sum several delta maps into one"""
+    merged: Dict[str, float] = defaultdict(float)
+    for delta_map in delta_maps:
+        for student_id, delta in delta_map.items():
+            merged[student_id] += delta
+    return {student_id: delta for student_id, delta in merged.items() if delta}
+
+
+def total_hours_update(client_hours: Optional[dict], stored_hours: Optional[dict]) -> Tuple[dict, dict]:
+    """
+    $set / $inc parts for a client-submitted courseHours
+
+    Only totalHours belongs to the client; usedHours and remainingHours are
+    maintained by apply_hours_delta, so the client's (possibly stale) copies
+    are ignored. A changed total moves remainingHours by the same amount
+    with $inc, keeping deltas applied in the meantime.
+
+    Returns:
+        (set_fields, inc_fields); both empty when nothing changes
+    """
+    if client_hours is None:
+        return {}, {}
+    total = client_hours.get("totalHours", 0)
+    if not stored_hours:
+        return {"courseHours": {"totalHours": total, "usedHours": 0, "remainingHours": total}}, {}
+    stored_total = stored_hours.get("totalHours", 0)
+    if total == stored_total:
+        return {}, {}
+    return {"courseHours.totalHours": total}, {"courseHours.remainingHours": total - stored_total}
+
+
+async def apply_hours_delta(db, user_id: str, deltas: Dict[str, float]) -> int:
+    """
+    Apply usedHours/remainingHours deltas with a single bulk_write
+
+    One pipeline update per student: $ifNull creates the sub-document for
+    students whose courseHours is still null, and the addition is evaluated
+    server-side against the current values, so concurrent changes never
+    clobber each other and no delta can be applied twice.
+
+    Returns:
+        Number of student documents modified
+    """
+    now = datetime.utcnow()  # surfaces the change to delta sync (/changes)
+    operations = []
+    for student_id, delta in deltas.items():
+        if not ObjectId.is_valid(student_id):
+            continue
+        operations.append(UpdateOne(
+            {"_id": ObjectId(student_id), "userId": user_id},
+            [{"$set": {"courseHours": {
+                "totalHours": {"$ifNull": ["$courseHours.totalHours", 0]},
+                "usedHours": {"$add": [{"$ifNull": ["$courseHours.usedHours", 0]}, delta]},
+                "remainingHours": {"$subtract": [{"$ifNull": ["$courseHours.remainingHours", 0]}, delta]},
+            }, "updatedAt": now}}]
+        ))
+
+    if not operations:
+        return 0
+
+    result = await db.students.bulk_write(operations, ordered=False)
+    return result.modified_count
+
+
+async def session_hours_by_student(db, user_id: str, schedule_session_id: str) -> Dict[str, float]:
+    """
+    Sum confirmed hours per student for one schedule session
+
+    Used to refund hours before a session's courses are deleted. Works for
+    every storage format, archived sessions included.
+    """
+    if await is_columnar_session(db, user_id, schedule_session_id):
+        return confirmed_hours_by_student(await load_columnar_courses(
+            db, user_id, schedule_session_id, fields=HOURS_FIELDS
+        ))
+    if await is_archived_session(db, user_id, schedule_session_id):
+        return confirmed_hours_by_student([
+            course async for course in iter_archived_courses(db, user_id, schedule_session_id, fields=HOURS_FIELDS)
+        ])
+
+    pipeline = [
+        {"$match": {
+            "userId": user_id,
+            "scheduleSessionId": schedule_session_id,
+            "confirmationStatus": "confirmed",
+            "status": "scheduled",
+            "isVirtual": {"$ne": True},
+        }},
+        {"$group": {"_id": "$studentId", "slots": {"$sum": "$duration"}}},
+    ]
+    hours = {}
+    async for row in db.scheduled_courses.aggregate(pipeline):
+        if row["_id"] and row["slots"]:
+            hours[row["_id"]] = row["slots"] / SLOTS_PER_HOUR
+    return hours
+
+
+async def reconcile_course_hours(db, user_id: Optional[str] = None) -> int:
+    """
+    Recompute every student's usedHours/remainingHours in one pipeline
+
+    The document-stored courses are summed server-side: students are joined
+    to their confirmed courses with $lookup (courses of retired sessions
+    excluded) and written back with $merge, so no per-student round-trips
+    are made. Live sessions not stored as documents (columnar or archived)
+    are then added on top per session.
+
+    Args:
+        db: Database handle
+        user_id: Restrict to one tenant (None = all tenants)
+
+    Returns:
+        Number of students in scope
+    """
+    match = {"userId": user_id} if user_id else {}
+    pipeline = [
+        {"$match": match},
+        {"$project": {
+            "userId": 1,
+            "studentKey": {"$toString": "$_id"},
+            "totalHours": {"$ifNull": ["$courseHours.totalHours", 0]},
+        }},
+        {"$lookup": {
+            "from": "scheduled_courses",
+            "let": {"sid": "$studentKey", "uid": "$userId"},
+            "pipeline": [
+                {"$match": {
+                    "$expr": {"$and": [
+                        {"$eq": ["$userId", "$$uid"]},
+                        {"$eq": ["$studentId", "$$sid"]},
+                    ]},
+                    "confirmationStatus": "confirmed",
+                    "status": "scheduled",
+                    "isVirtual": {"$ne": True},
+                }},
+                {"$group": {
+                    "_id": "$scheduleSessionId",
+                    "userId": {"$first": "$userId"},
+                    "slots": {"$sum": "$duration"},
+                }},
+                {"$lookup": {
+                    "from": "retired_sessions",
+                    "let": {"session": "$_id", "owner": "$userId"},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$and": [
+                            {"$eq": ["$userId", "$$owner"]},
+                            {"$eq": ["$scheduleSessionId", "$$session"]},
+                        ]}}},
+                        {"$limit": 1},
+                    ],
+                    "as": "retired",
+                }},
+                {"$match": {"retired": {"$size": 0}}},
+                {"$group": {"_id": None, "slots": {"$sum": "$slots"}}},
+            ],
+            "as": "confirmed",
+        }},
+        {"$project": {
+            "totalHours": 1,
+            "usedHours": {"$divide": [
+                {"$ifNull": [{"$first": "$confirmed.slots"}, 0]},
+                SLOTS_PER_HOUR,
+            ]},
+        }},
+        {"$project": {
+            "courseHours": {
+                "totalHours": "$totalHours",
+                "usedHours": "$usedHours",
+                "remainingHours": {"$subtract": ["$totalHours", "$usedHours"]},
+            },
+            "updatedAt": datetime.utcnow(),
+        }},
+        {"$merge": {
+            "into": "students",
+            "on": "_id",
+            "whenMatched": "merge",
+            "whenNotMatched": "discard",
+        }},
+    ]
+    await db.students.aggregate(pipeline).to_list(length=None)
+
+    sessions = db.scheduling_metadata.find(
+        {
+            **match,
+            "$or": [{"storage": STORAGE_COLUMNAR}, {"archivedAt": {"$exists": True}}],
+            "retiredAt": {"$exists": False},
+        },
+        {"userId": 1, "scheduleSessionId": 1}
+    )
+    async for session in sessions:
+        await apply_hours_delta(db, session["userId"], await session_hours_by_student(
+            db, session["userId"], session["scheduleSessionId"]
+        ))
+    return await db.students.count_documents(match)
@@ -0,0 +1,291 @@
+"""
+Export Service
+排课会话导出（CSV / XLSX / iCalendar）
+
+课程直接从会话游标逐条读取并编码：CSV 与 ICS 边读边输出，XLSX 使用 openpyxl
+只写模式写入磁盘文件后再发送，内存占用与会话大小无关。
+导出结果同时写入磁盘缓存，缓存键是会话目录版本（updatedAt / 课程数 / 归档状态）
+与导出参数的哈希；会话未变化时重复下载直接从磁盘返回，ETag 即缓存键。
+"""
+import csv
+import hashlib
+import io
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import AsyncIterable, AsyncIterator, List, Optional
+
+import orjson
+from openpyxl import Workbook
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.constants import STANDARD_START, TIME_GRANULARITY
+from app.services.tabular_export import CSV_CHUNK_ROWS, CSV_MEDIA_TYPE, XLSX_MEDIA_TYPE
+
+EXPORT_FORMATS = ("csv", "xlsx", "ics")
+ICS_MEDIA_TYPE = "text/calendar"
+EXPORT_MEDIA_TYPES = {"csv": CSV_MEDIA_TYPE, "xlsx": XLSX_MEDIA_TYPE, "ics": ICS_MEDIA_TYPE}
+
+# Fields read from the session
+EXPORT_FIELDS = (
+    "studentName", "teacherName", "classroomName", "subject", "day", "startSlot", "duration",
+    "campus", "mode", "status", "confirmationStatus", "isVirtual",
+)
+EXPORT_HEADER = [
+    "学生", "教师", "教室", "科目", "星期", "开始", "结束", "时长(小时)",
+    "校区", "形式", "状态", "确认状态",
+]
+WEEKDAY_NAMES = {0: "周日", 1: "周一", 2: "周二", 3: "周三", 4: "周四", 5: "周五", 6: "周六", 7: "周日"}
+
+ICS_PRODID = "-//XDF Class Arranger//Schedule Export//ZH"
+ICS_LINE_OCTETS = 75
+
+
+def slot_clock(slot: int) -> tuple:
+    """Slot index -> (hour, minute); slot 0 is STANDARD_START"""
+    minutes = STANDARD_START * 60 + slot * TIME_GRANULARITY
+    return minutes // 60, minutes % 60
+
+
+def format_slot(slot: int) -> str:
+    hour, minute = slot_clock(slot)
+    return f"{hour:02d}:{minute:02d}"
+
+
+def course_row(course: dict) -> list:
+    start = course.get("startSlot") or 0
+    duration = course.get("duration") or 0
+    return [
+        course.get("studentName") or "",
+        course.get("teacherName") or "",
+        course.get("classroomName") or "",
+        course.get("subject") or "",
+        WEEKDAY_NAMES.get(course.get("day"), ""),
+        format_slot(start),
+        format_slot(start + duration),
+        round(duration * TIME_GRANULARITY / 60, 2),
+        course.get("campus") or "",
+        course.get("mode") or "",
+        course.get("status") or "",
+        course.get("confirmationStatus") or "",
+    ]
+
+
+# ============================================================================
+# Encoders (async course iterator -> bytes)
+# ============================================================================
+
+async def iter_csv_bytes(courses: AsyncIterable[dict]) -> AsyncIterator[bytes]:
+    """CSV with a UTF-8 BOM, flushed every CSV_CHUNK_ROWS rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_HEADER)
+    rows = 0
+    async for course in courses:
+        writer.writerow(course_row(course))
+        rows += 1
+        if rows % CSV_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def ics_escape(text: str) -> str:
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def ics_line(line: str) -> str:
+    """Fold a content line at 75 octets (RFC 5545 3.1) and terminate it with CRLF"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= ICS_LINE_OCTETS:
+        return line + "\r\n"
+    parts, current, size = [], "", 0
+    for char in line:
+        width = len(char.encode("utf-8"))
+        limit = ICS_LINE_OCTETS if not parts else ICS_LINE_OCTETS - 1  # continuation lines start with a space
+        if size + width > limit:
+            parts.append(current)
+            current, size = "", 0
+        current += char
+        size += width
+    parts.append(current)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def ics_event(course: dict, week_start: date, stamp: datetime, weeks: Optional[int]) -> str:
+    """One weekly-recurring VEVENT; the first occurrence is in the week of week_start"""
+    day = course.get("day")
+    day = 1 if day is None else day  # 0 is Sunday
+    start = course.get("startSlot") or 0
+    first_day = week_start + timedelta(days=(day - 1) % 7)
+    start_at = datetime.combine(first_day, datetime.min.time()) + timedelta(
+        hours=STANDARD_START, minutes=start * TIME_GRANULARITY
+    )
+    end_at = start_at + timedelta(minutes=(course.get("duration") or 0) * TIME_GRANULARITY)
+    summary = " · ".join(filter(None, (
+        course.get("subject"), course.get("studentName"), course.get("teacherName")
+    )))
+    description = " / ".join(filter(None, (course.get("campus"), course.get("mode"))))
+    rrule = "RRULE:FREQ=WEEKLY" + (f";COUNT={weeks}" if weeks else "")
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{course['_id']}@xdf-class-arranger",
+        f"DTSTAMP:{stamp.strftime('%Y%m%dT%H%M%SZ')}",
+        f"DTSTART:{start_at.strftime('%Y%m%dT%H%M%S')}",  # floating local time
+        f"DTEND:{end_at.strftime('%Y%m%dT%H%M%S')}",
+        rrule,
+        f"SUMMARY:{ics_escape(summary)}",
+    ]
+    if course.get("classroomName"):
+        lines.append(f"LOCATION:{ics_escape(course['classroomName'])}")
+    if description:
+        lines.append(f"DESCRIPTION:{ics_escape(description)}")
+    lines.append("END:VEVENT")
+    return "".join(ics_line(line) for line in lines)
+
+
+async def iter_ics_bytes(
+    courses: AsyncIterable[dict], calendar_name: str, week_start: date,
+    stamp: datetime, weeks: Optional[int]
+) -> AsyncIterator[bytes]:
+    """VCALENDAR with one recurring event per scheduled, non-virtual course"""
+    yield "".join(ics_line(line) for line in (
+        "BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{ICS_PRODID}", "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{ics_escape(calendar_name)}",
+    )).encode("utf-8")
+    events: List[str] = []
+    async for course in courses:
+        if course.get("isVirtual") or course.get("status", "scheduled") != "scheduled":
+            continue
+        events.append(ics_event(course, week_start, stamp, weeks))
+        if len(events) == CSV_CHUNK_ROWS:
+            yield "".join(events).encode("utf-8")
+            events = []
+    events.append(ics_line("END:VCALENDAR"))
+    yield "".join(events).encode("utf-8")
+
+
+async def write_xlsx_file(courses: AsyncIterable[dict], path: str, sheet_title: str) -> None:
+    """Write courses with openpyxl's write-only mode (rows go to a temp file as they arrive)"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    sheet.append(EXPORT_HEADER)
+    async for course in courses:
+        sheet.append(course_row(course))
+    await run_in_threadpool(workbook.save, path)
+
+
+# ============================================================================
+# Disk cache
+# ============================================================================
+
+def export_cache_key(user_id: str, schedule_session_id: str, version: dict, params: dict) -> str:
+    """Hash of the session's catalog version and the export parameters"""
+    payload = orjson.dumps(
+        {"userId": user_id, "session": schedule_session_id, "version": version, "params": params},
+        option=orjson.OPT_SORT_KEYS, default=str
+    )
+    return hashlib.sha256(payload).hexdigest()
+
+
+def session_version(session: dict) -> dict:
+    """Catalog fields that change whenever a session's courses change"""
+    return {
+        "updatedAt": session.get("updatedAt"),
+        "courses": session.get("totalCoursesScheduled"),
+        "archivedAt": session.get("archivedAt"),
+    }
+
+
+class ExportCache:
+    """Finished exports on disk, named by cache key; expired by mtime"""
+
+    def __init__(self, directory: str, ttl_seconds: int):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+
+    def path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.directory, f"{key}.{fmt}")
+
+    def get(self, key: str, fmt: str) -> Optional[str]:
+        """Path of a cached export, or None"""
+        path = self.path(key, fmt)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)  # keep recently downloaded exports alive
+        return path
+
+    def temp_path(self, fmt: str) -> str:
+        """A fresh file in the cache directory, to be committed or discarded"""
+        os.makedirs(self.directory, exist_ok=True)
+        handle, path = tempfile.mkstemp(suffix=f".{fmt}.part", dir=self.directory)
+        os.close(handle)
+        return path
+
+    def commit(self, temp_path: str, key: str, fmt: str) -> str:
+        path = self.path(key, fmt)
+        os.replace(temp_path, path)
+        self.prune()
+        return path
+
+    def prune(self) -> int:
+        """Delete exports (and abandoned partial files) older than the TTL"""
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                try:
+                    os.unlink(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+async def tee_to_cache(
+    chunks: AsyncIterable[bytes], cache: ExportCache, key: str, fmt: str
+) -> AsyncIterator[bytes]:
+    """
+    Pass chunks through while writing them to the cache
+
+    The file is committed only once the whole export was produced; a client
+    disconnect or error discards it.
+    """
+    temp_path = cache.temp_path(fmt)
+    committed = False
+    try:
+        with open(temp_path, "wb") as file_obj:
+            async for chunk in chunks:
+                file_obj.write(chunk)
+                yield chunk
+        cache.commit(temp_path, key, fmt)
+        committed = True
+    finally:
+        if not committed and os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+
+# Singleton instance
+_export_cache = None
+
+
+def get_export_cache() -> ExportCache:
+    """Get export cache instance"""
+    global _export_cache
+    if _export_cache is None:
+        _export_cache = ExportCache(settings.export_cache_path, settings.export_cache_ttl_hours * 3600)
+    return _export_cache
+
+
+def export_filename(schedule_session_id: str, label: Optional[str], fmt: str) -> str:
+    stem = f"schedule-{schedule_session_id}" + (f"-{label}" if label else "")
+    return f"{stem}.{fmt}"
+
+
+def monday_of(day: date) -> date:
+    return day - timedelta(days=day.weekday())
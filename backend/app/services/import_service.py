@@ -0,0 +1,385 @@
+"""
+Import Service
+学生/教师/教室 Excel / CSV 流式导入
+
+上传文件先按块写入磁盘临时文件，再用 openpyxl 只读模式（或 csv.reader）逐行
+读取；表头按列名映射（列顺序无关），每行转换为对应的 *Base 模型校验后，按
+IMPORT_BATCH_SIZE 条一批 insert_many。任何时刻内存中最多只有一批数据。
+行解析在线程池中执行，不阻塞事件循环。
+"""
+import csv
+import os
+import re
+import tempfile
+import zipfile
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from app.core.constants import (
+    ENTITY_COLORS, SLOTS_PER_DAY, SLOTS_PER_HOUR, STANDARD_START, TIME_GRANULARITY
+)
+from app.services.sync_service import SYNC_COLLECTIONS
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+IMPORT_BATCH_SIZE = 1000
+# Bytes copied per read when spooling an upload to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Rows scanned for the header before giving up
+HEADER_SCAN_ROWS = 10
+# Row errors returned in the final report
+MAX_REPORTED_ERRORS = 100
+
+# Field -> accepted header names (first match wins), per import kind
+IMPORT_COLUMNS = {
+    "students": {
+        "name": ("学生姓名", "姓名"),
+        "campus": ("校区",),
+        "frequency": ("上课频次", "频次"),
+        "duration": ("上课时长", "时长"),
+        "mode": ("上课形式", "形式"),
+        "subject": ("上课内容", "科目"),
+    },
+    "teachers": {
+        "name": ("老师姓名", "教师姓名", "姓名"),
+    },
+    "classrooms": {
+        "entryName": ("录入名称",),
+        "roomName": ("教室名", "教室名称"),
+        "campus": ("校区",),
+        "type": ("类型",),
+        "priority": ("优先级",),
+        "start": ("时间段开始",),
+        "end": ("时间段结束",),
+        "capacity": ("班容", "容量"),
+        "notes": ("备注",),
+    },
+}
+
+# Header that identifies each kind when the caller does not say
+KIND_MARKERS = (("学生姓名", "students"), ("老师姓名", "teachers"), ("教师姓名", "teachers"),
+                ("教室名", "classrooms"), ("录入名称", "classrooms"))
+
+# Field identifying an already-imported row. A student appears once per
+# course request (several rows per name), so students and teachers are
+# matched on the whole row
+DEDUP_FIELDS = {"students": "rawData", "teachers": "rawData", "classrooms": "name"}
+
+# Client default when a classroom row has no capacity (1v1 rooms)
+DEFAULT_CLASSROOM_CAPACITY = 2
+# Classroom availability applies to every day (0 = Sunday, as on the client)
+ALL_DAYS = (1, 2, 3, 4, 5, 6, 0)
+
+
+class ImportFormatError(ValueError):
+    """The file cannot be read as the requested import"""
+
+
+# ============================================================================
+# Cell parsing
+# ============================================================================
+
+def cell_text(value: Any) -> str:
+    """Render a cell the way it reads when pasted from Excel"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        if value.time() == time(0, 0):
+            return f"{value.year}/{value.month}/{value.day}"
+        return value.strftime("%Y/%m/%d %H:%M")
+    if isinstance(value, date):
+        return f"{value.year}/{value.month}/{value.day}"
+    if isinstance(value, time):
+        return f"{value.hour}:{value.minute:02d}"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def parse_count(value: Any) -> Optional[int]:
+    """"2次" -> 2"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.search(r"\d+", cell_text(value))
+    return int(match.group()) if match else None
+
+
+def parse_duration_slots(value: Any) -> Optional[int]:
+    """"2小时/节" -> 24, "90分钟" -> 18"""
+    text = cell_text(value)
+    hours = re.search(r"(\d+(?:\.\d+)?)\s*(?:小时|h)", text, re.IGNORECASE)
+    if hours:
+        return round(float(hours.group(1)) * SLOTS_PER_HOUR)
+    minutes = re.search(r"(\d+)\s*(?:分钟|min)", text, re.IGNORECASE)
+    if minutes:
+        return int(minutes.group(1)) // TIME_GRANULARITY
+    return None
+
+
+def parse_mode(value: Any) -> Optional[str]:
+    """线上 / 线下 / 皆可 -> online / offline / hybrid"""
+    text = cell_text(value)
+    online, offline = "线上" in text, "线下" in text
+    if (online and offline) or "皆可" in text:
+        return "hybrid"
+    if online:
+        return "online"
+    if offline:
+        return "offline"
+    return None
+
+
+def time_to_slot(value: Any) -> Optional[int]:
+    """9:00 -> 0, 21:30 -> 150 (clamped to the scheduling day)"""
+    if isinstance(value, (time, datetime)):
+        hour, minute = value.hour, value.minute
+    else:
+        match = re.search(r"(\d{1,2})[:：](\d{2})", cell_text(value))
+        if not match:
+            return None
+        hour, minute = int(match.group(1)), int(match.group(2))
+    slot = ((hour - STANDARD_START) * 60 + minute) // TIME_GRANULARITY
+    return max(0, min(SLOTS_PER_DAY, slot))
+
+
+# ============================================================================
+# Row mapping
+# ============================================================================
+
+def detect_kind(header: Sequence[Any]) -> Optional[str]:
+    names = {cell_text(cell) for cell in header}
+    for marker, kind in KIND_MARKERS:
+        if marker in names:
+            return kind
+    return None
+
+
+def map_header(kind: str, header: Sequence[Any]) -> Dict[str, int]:
+    """Field -> column index for the columns present in the header"""
+    positions = {cell_text(cell): index for index, cell in reversed(list(enumerate(header)))}
+    mapping = {}
+    for field_name, aliases in IMPORT_COLUMNS[kind].items():
+        for alias in aliases:
+            if alias in positions:
+                mapping[field_name] = positions[alias]
+                break
+    return mapping
+
+
+def student_from_row(values: Dict[str, Any], raw: str, color: str) -> Optional[dict]:
+    name = cell_text(values.get("name"))
+    if not name:
+        return None
+    return {
+        "name": name,
+        "color": color,
+        "rawData": raw,
+        "scheduling": {
+            "frequency": parse_count(values.get("frequency")) or 1,
+            "duration": parse_duration_slots(values.get("duration")) or 2 * SLOTS_PER_HOUR,
+            "mode": parse_mode(values.get("mode")) or "offline",
+            "campus": cell_text(values.get("campus")) or None,
+            "subject": cell_text(values.get("subject")) or None,
+        },
+    }
+
+
+def teacher_from_row(values: Dict[str, Any], raw: str, color: str) -> Optional[dict]:
+    name = cell_text(values.get("name"))
+    if not name:
+        return None
+    return {"name": name, "color": color, "rawData": raw}
+
+
+def classroom_from_row(values: Dict[str, Any], raw: str, color: str) -> Optional[dict]:
+    name = cell_text(values.get("entryName")) or cell_text(values.get("roomName"))
+    if not name:
+        return None
+    start = time_to_slot(values.get("start"))
+    end = time_to_slot(values.get("end"))
+    start = 0 if start is None else start
+    end = SLOTS_PER_DAY if end is None else end
+    return {
+        "name": name,
+        "campus": cell_text(values.get("campus")) or None,
+        "type": cell_text(values.get("type")) or None,
+        "priority": parse_count(values.get("priority")),
+        "capacity": parse_count(values.get("capacity")) or DEFAULT_CLASSROOM_CAPACITY,
+        "notes": cell_text(values.get("notes")) or None,
+        "availableTimeRanges": [{"day": day, "startSlot": start, "endSlot": end} for day in ALL_DAYS],
+    }
+
+
+ROW_MAPPERS: Dict[str, Callable[[Dict[str, Any], str, str], Optional[dict]]] = {
+    "students": student_from_row,
+    "teachers": teacher_from_row,
+    "classrooms": classroom_from_row,
+}
+
+
+# ============================================================================
+# File reading
+# ============================================================================
+
+def iter_xlsx_rows(path: str) -> Iterator[tuple]:
+    """Rows of the first worksheet, read with openpyxl's read-only mode"""
+    try:
+        workbook = load_workbook(path, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+        raise ImportFormatError("The file is not a valid .xlsx workbook") from e
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_csv_rows(path: str, encoding: str = "utf-8-sig") -> Iterator[list]:
+    """CSV rows; undecodable bytes and malformed lines surface as ImportFormatError"""
+    with open(path, newline="", encoding=encoding) as file_obj:
+        try:
+            yield from csv.reader(file_obj)
+        except UnicodeDecodeError as e:
+            raise ImportFormatError("CSV files must be UTF-8 encoded (save as \"CSV UTF-8\")") from e
+        except csv.Error as e:
+            raise ImportFormatError(f"Malformed CSV: {e}") from e
+
+
+def iter_file_rows(path: str, filename: str) -> Iterator[Sequence[Any]]:
+    lower = filename.lower()
+    if lower.endswith((".xlsx", ".xlsm")):
+        return iter_xlsx_rows(path)
+    if lower.endswith((".csv", ".txt")):
+        return iter_csv_rows(path)
+    raise ImportFormatError("Only .xlsx and .csv files can be imported")
+
+
+async def save_upload(upload) -> str:
+    """Copy an UploadFile to a temporary file chunk by chunk; returns its path"""
+    suffix = os.path.splitext(upload.filename or "")[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            temp_file.write(chunk)
+    return temp_file.name
+
+
+@dataclass
+class ImportReport:
+    """Running totals of an import"""
+    kind: str
+    rows: int = 0
+    inserted: int = 0
+    skipped: int = 0
+    errors: List[dict] = field(default_factory=list)
+
+    def as_dict(self, event: str) -> dict:
+        report = {"type": event, "kind": self.kind, "rows": self.rows,
+                  "inserted": self.inserted, "skipped": self.skipped}
+        if event == "done":
+            report["errors"] = self.errors[:MAX_REPORTED_ERRORS]
+            report["errorCount"] = len(self.errors)
+        return report
+
+
+class RowImporter:
+    """
+    Turns a row iterator into validated documents, one batch at a time
+
+    next_batch() is synchronous (it reads the file) and is meant to run in a
+    worker thread.
+    """
+
+    def __init__(self, rows: Iterator[Sequence[Any]], kind: Optional[str] = None):
+        self.rows = rows
+        header, self.row_number = self._find_header(kind)
+        self.kind = kind or detect_kind(header)
+        if self.kind not in ROW_MAPPERS:
+            raise ImportFormatError("Cannot tell whether the file holds students, teachers or classrooms")
+        self.columns = map_header(self.kind, header)
+        if not self.columns:
+            raise ImportFormatError(f"No known {self.kind} columns in the header")
+        self.config = SYNC_COLLECTIONS[self.kind]
+        self.mapper = ROW_MAPPERS[self.kind]
+        self.dedup_field = DEDUP_FIELDS[self.kind]
+        self.existing_keys: set = set()  # rows whose dedup field is in here are skipped
+        self.report = ImportReport(self.kind)
+
+    def _find_header(self, kind: Optional[str]) -> Tuple[Sequence[Any], int]:
+        for row_number, row in enumerate(islice(self.rows, HEADER_SCAN_ROWS), start=1):
+            if (map_header(kind, row) if kind in IMPORT_COLUMNS else detect_kind(row)):
+                return row, row_number
+        raise ImportFormatError("No header row found")
+
+    def close(self) -> None:
+        """Release the underlying file (closes the workbook)"""
+        close = getattr(self.rows, "close", None)
+        if close:
+            close()
+
+    def next_batch(self, size: int = IMPORT_BATCH_SIZE) -> Optional[List[dict]]:
+        """Up to `size` validated documents; None once the file is exhausted"""
+        batch: List[dict] = []
+        exhausted = True
+        for row in self.rows:
+            exhausted = False
+            self.row_number += 1
+            if not any(cell not in (None, "") for cell in row):
+                continue
+            self.report.rows += 1
+            values = {name: row[index] for name, index in self.columns.items() if index < len(row)}
+            raw = "\t".join(cell_text(cell) for cell in row).rstrip("\t")
+            color = ENTITY_COLORS[(self.report.rows - 1) % len(ENTITY_COLORS)]
+            doc = self.mapper(values, raw, color)
+            if doc is None or doc[self.dedup_field] in self.existing_keys:
+                self.report.skipped += 1
+                continue
+            try:
+                batch.append(self.config.model(**doc).model_dump())
+            except ValidationError as e:
+                self.report.skipped += 1
+                self.report.errors.append({
+                    "row": self.row_number,
+                    "errors": e.errors(include_url=False, include_context=False),
+                })
+                continue
+            self.existing_keys.add(doc[self.dedup_field])
+            if len(batch) == size:
+                return batch
+        return batch if batch or not exhausted else None
+
+
+async def import_entities(db, user_id: str, importer: RowImporter):
+    """
+    Insert the importer's rows in batches, yielding a progress report per batch
+
+    Yields:
+        ImportReport.as_dict("progress") after every insert_many
+    """
+    collection = db[importer.config.name]
+    while True:
+        batch = await run_in_threadpool(importer.next_batch)
+        if batch is None:
+            break
+        if not batch:
+            continue
+        now = datetime.utcnow()
+        for doc in batch:
+            doc.update({"userId": user_id, "createdAt": now, "updatedAt": now})
+            if importer.config.versioned:
+                doc["version"] = 1
+        result = await collection.insert_many(batch, ordered=False)
+        importer.report.inserted += len(result.inserted_ids)
+        yield importer.report.as_dict("progress")
+
+
+async def existing_keys(db, user_id: str, kind: str) -> set:
+    """Dedup values already stored for the user (used to skip re-imported rows)"""
+    dedup_field = DEDUP_FIELDS[kind]
+    cursor = db[SYNC_COLLECTIONS[kind].name].find({"userId": user_id}, {dedup_field: 1, "_id": 0})
+    return {doc.get(dedup_field) async for doc in cursor}
@@ -0,0 +1,129 @@
+"""
+Listing Service
+列表接口的字段投影与游标分页
+
+分页是可选的（指定 limit 时）并采用基于 _id 的 keyset 方式：先取本页及下一条的
+limit + 1 个 _id（只投影 _id，不使用 skip）确定本页最后一个 _id（即下一页游标），
+再按 _id 范围流式读取本页。翻到任何位置的代价都相同。
+
+响应直接由 Mongo 文档编码为 JSON（orjson），分块输出为 JSON 数组，
+不为每个文档构建 Pydantic 模型，也不在内存中拼出完整列表。
+"""
+from typing import AsyncIterator, Optional, Type
+
+import orjson
+from bson import ObjectId
+from pydantic import BaseModel
+
+# Always-available fields in addition to the model's own fields
+META_FIELDS = {"id", "createdAt", "updatedAt", "version", "scheduleSessionId"}
+
+# Server-side fields never returned by list endpoints
+HIDDEN_FIELDS_PROJECTION = {"userId": 0, "clientId": 0}
+
+# Documents encoded per streamed chunk / fetched per cursor batch
+STREAM_CHUNK_DOCS = 200
+CURSOR_BATCH_SIZE = 1000
+
+
+def build_projection(fields: Optional[str], model: Type[BaseModel]) -> dict:
+    """
+    Turn a comma-separated fields= parameter into a Mongo projection
+
+    Args:
+        fields: e.g. "name,color,courseHours" (None/empty = all fields)
+        model: Response model whose fields are allowed
+
+    Returns:
+        Projection dict (full documents minus server-side fields when fields is empty)
+
+    Raises:
+        ValueError: If an unknown field is requested
+    """
+    if not fields:
+        return dict(HIDDEN_FIELDS_PROJECTION)
+
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    allowed = set(model.model_fields) | META_FIELDS
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    projection = {"_id": 1}
+    for name in requested:
+        if name != "id":
+            projection[name] = 1
+    return projection
+
+
+def apply_cursor(query: dict, cursor: Optional[str]) -> dict:
+    """
+    Restrict a query to documents after the cursor
+
+    Raises:
+        ValueError: If the cursor is not a valid ObjectId
+    """
+    if not cursor:
+        return query
+    if not ObjectId.is_valid(cursor):
+        raise ValueError("Invalid cursor")
+    return {**query, "_id": {"$gt": ObjectId(cursor)}}
+
+
+async def probe_next_cursor(collection, query: dict, limit: int) -> Optional[str]:
+    """
+    Find the last _id of this page if another page follows
+
+    Fetches the page's limit + 1 _ids in one query (no skip); the range it
+    reads is the same one the page itself reads.
+    """
+    ids = await collection.find(query, {"_id": 1}).sort("_id", 1).limit(limit + 1).to_list(length=limit + 1)
+    if len(ids) > limit:
+        return str(ids[limit - 1]["_id"])
+    return None
+
+
+def _default(value):
+    """orjson fallback for BSON types (ObjectId etc.)"""
+    return str(value)
+
+
+def encode_doc(doc: dict) -> bytes:
+    """Encode a Mongo document as API JSON (_id exposed as id)"""
+    doc["id"] = str(doc.pop("_id"))
+    return orjson.dumps(doc, default=_default)
+
+
+async def iter_json_array(cursor) -> AsyncIterator[bytes]:
+    """Stream a Motor cursor as a JSON array in chunks of STREAM_CHUNK_DOCS"""
+    chunk = bytearray(b"[")
+    count = 0
+    async for doc in cursor:
+        if count:
+            chunk += b","
+        chunk += encode_doc(doc)
+        count += 1
+        if count % STREAM_CHUNK_DOCS == 0:
+            yield bytes(chunk)
+            chunk.clear()
+    chunk += b"]"
+    yield bytes(chunk)
+
+
+async def stream_page(collection, query: dict, projection: dict, limit: Optional[int]):
+    """
+    Prepare one keyset page for streaming (limit None = every matching document)
+
+    Returns:
+        (async iterator of JSON bytes, next cursor or None)
+    """
+    next_cursor = await probe_next_cursor(collection, query, limit) if limit else None
+    if next_cursor:
+        id_range = dict(query.get("_id", {}))
+        id_range["$lte"] = ObjectId(next_cursor)
+        query = {**query, "_id": id_range}
+
+    cursor = collection.find(query, projection).sort("_id", 1).batch_size(CURSOR_BATCH_SIZE)
+    if limit:
+        cursor = cursor.limit(limit)
+    return iter_json_array(cursor), next_cursor
@@ -0,0 +1,251 @@
+"""
+Live Updates
+多人协作实时推送：每个 worker 只维护一个共享的 change stream，按 userId 分发给 WebSocket
+
+- 变更在 live_coalesce_ms 窗口内按用户合并去重，只推送变更的 ID，
+  客户端再通过 /changes?since= 拉取具体数据
+- 删除通过 tombstones 集合的插入事件感知（删除事件本身不带 userId）
+- change stream 管道只匹配当前有连接的租户，订阅租户集合变化时带 resume token 重开
+- 单机 mongod（非副本集）不支持 change stream，自动降级为按 updatedAt 轮询
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.services.change_log_service import (
+    SYNCED_COLLECTIONS, COURSE_SESSION_KIND, to_watermark
+)
+
+# Mongo collection -> API name
+WATCHED_COLLECTIONS = {mongo: name for name, mongo in SYNCED_COLLECTIONS.items()}
+
+# Per-socket queue size; a slow client that overflows gets a "resync" message
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Polling fallback only reads writes older than this, so in-flight commits are not skipped
+POLL_LAG = timedelta(seconds=1)
+
+# Error code returned by standalone mongod for $changeStream
+CHANGE_STREAM_NOT_SUPPORTED = 40573
+
+# How long one change stream read waits before re-checking the subscribed tenants
+WATCH_AWAIT_MS = 1000
+
+
+class ChangeBroadcaster:
+    """Fan out tenant data changes from one stream to many WebSocket subscribers"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._pending: Dict[str, Dict[str, Dict[str, Set[str]]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._tenants_changed = asyncio.Event()  # the change stream filter is out of date
+        self.mode: Optional[str] = None  # "change_stream" or "polling"
+
+    # ------------------------------------------------------------------
+    # Subscribers
+    # ------------------------------------------------------------------
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        """Register a socket for a tenant and start the stream if needed"""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        if user_id not in self._subscribers:
+            self._tenants_changed.set()
+        self._subscribers[user_id].add(queue)
+        self.start()
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        """Remove a socket"""
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+            self._tenants_changed.set()
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    # ------------------------------------------------------------------
+    # Coalescing
+    # ------------------------------------------------------------------
+
+    def publish(self, user_id: str, section: str, name: str, entity_id: str) -> None:
+        """
+        Queue one change for a tenant
+
+        Args:
+            user_id: Tenant id
+            section: "changes" or "deleted"
+            name: API collection name (students, courses, courseSessions, ...)
+            entity_id: Document id (or session id)
+        """
+        if user_id not in self._subscribers:
+            return
+        pending = self._pending.get(user_id)
+        if pending is None:
+            pending = {"changes": defaultdict(set), "deleted": defaultdict(set)}
+            self._pending[user_id] = pending
+            asyncio.get_running_loop().call_later(
+                settings.live_coalesce_ms / 1000, self._flush, user_id
+            )
+        pending[section][name].add(entity_id)
+
+    def _flush(self, user_id: str) -> None:
+        """Send one coalesced message to every socket of a tenant"""
+        pending = self._pending.pop(user_id, None)
+        if not pending:
+            return
+        message = {
+            "type": "changes",
+            "watermark": to_watermark(datetime.utcnow()),
+            "changes": {name: sorted(ids) for name, ids in pending["changes"].items()},
+            "deleted": {name: sorted(ids) for name, ids in pending["deleted"].items()},
+        }
+        for queue in list(self._subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Drop the backlog; the client reloads via /changes
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    # ------------------------------------------------------------------
+    # Sources
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Start the shared background reader (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background reader"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        db = get_database()
+        try:
+            self.mode = "change_stream"
+            await self._watch(db)
+        except OperationFailure as e:
+            if e.code != CHANGE_STREAM_NOT_SUPPORTED:
+                raise
+            print("Change streams unavailable (standalone mongod), falling back to polling")
+            self.mode = "polling"
+            await self._poll(db)
+
+    def _dispatch(self, mongo_collection: str, doc: dict, entity_id: str) -> None:
+        """Route one changed document to its tenant"""
+        user_id = doc.get("userId")
+        if not user_id:
+            return
+        if mongo_collection == "tombstones":
+            kind = doc.get("collection")
+            name = "courseSessions" if kind == COURSE_SESSION_KIND else WATCHED_COLLECTIONS.get(kind)
+            if name:
+                self.publish(user_id, "deleted", name, doc.get("entityId"))
+        else:
+            self.publish(user_id, "changes", WATCHED_COLLECTIONS[mongo_collection], entity_id)
+
+    async def _watch(self, db) -> None:
+        """
+        Tail one database-level change stream, resuming after transient errors
+
+        The pipeline only matches tenants with a connected socket, so events of
+        everyone else never reach this process; when that set changes the stream
+        is reopened from the last resume token.
+        """
+        resume_token = None
+        while True:
+            self._tenants_changed.clear()
+            pipeline = [
+                {"$match": {
+                    "ns.coll": {"$in": list(WATCHED_COLLECTIONS) + ["tombstones"]},
+                    "operationType": {"$in": ["insert", "update", "replace"]},
+                    "fullDocument.userId": {"$in": list(self._subscribers)},
+                }},
+                {"$project": {
+                    "ns": 1,
+                    "documentKey": 1,
+                    "fullDocument.userId": 1,
+                    "fullDocument.collection": 1,
+                    "fullDocument.entityId": 1,
+                }},
+            ]
+            try:
+                async with db.watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_token,
+                    max_await_time_ms=WATCH_AWAIT_MS
+                ) as stream:
+                    while not self._tenants_changed.is_set():
+                        event = await stream.try_next()
+                        resume_token = stream.resume_token
+                        if event is None:
+                            continue
+                        doc = event.get("fullDocument") or {}
+                        self._dispatch(event["ns"]["coll"], doc, str(event["documentKey"]["_id"]))
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_NOT_SUPPORTED:
+                    raise
+                # e.g. resume point fell off the oplog: restart from now
+                print(f"Change stream failed, restarting: {e}")
+                resume_token = None
+                await asyncio.sleep(1)
+            except PyMongoError as e:
+                print(f"Change stream interrupted, resuming: {e}")
+                await asyncio.sleep(1)
+
+    async def _poll(self, db) -> None:
+        """Fallback: poll updatedAt/deletedAt for connected tenants only"""
+        since = datetime.utcnow() - POLL_LAG
+        while True:
+            await asyncio.sleep(settings.live_poll_interval_seconds)
+            users = list(self._subscribers)
+            until = datetime.utcnow() - POLL_LAG
+            if users:
+                try:
+                    window = {"$gt": since, "$lte": until}
+                    for mongo_collection in WATCHED_COLLECTIONS:
+                        cursor = db[mongo_collection].find(
+                            {"userId": {"$in": users}, "updatedAt": window},
+                            {"userId": 1}
+                        )
+                        async for doc in cursor:
+                            self._dispatch(mongo_collection, doc, str(doc["_id"]))
+                    cursor = db.tombstones.find(
+                        {"userId": {"$in": users}, "deletedAt": window},
+                        {"userId": 1, "collection": 1, "entityId": 1}
+                    )
+                    async for doc in cursor:
+                        self._dispatch("tombstones", doc, str(doc["_id"]))
+                except PyMongoError as e:
+                    print(f"Change polling failed, retrying: {e}")
+                    continue
+            since = until
+
+
+# Singleton instance
+_change_broadcaster = None
+
+
+def get_change_broadcaster() -> ChangeBroadcaster:
+    """Get change broadcaster instance (one per worker process)"""
+    global _change_broadcaster
+    if _change_broadcaster is None:
+        _change_broadcaster = ChangeBroadcaster()
+    return _change_broadcaster
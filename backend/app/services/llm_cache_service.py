@@ -0,0 +1,127 @@
+"""
+LLM Cache Service
+LLM 约束解析结果缓存
+
+temperature=0 的请求结果是确定的，按规范化后的 (system_prompt, user_prompt,
+model, temperature) 哈希缓存两级：进程内 LRU（毫秒级命中）与 MongoDB
+llm_cache 集合（跨进程、重启后仍在，TTL 索引自动过期）。
+Mongo 不可用时退化为仅内存缓存，不影响解析本身。
+"""
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+import orjson
+
+from app.core.config import settings
+
+WHITESPACE_RE = re.compile(r"[ \t　]+")
+
+
+def normalize_prompt(text: str) -> str:
+    """NFKC, unified newlines, collapsed runs of spaces, trimmed lines"""
+    text = unicodedata.normalize("NFKC", text or "").replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(WHITESPACE_RE.sub(" ", line).strip() for line in text.strip().split("\n"))
+
+
+def llm_cache_key(system_prompt: str, user_prompt: str, model: str, temperature: float) -> str:
+    payload = orjson.dumps({
+        "system": normalize_prompt(system_prompt),
+        "user": normalize_prompt(user_prompt),
+        "model": model,
+        "temperature": float(temperature),
+    })
+    return hashlib.sha256(payload).hexdigest()
+
+
+def is_cacheable(temperature: float) -> bool:
+    """Only deterministic (temperature 0) completions are cached"""
+    return temperature == 0
+
+
+class LLMCache:
+    """In-process LRU in front of the llm_cache collection"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"memoryHits": 0, "mongoHits": 0, "misses": 0, "bypassed": 0, "stores": 0, "mongoErrors": 0}
+
+    def _remember(self, key: str, value: dict) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, db, key: str) -> Optional[tuple]:
+        """
+        Returns:
+            (value, "memory" | "mongo"), or None on a miss
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats["memoryHits"] += 1
+                return value, "memory"
+            del self._entries[key]
+
+        if db is not None:
+            try:
+                doc = await db.llm_cache.find_one({"_id": key})
+            except Exception:
+                self.stats["mongoErrors"] += 1
+                doc = None
+            if doc is not None:
+                self._remember(key, doc["value"])
+                self.stats["mongoHits"] += 1
+                return doc["value"], "mongo"
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, db, key: str, value: dict, model: str) -> None:
+        self._remember(key, value)
+        self.stats["stores"] += 1
+        if db is None:
+            return
+        try:
+            await db.llm_cache.replace_one(
+                {"_id": key},
+                {"_id": key, "value": value, "model": model, "createdAt": datetime.utcnow()},
+                upsert=True
+            )
+        except Exception:
+            self.stats["mongoErrors"] += 1
+
+    def record_bypass(self) -> None:
+        self.stats["bypassed"] += 1
+
+    def metrics(self) -> Dict:
+        hits = self.stats["memoryHits"] + self.stats["mongoHits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hits": hits,
+            "hitRate": round(hits / lookups, 4) if lookups else 0.0,
+            "memoryEntries": len(self._entries),
+            "maxEntries": self.max_entries,
+        }
+
+
+# Singleton instance
+_llm_cache = None
+
+
+def get_llm_cache() -> LLMCache:
+    """Get LLM cache instance"""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMCache(settings.llm_cache_max_entries, settings.llm_cache_ttl_days * 86400)
+    return _llm_cache
@@ -0,0 +1,174 @@
+"""
+OpenAI Service
+共享的异步 OpenAI 客户端
+
+所有 OpenAI 调用共用一个 AsyncOpenAI（底层 httpx 连接池），不再在 async 路由中
+调用同步客户端阻塞事件循环。每个进程用信号量限制同时在途的请求数，并用令牌桶
+限制每分钟请求数（openai_requests_per_minute）；429 / 5xx / 超时 / 连接错误按
+带抖动的指数退避重试（429 优先遵循 Retry-After）。
+"""
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+_client: Optional[AsyncOpenAI] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_rate_limiter: Optional["TokenBucket"] = None
+
+
+class TokenBucket:
+    """Requests-per-second limiter; bursts up to capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def get_openai_client() -> Optional[AsyncOpenAI]:
+    """Get the shared client, or None when no API key is configured"""
+    global _client
+    if _client is None and settings.openai_api_key:
+        _client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            max_retries=0,  # retried by with_retries, inside the concurrency limit
+            timeout=httpx.Timeout(settings.openai_timeout_seconds, connect=10.0),
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.openai_max_connections,
+                    max_keepalive_connections=settings.openai_max_connections,
+                ),
+            ),
+        )
+    return _client
+
+
+async def close_openai_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.openai_max_concurrency)
+    return _semaphore
+
+
+def _get_rate_limiter() -> Optional[TokenBucket]:
+    global _rate_limiter
+    if _rate_limiter is None and settings.openai_requests_per_minute > 0:
+        _rate_limiter = TokenBucket(settings.openai_requests_per_minute / 60, settings.openai_max_concurrency)
+    return _rate_limiter
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """Retry-After on 429 when given, else full-jitter exponential backoff"""
+    if isinstance(error, openai.RateLimitError):
+        retry_after = error.response.headers.get("retry-after")
+        try:
+            return min(float(retry_after), settings.openai_retry_max_seconds)
+        except (TypeError, ValueError):
+            pass
+    ceiling = min(settings.openai_retry_max_seconds, settings.openai_retry_base_seconds * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+async def with_retries(operation: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run an OpenAI call within the per-process rate and concurrency limits
+
+    Every attempt takes a rate-limit token. The concurrency slot is released
+    while backing off, so waiting retries don't hold capacity other requests
+    could use.
+    """
+    attempt = 0
+    limiter = _get_rate_limiter()
+    while True:
+        if limiter:
+            await limiter.acquire()
+        try:
+            async with _get_semaphore():
+                return await operation()
+        except Exception as e:
+            if attempt >= settings.openai_max_retries or not is_retryable(e):
+                raise
+            delay = retry_delay(e, attempt)
+            attempt += 1
+            print(
+                f"OpenAI call failed ({type(e).__name__}), "
+                f"retry {attempt}/{settings.openai_max_retries} in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+
+
+async def chat_json(system_prompt: str, user_prompt: str, model: str, temperature: float) -> Dict:
+    """
+    One JSON-mode chat completion; returns {content, model, usage}
+
+    usage.cached_tokens is the part of the prompt served from the provider's
+    prefix cache.
+    """
+    client = get_openai_client()
+    response = await with_retries(lambda: client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=temperature,
+        response_format={"type": "json_object"}
+    ))
+    return {
+        "content": response.choices[0].message.content,
+        "model": response.model,
+        "usage": {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens,
+            "cached_tokens": getattr(getattr(response.usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+        }
+    }
+
+
+async def transcribe_file(path: str, prompt: Optional[str] = None):
+    """Whisper transcription (verbose_json) of one audio file"""
+    client = get_openai_client().with_options(timeout=settings.openai_transcribe_timeout_seconds)
+
+    async def transcribe():
+        # Reopened per attempt: a failed upload leaves the file position at the end
+        with open(path, "rb") as audio_file:
+            params = {"model": "whisper-1", "file": audio_file, "response_format": "verbose_json"}
+            if prompt:
+                params["prompt"] = prompt
+            return await client.audio.transcriptions.create(**params)
+
+    return await with_retries(transcribe)
@@ -0,0 +1,154 @@
+"""
+Prompt Service
+服务端注册的提示词模板
+
+系统提示词保存在 app/prompts/ 下，按 id + 版本注册，前端只需传模板 id 与学生
+变量，请求体从数 KB 缩小到几十字节。渲染时系统提示词原样使用、用户提示词
+静态说明在前、学生变量在后，使每次调用的前缀逐字节一致，便于供应商侧的
+提示词前缀缓存命中。
+
+每次调用按模板累计 token 用量（含前缀缓存命中的 cached_tokens），写入 llm_usage
+集合（按天聚合）。
+"""
+import hashlib
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts")
+
+
+def load_prompt(filename: str) -> str:
+    with open(os.path.join(PROMPTS_DIR, filename), encoding="utf-8") as file_obj:
+        return file_obj.read().rstrip("\n")
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    id: str
+    version: int
+    system: str
+    user: str  # static instructions first, {variables} last
+    defaults: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        return f"{self.id}@{self.version}"
+
+    @property
+    def fingerprint(self) -> str:
+        """Hash of the static prefix; changes only when the prompt text changes"""
+        return hashlib.sha256(f"{self.system}\x00{self.user}".encode("utf-8")).hexdigest()[:16]
+
+    def render(self, variables: Dict[str, Optional[str]]) -> Tuple[str, str]:
+        """(system prompt, user prompt) with variables substituted into the user prompt only"""
+        user = self.user
+        for name, default in self.defaults.items():
+            value = (variables.get(name) or "").strip() or default
+            user = user.replace("{" + name + "}", value)
+        return self.system, user
+
+
+PROMPT_TEMPLATES: Dict[str, PromptTemplate] = {}
+
+
+def register_template(template: PromptTemplate) -> None:
+    PROMPT_TEMPLATES[template.key] = template
+
+
+register_template(PromptTemplate(
+    id="constraint-parsing",
+    version=1,
+    system=load_prompt("constraint_parsing.system.txt"),
+    user=(
+        "Please parse the following student's time constraint and return it as a JSON object "
+        "following the specified format.\n\n"
+        "Student: {studentName}\n"
+        "Campus: {campus}\n"
+        "Natural Language Constraint:\n"
+        "---\n"
+        "{nlText}\n"
+        "---"
+    ),
+    defaults={"studentName": "未知学生", "campus": "未知校区", "nlText": "无约束"},
+))
+register_template(PromptTemplate(
+    id="constraint-types",
+    version=1,
+    system=load_prompt("constraint_types.system.txt"),
+    user=(
+        "请解析以下学生的约束信息，返回JSON格式的约束对象，包含constraints数组和inferredDefaults对象。\n\n"
+        "学生姓名：{studentName}\n"
+        "校区：{campus}\n"
+        "约束描述：\n"
+        "{nlText}"
+    ),
+    defaults={"studentName": "未知学生", "campus": "未知校区", "nlText": "无约束信息"},
+))
+
+
+def get_template(reference: str) -> Optional[PromptTemplate]:
+    """Resolve "id@version", or "id" to its latest version"""
+    if "@" in reference:
+        return PROMPT_TEMPLATES.get(reference)
+    versions = [template for template in PROMPT_TEMPLATES.values() if template.id == reference]
+    return max(versions, key=lambda template: template.version) if versions else None
+
+
+def list_templates() -> list:
+    return [
+        {
+            "id": template.id,
+            "version": template.version,
+            "key": template.key,
+            "fingerprint": template.fingerprint,
+            "systemChars": len(template.system),
+            "variables": sorted(template.defaults),
+        }
+        for template in sorted(PROMPT_TEMPLATES.values(), key=lambda template: (template.id, template.version))
+    ]
+
+
+async def record_usage(db, template_key: str, usage: Optional[Dict], cache_hit: bool = False) -> None:
+    """Add one call's token usage to today's counters for the template"""
+    if db is None:
+        return
+    now = datetime.utcnow()
+    inc = {"requests": 1}
+    if cache_hit:
+        inc["cacheHits"] = 1
+    elif usage:
+        inc.update({
+            "promptTokens": usage.get("prompt_tokens", 0),
+            "completionTokens": usage.get("completion_tokens", 0),
+            "cachedPromptTokens": usage.get("cached_tokens", 0),
+        })
+    try:
+        await db.llm_usage.update_one(
+            {"template": template_key, "day": now.strftime("%Y-%m-%d")},
+            {"$inc": inc, "$set": {"updatedAt": now}},
+            upsert=True
+        )
+    except Exception as e:
+        print(f"LLM usage accounting failed: {e}")
+
+
+async def usage_summary(db, since_day: str) -> list:
+    """Token totals per template since a YYYY-MM-DD day"""
+    pipeline = [
+        {"$match": {"day": {"$gte": since_day}}},
+        {"$group": {
+            "_id": "$template",
+            "requests": {"$sum": "$requests"},
+            "cacheHits": {"$sum": "$cacheHits"},
+            "promptTokens": {"$sum": "$promptTokens"},
+            "completionTokens": {"$sum": "$completionTokens"},
+            "cachedPromptTokens": {"$sum": "$cachedPromptTokens"},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    return [
+        {"template": row.pop("_id"), **row}
+        async for row in db.llm_usage.aggregate(pipeline)
+    ]
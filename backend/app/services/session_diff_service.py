@@ -0,0 +1,178 @@
+"""
+Session Diff Service
+两次排课会话的差异对比
+
+以 (studentId, teacherId, subject) 为键做哈希连接：先把基准会话的课程按
+键和排课位置 (day, startSlot, duration, classroomId) 建索引，再逐条流式读取
+目标会话并探测。位置完全相同为未变化；同一键下剩余的课程按时间顺序配对为
+「调整」，仍无法配对的分别为删除/新增。KPI 在同一遍扫描中累计。
+"""
+import statistics
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from app.core.constants import SLOTS_PER_HOUR
+
+# Fields read from each session
+DIFF_FIELDS = (
+    "studentId", "studentName", "teacherId", "teacherName", "classroomId", "classroomName",
+    "subject", "day", "startSlot", "duration", "status", "isVirtual",
+)
+
+JoinKey = Tuple[Optional[str], Optional[str], Optional[str]]
+Placement = Tuple[int, int, int, Optional[str]]
+
+
+def _join_key(course: dict) -> JoinKey:
+    return course.get("studentId"), course.get("teacherId"), course.get("subject")
+
+
+def _placement(course: dict) -> Placement:
+    return course.get("day"), course.get("startSlot"), course.get("duration"), course.get("classroomId")
+
+
+def _brief(course: dict) -> dict:
+    return {
+        "id": str(course["_id"]) if "_id" in course else course.get("id"),
+        "studentId": course.get("studentId"),
+        "studentName": course.get("studentName"),
+        "teacherId": course.get("teacherId"),
+        "teacherName": course.get("teacherName"),
+        "subject": course.get("subject"),
+        "classroomId": course.get("classroomId"),
+        "classroomName": course.get("classroomName"),
+        "day": course.get("day"),
+        "startSlot": course.get("startSlot"),
+        "duration": course.get("duration"),
+    }
+
+
+def _time_order(brief: dict) -> tuple:
+    return brief["day"] or 0, brief["startSlot"] or 0
+
+
+class _KpiAccumulator:
+    """Scheduled rate and teacher-hours spread, accumulated course by course"""
+
+    def __init__(self):
+        self.total = 0
+        self.scheduled = 0
+        self.teacher_slots: Dict[str, int] = defaultdict(int)
+
+    def add(self, course: dict) -> None:
+        if course.get("isVirtual"):
+            return
+        self.total += 1
+        if course.get("status", "scheduled") == "scheduled":
+            self.scheduled += 1
+            if course.get("teacherId"):
+                self.teacher_slots[course["teacherId"]] += course.get("duration") or 0
+
+    def result(self) -> dict:
+        hours = [slots / SLOTS_PER_HOUR for slots in self.teacher_slots.values()]
+        return {
+            "courses": self.total,
+            "scheduledRate": round(self.scheduled / self.total, 4) if self.total else 0.0,
+            "teacherHoursSpread": round(max(hours) - min(hours), 2) if hours else 0.0,
+            "teacherHoursStdev": round(statistics.pstdev(hours), 2) if hours else 0.0,
+        }
+
+
+class SessionDiff:
+    """
+    Streaming diff of two sessions
+
+    Feed every base course through add_base, then every target course through
+    add_target (in any order), then call result().
+    """
+
+    def __init__(self):
+        self._base: Dict[JoinKey, Dict[Placement, List[dict]]] = defaultdict(lambda: defaultdict(list))
+        self._unmatched_target: Dict[JoinKey, List[dict]] = defaultdict(list)
+        self._unchanged = 0
+        self._base_kpis = _KpiAccumulator()
+        self._target_kpis = _KpiAccumulator()
+
+    def add_base(self, course: dict) -> None:
+        self._base_kpis.add(course)
+        self._base[_join_key(course)][_placement(course)].append(_brief(course))
+
+    def add_target(self, course: dict) -> None:
+        self._target_kpis.add(course)
+        key = _join_key(course)
+        candidates = self._base.get(key, {}).get(_placement(course))
+        if candidates:
+            candidates.pop()
+            self._unchanged += 1
+        else:
+            self._unmatched_target[key].append(_brief(course))
+
+    def result(self) -> dict:
+        """
+        Returns:
+            {"summary", "added", "removed", "moved", "students", "kpis": {"base", "target"}}
+        """
+        added: List[dict] = []
+        removed: List[dict] = []
+        moved: List[dict] = []
+
+        for key in set(self._base) | set(self._unmatched_target):
+            leftover_base = sorted(
+                (brief for briefs in self._base.get(key, {}).values() for brief in briefs),
+                key=_time_order
+            )
+            leftover_target = sorted(self._unmatched_target.get(key, []), key=_time_order)
+            pairs = min(len(leftover_base), len(leftover_target))
+            moved.extend(
+                {"from": before, "to": after}
+                for before, after in zip(leftover_base[:pairs], leftover_target[:pairs])
+            )
+            removed.extend(leftover_base[pairs:])
+            added.extend(leftover_target[pairs:])
+
+        students: Dict[str, dict] = {}
+
+        def count(brief: dict, change: str) -> None:
+            row = students.get(brief["studentId"])
+            if row is None:
+                row = students[brief["studentId"]] = {
+                    "studentId": brief["studentId"], "studentName": brief["studentName"],
+                    "added": 0, "removed": 0, "moved": 0,
+                }
+            row[change] += 1
+
+        for brief in added:
+            count(brief, "added")
+        for brief in removed:
+            count(brief, "removed")
+        for move in moved:
+            count(move["to"], "moved")
+
+        return {
+            "summary": {
+                "added": len(added),
+                "removed": len(removed),
+                "moved": len(moved),
+                "unchanged": self._unchanged,
+            },
+            "added": sorted(added, key=_time_order),
+            "removed": sorted(removed, key=_time_order),
+            "moved": sorted(moved, key=lambda move: _time_order(move["to"])),
+            "students": sorted(students.values(), key=lambda row: row["studentName"] or ""),
+            "kpis": {"base": self._base_kpis.result(), "target": self._target_kpis.result()},
+        }
+
+
+def room_utilization(summary: dict) -> float:
+    """Mean classroom occupancy ratio from a utilization summary"""
+    ratios = [row["ratio"] for row in summary.get("classrooms", [])]
+    return round(sum(ratios) / len(ratios), 4) if ratios else 0.0
+
+
+def kpi_delta(base: dict, target: dict) -> dict:
+    """target - base for every numeric KPI"""
+    return {
+        name: round(target[name] - base[name], 4)
+        for name in base
+        if isinstance(base[name], (int, float)) and name in target
+    }
@@ -0,0 +1,117 @@
+"""
+Session Maintenance Scheduler
+排课会话后台维护任务（回收被替换的会话、归档历史会话、执行保留策略、清理孤儿引用），使用 APScheduler
+"""
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.services.cascade_service import sweep_orphans
+from app.services.session_service import archive_expired_sessions, collect_retired_sessions, prune_sessions
+
+
+class SessionMaintenanceScheduler:
+    """Scheduler for background session housekeeping"""
+
+    def __init__(self):
+        self.scheduler = AsyncIOScheduler()
+
+    async def collect_garbage(self):
+        """Delete sessions retired by a publish once their grace period has passed"""
+        try:
+            collected = await collect_retired_sessions(get_database())
+            if collected:
+                print(f"[{datetime.now()}] Collected {collected} retired schedule session(s)")
+        except Exception as e:
+            print(f"[{datetime.now()}] Session garbage collection failed: {str(e)}")
+
+    async def archive_sessions(self):
+        """Move sessions outside the archive window to compressed cold storage"""
+        try:
+            archived = await archive_expired_sessions(get_database())
+            if archived:
+                print(f"[{datetime.now()}] Archived {archived} schedule session(s)")
+        except Exception as e:
+            print(f"[{datetime.now()}] Session archival failed: {str(e)}")
+
+    async def apply_retention(self):
+        """Retire sessions beyond the retention policy (collected by the GC job)"""
+        try:
+            retired = await prune_sessions(get_database())
+            if retired:
+                print(f"[{datetime.now()}] Retention retired {retired} schedule session(s)")
+        except Exception as e:
+            print(f"[{datetime.now()}] Session retention failed: {str(e)}")
+
+    async def sweep_orphans(self):
+        """Delete courses and adjustment records whose student/teacher/classroom is gone"""
+        try:
+            swept = await sweep_orphans(get_database())
+            if any(swept.values()):
+                print(f"[{datetime.now()}] Swept {swept['courses']} orphan course(s), "
+                      f"{swept['adjustments']} orphan adjustment record(s)")
+        except Exception as e:
+            print(f"[{datetime.now()}] Orphan sweep failed: {str(e)}")
+
+    def start(self):
+        """Start the scheduler"""
+        self.scheduler.add_job(
+            self.collect_garbage,
+            IntervalTrigger(seconds=settings.session_gc_interval_seconds),
+            id='session_gc',
+            name='Retired Schedule Session GC',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+
+        # Daily archival at 2:30 AM, before retention
+        self.scheduler.add_job(
+            self.archive_sessions,
+            CronTrigger(hour=2, minute=30),
+            id='session_archive',
+            name='Schedule Session Archival',
+            replace_existing=True
+        )
+
+        # Daily retention at 3 AM
+        self.scheduler.add_job(
+            self.apply_retention,
+            CronTrigger(hour=3, minute=0),
+            id='session_retention',
+            name='Schedule Session Retention',
+            replace_existing=True
+        )
+
+        # Daily orphan sweep at 3:30 AM, after retention
+        self.scheduler.add_job(
+            self.sweep_orphans,
+            CronTrigger(hour=3, minute=30),
+            id='orphan_sweep',
+            name='Orphan Reference Sweep',
+            replace_existing=True
+        )
+
+        self.scheduler.start()
+        print(f"Session maintenance started (GC every {settings.session_gc_interval_seconds}s)")
+
+    def stop(self):
+        """Stop the scheduler"""
+        if self.scheduler.running:
+            self.scheduler.shutdown()
+            print("Session maintenance stopped")
+
+
+# Singleton instance
+_session_maintenance = None
+
+
+def get_session_maintenance() -> SessionMaintenanceScheduler:
+    """Get session maintenance scheduler instance"""
+    global _session_maintenance
+    if _session_maintenance is None:
+        _session_maintenance = SessionMaintenanceScheduler()
+    return _session_maintenance
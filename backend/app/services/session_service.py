@@ -0,0 +1,457 @@
+"""
+Session Service
+排课会话发布：双缓冲 + 活动会话指针
+
+新的排课结果先以全新的 scheduleSessionId 完整写入（此时对读者不可见），
+再用一次 find_one_and_update 切换租户的活动会话指针（active_sessions）。
+读者只通过指针读取活动会话，因此要么看到旧排课、要么看到新排课，
+不会看到空白或写了一半的排课。被替换的会话记入 retired_sessions，
+由后台任务在宽限期后分块删除。
+
+课时规则：所有未退役会话中已确认的课程都计入学生课时；会话在退役时
+（发布替换、保留策略）一次性退还，之后对它的写入和删除不再影响课时。
+
+scheduling_metadata 是会话目录：每个会话一条记录，课程数/课时/冲突数
+在每次写入时维护，列出会话与读取统计都不需要扫描课程文档。
+保留策略把超出数量或超过天数的会话批量标记为退役，同样交给后台回收。
+"""
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.core.constants import SLOTS_PER_HOUR
+from app.services.archive_service import archive_session, is_archived_session, iter_archived_courses
+from app.services.change_log_service import record_session_deletion
+from app.services.columnar_service import (
+    STORAGE_COLUMNAR, STORAGE_DOCUMENTS, is_columnar_session, iter_columnar_courses, write_columnar_session
+)
+from app.services.course_hours_service import (
+    apply_hours_delta, hours_delta, merge_deltas, session_hours_by_student
+)
+
+# Courses deleted per delete_many during garbage collection
+GC_DELETE_BATCH = 5000
+
+# Cursor batch size when streaming a whole session
+SESSION_READ_BATCH = 5000
+
+# migrations document marking the one-time catalog backfill as done
+CATALOG_BACKFILL = "session_catalog_backfill"
+
+
+def new_session_id() -> str:
+    """Server-generated session id (never reused, so a publish cannot collide)"""
+    return f"session-{ObjectId()}"
+
+
+async def get_active_session_id(db, user_id: str) -> Optional[str]:
+    """Read the tenant's active session pointer"""
+    pointer = await db.active_sessions.find_one({"userId": user_id}, {"scheduleSessionId": 1})
+    return pointer["scheduleSessionId"] if pointer else None
+
+
+async def iter_session_courses(
+    db,
+    user_id: str,
+    schedule_session_id: str,
+    fields: Optional[Iterable[str]] = None,
+    filters: Optional[Dict[str, object]] = None
+) -> AsyncIterator[dict]:
+    """Stream a session's courses regardless of its storage format (filters: field equality)"""
+    if await is_columnar_session(db, user_id, schedule_session_id):
+        async for course in iter_columnar_courses(db, user_id, schedule_session_id, filters, fields):
+            yield course
+        return
+    if await is_archived_session(db, user_id, schedule_session_id):
+        async for course in iter_archived_courses(db, user_id, schedule_session_id, filters, fields):
+            yield course
+        return
+
+    projection = {field: 1 for field in fields} if fields else {"userId": 0}
+    cursor = db.scheduled_courses.find(
+        {**(filters or {}), "userId": user_id, "scheduleSessionId": schedule_session_id}, projection
+    ).batch_size(SESSION_READ_BATCH)
+    async for course in cursor:
+        yield course
+
+
+async def retired_session_ids(db, user_id: str, session_ids: Iterable[str]) -> Set[str]:
+    """Which of the given sessions are retired (their hours no longer count)"""
+    session_ids = list(set(session_ids))
+    if not session_ids:
+        return set()
+    cursor = db.retired_sessions.find(
+        {"userId": user_id, "scheduleSessionId": {"$in": session_ids}}, {"scheduleSessionId": 1}
+    )
+    return {retired["scheduleSessionId"] async for retired in cursor}
+
+
+async def is_retired_session(db, user_id: str, schedule_session_id: str) -> bool:
+    return bool(await retired_session_ids(db, user_id, [schedule_session_id]))
+
+
+async def retire_sessions(db, sessions: List[Tuple[str, str]], refund: bool = True) -> int:
+    """
+    Queue sessions for background garbage collection and hide them from the catalog
+
+    Confirmed hours of the sessions are refunded here, once: only sessions
+    newly inserted into retired_sessions by this call are refunded.
+
+    Args:
+        sessions: (userId, scheduleSessionId) pairs
+        refund: False for sessions whose hours were never charged
+
+    Returns:
+        Number of sessions queued
+    """
+    if not sessions:
+        return 0
+    now = datetime.utcnow()
+    keys = [{"userId": user_id, "scheduleSessionId": session_id} for user_id, session_id in sessions]
+    result = await db.retired_sessions.bulk_write(
+        [UpdateOne(key, {"$setOnInsert": {"retiredAt": now}}, upsert=True) for key in keys],
+        ordered=False
+    )
+    await db.scheduling_metadata.bulk_write(
+        [UpdateOne(key, {"$set": {"retiredAt": now}}) for key in keys],
+        ordered=False
+    )
+    if refund:
+        for index in result.upserted_ids:
+            user_id, session_id = sessions[index]
+            refunds = await session_hours_by_student(db, user_id, session_id)
+            await apply_hours_delta(db, user_id, {sid: -hours for sid, hours in refunds.items()})
+    return len(keys)
+
+
+async def retire_session(db, user_id: str, schedule_session_id: str, refund: bool = True) -> None:
+    """Queue one session for background garbage collection"""
+    await retire_sessions(db, [(user_id, schedule_session_id)], refund)
+
+
+async def record_session_write(
+    db, user_id: str, schedule_session_id: str, courses_delta: int, slots_delta: int,
+    create: bool = True
+) -> None:
+    """
+    Keep the catalog entry of a session in step with a course write
+
+    Creates the entry for sessions written through the per-course endpoints
+    (unless create is False, e.g. for deletions).
+    """
+    now = datetime.utcnow()
+    await db.scheduling_metadata.update_one(
+        {"userId": user_id, "scheduleSessionId": schedule_session_id},
+        {
+            "$inc": {
+                "totalCoursesScheduled": courses_delta,
+                "totalHoursScheduled": slots_delta / SLOTS_PER_HOUR,
+            },
+            "$set": {"updatedAt": now},
+            "$setOnInsert": {
+                "algorithm": "triple-match",
+                "lastScheduledAt": now,
+                "conflictsDetected": 0,
+                "stats": None,
+                "storage": STORAGE_DOCUMENTS,
+                "createdAt": now,
+            },
+        },
+        upsert=create
+    )
+
+
+async def backfill_session_catalog(db) -> int:
+    """
+    Create catalog entries for sessions written before the catalog existed
+
+    One $group over scheduled_courses merged into scheduling_metadata with
+    keepExisting, so entries maintained by record_session_write are never
+    touched and re-running is harmless. Retired sessions are skipped. Runs
+    once at startup; completion is recorded in the migrations collection.
+
+    Returns:
+        Number of catalog entries created
+    """
+    if await db.migrations.find_one({"_id": CATALOG_BACKFILL}):
+        return 0
+    retired = [
+        {"userId": doc["userId"], "scheduleSessionId": doc["scheduleSessionId"]}
+        async for doc in db.retired_sessions.find({}, {"_id": 0, "userId": 1, "scheduleSessionId": 1})
+    ]
+    before = await db.scheduling_metadata.count_documents({})
+    now = datetime.utcnow()
+    pipeline = [
+        {"$group": {
+            "_id": {"userId": "$userId", "scheduleSessionId": "$scheduleSessionId"},
+            "totalCoursesScheduled": {"$sum": 1},
+            "slots": {"$sum": "$duration"},
+            "createdAt": {"$min": "$createdAt"},
+            "updatedAt": {"$max": "$updatedAt"},
+        }},
+        {"$match": {"_id": {"$nin": retired}, "_id.scheduleSessionId": {"$ne": None}}},
+        {"$project": {
+            "_id": 0,
+            "userId": "$_id.userId",
+            "scheduleSessionId": "$_id.scheduleSessionId",
+            "algorithm": {"$literal": "triple-match"},
+            "lastScheduledAt": {"$ifNull": ["$createdAt", now]},
+            "totalCoursesScheduled": 1,
+            "totalHoursScheduled": {"$divide": ["$slots", SLOTS_PER_HOUR]},
+            "conflictsDetected": {"$literal": 0},
+            "stats": {"$literal": None},
+            "storage": {"$literal": STORAGE_DOCUMENTS},
+            "createdAt": {"$ifNull": ["$createdAt", now]},
+            "updatedAt": {"$ifNull": ["$updatedAt", now]},
+        }},
+        {"$merge": {
+            "into": "scheduling_metadata",
+            "on": ["userId", "scheduleSessionId"],
+            "whenMatched": "keepExisting",
+            "whenNotMatched": "insert",
+        }},
+    ]
+    async for _ in db.scheduled_courses.aggregate(pipeline):
+        pass
+    await db.migrations.update_one(
+        {"_id": CATALOG_BACKFILL}, {"$set": {"completedAt": now}}, upsert=True
+    )
+    return await db.scheduling_metadata.count_documents({}) - before
+
+
+async def list_sessions(db, user_id: str, limit: int) -> List[dict]:
+    """Catalog entries of live (not retired) sessions, newest first"""
+    active_id = await get_active_session_id(db, user_id)
+    sessions = await db.scheduling_metadata.find(
+        {"userId": user_id, "retiredAt": {"$exists": False}}, {"userId": 0}
+    ).sort("lastScheduledAt", -1).limit(limit).to_list(length=None)
+    for session in sessions:
+        session["id"] = str(session.pop("_id"))
+        session["isActive"] = session["scheduleSessionId"] == active_id
+    return sessions
+
+
+async def get_session(db, user_id: str, schedule_session_id: str) -> Optional[dict]:
+    """One catalog entry (None if unknown or retired)"""
+    session = await db.scheduling_metadata.find_one(
+        {"userId": user_id, "scheduleSessionId": schedule_session_id, "retiredAt": {"$exists": False}},
+        {"userId": 0}
+    )
+    if session is None:
+        return None
+    session["id"] = str(session.pop("_id"))
+    session["isActive"] = schedule_session_id == await get_active_session_id(db, user_id)
+    return session
+
+
+async def select_expired_sessions(
+    db,
+    keep: int,
+    max_age_days: int,
+    user_id: Optional[str] = None,
+    extra_match: Optional[dict] = None
+) -> List[Tuple[str, str]]:
+    """
+    Find catalog sessions outside a "newest keep / younger than max_age_days" window
+
+    One $setWindowFields aggregation ranks every tenant's live sessions (or one
+    tenant's); the active session is never returned. 0 disables a rule.
+
+    Args:
+        extra_match: Additional filter applied after ranking (e.g. not yet archived)
+
+    Returns:
+        (userId, scheduleSessionId) pairs
+    """
+    expired = [{"rank": {"$gt": keep}}] if keep > 0 else []
+    if max_age_days > 0:
+        expired.append({"lastScheduledAt": {"$lt": datetime.utcnow() - timedelta(days=max_age_days)}})
+    if not expired:
+        return []
+
+    match = {"retiredAt": {"$exists": False}}
+    if user_id:
+        match["userId"] = user_id
+    pipeline = [
+        {"$match": match},
+        {"$setWindowFields": {
+            "partitionBy": "$userId",
+            "sortBy": {"lastScheduledAt": -1},
+            "output": {"rank": {"$documentNumber": {}}},
+        }},
+        {"$match": {"$or": expired, **(extra_match or {})}},
+        {"$project": {"_id": 0, "userId": 1, "scheduleSessionId": 1}},
+    ]
+    candidates = await db.scheduling_metadata.aggregate(pipeline).to_list(length=None)
+    if not candidates:
+        return []
+
+    active = {
+        (pointer["userId"], pointer["scheduleSessionId"])
+        async for pointer in db.active_sessions.find(
+            {"userId": {"$in": list({row["userId"] for row in candidates})}}
+        )
+    }
+    return [
+        (row["userId"], row["scheduleSessionId"])
+        for row in candidates
+        if (row["userId"], row["scheduleSessionId"]) not in active
+    ]
+
+
+async def prune_sessions(
+    db, user_id: Optional[str] = None, keep: Optional[int] = None, max_age_days: Optional[int] = None
+) -> int:
+    """
+    Apply the retention policy in bulk
+
+    Sessions beyond the newest `keep` per tenant, or older than `max_age_days`,
+    are retired (archived ones included); the active session is never pruned.
+
+    Returns:
+        Number of sessions retired
+    """
+    keep = settings.session_retention_keep if keep is None else keep
+    max_age_days = settings.session_retention_days if max_age_days is None else max_age_days
+    return await retire_sessions(db, await select_expired_sessions(db, keep, max_age_days, user_id))
+
+
+async def archive_expired_sessions(
+    db, keep: Optional[int] = None, max_age_days: Optional[int] = None
+) -> int:
+    """
+    Move sessions outside the archive window to cold storage
+
+    Runs from the maintenance scheduler, one session at a time.
+
+    Returns:
+        Number of sessions archived
+    """
+    keep = settings.archive_keep_latest if keep is None else keep
+    max_age_days = settings.archive_after_days if max_age_days is None else max_age_days
+    sessions = await select_expired_sessions(
+        db, keep, max_age_days, extra_match={"archivedAt": {"$exists": False}}
+    )
+    archived = 0
+    for user_id, session_id in sessions:
+        if await archive_session(db, user_id, session_id):
+            archived += 1
+    return archived
+
+
+async def publish_session(
+    db,
+    user_id: str,
+    courses: List[dict],
+    algorithm: str = "triple-match",
+    conflicts_detected: int = 0,
+    stats: Optional[dict] = None,
+    storage: str = STORAGE_DOCUMENTS
+) -> Tuple[str, Optional[str]]:
+    """
+    Write a complete schedule under a fresh session id, then activate it
+
+    Args:
+        db: Database handle
+        user_id: Tenant id
+        courses: ScheduledCourseBase dumps
+        algorithm: Scheduling algorithm (stored in metadata)
+        conflicts_detected: Conflict count reported by the scheduler
+        stats: Free-form scheduler stats
+        storage: "documents" (one document per course) or "columnar" (see columnar_service)
+
+    Returns:
+        (new session id, previous active session id or None)
+    """
+    session_id = new_session_id()
+    now = datetime.utcnow()
+    docs = [
+        {**course, "userId": user_id, "scheduleSessionId": session_id, "createdAt": now, "updatedAt": now}
+        for course in courses
+    ]
+
+    try:
+        if storage == STORAGE_COLUMNAR:
+            await write_columnar_session(db, user_id, session_id, docs)
+        elif docs:
+            await db.scheduled_courses.insert_many(docs, ordered=False)
+    except Exception:
+        # Never activated (or charged): let the collector remove whatever was written
+        await retire_session(db, user_id, session_id, refund=False)
+        raise
+
+    await db.scheduling_metadata.insert_one({
+        "userId": user_id,
+        "scheduleSessionId": session_id,
+        "algorithm": algorithm,
+        "lastScheduledAt": now,
+        "totalCoursesScheduled": len(docs),
+        "totalHoursScheduled": sum(doc["duration"] for doc in docs) / SLOTS_PER_HOUR,
+        "conflictsDetected": conflicts_detected,
+        "stats": stats,
+        "storage": storage,
+        "createdAt": now,
+        "updatedAt": now,
+    })
+
+    # The flip: one single-document write makes the new session visible
+    previous = await db.active_sessions.find_one_and_update(
+        {"userId": user_id},
+        {"$set": {"scheduleSessionId": session_id, "publishedAt": now}},
+        upsert=True
+    )
+    previous_id = previous["scheduleSessionId"] if previous else None
+
+    # Charge the new session; retiring the replaced one refunds it
+    await apply_hours_delta(db, user_id, merge_deltas(*(hours_delta(None, doc) for doc in docs)))
+    if previous_id:
+        await retire_session(db, user_id, previous_id)
+
+    return session_id, previous_id
+
+
+async def collect_retired_sessions(db, grace: Optional[timedelta] = None) -> int:
+    """
+    Delete retired sessions whose grace period has passed
+
+    The grace period lets readers that resolved the old pointer finish their
+    reads. Courses are deleted in batches so one large session never holds a
+    long write. Hours were already refunded when the session was retired.
+
+    Returns:
+        Number of sessions collected
+    """
+    if grace is None:
+        grace = timedelta(seconds=settings.session_gc_grace_seconds)
+    cutoff = datetime.utcnow() - grace
+    collected = 0
+
+    cursor = db.retired_sessions.find({"retiredAt": {"$lte": cutoff}})
+    async for retired in cursor:
+        user_id = retired["userId"]
+        session_id = retired["scheduleSessionId"]
+        if session_id == await get_active_session_id(db, user_id):
+            # Re-activated since it was retired
+            await db.retired_sessions.delete_one({"_id": retired["_id"]})
+            continue
+
+        key = {"userId": user_id, "scheduleSessionId": session_id}
+        while True:
+            ids = await db.scheduled_courses.find(key, {"_id": 1}).limit(GC_DELETE_BATCH).to_list(length=None)
+            if not ids:
+                break
+            await db.scheduled_courses.delete_many({"_id": {"$in": [doc["_id"] for doc in ids]}})
+        await db.scheduled_course_chunks.delete_many(key)
+        await db.session_archives.delete_many(key)
+
+        await db.teacher_hours_summaries.delete_one(key)
+        await db.utilization_summaries.delete_one(key)
+        await db.scheduling_metadata.delete_one(key)
+        await record_session_deletion(db, user_id, session_id)
+        await db.retired_sessions.delete_one({"_id": retired["_id"]})
+        collected += 1
+
+    return collected
@@ -0,0 +1,207 @@
+"""
+Sync Service
+学生/教师/教室批量差异同步
+
+客户端提交完整列表，服务端与数据库现有记录比对，生成
+InsertOne / UpdateOne / DeleteMany 操作，由一次无序 bulk_write 执行。
+本地新建的记录（如 "student-123"，或服务端已不存在的 ObjectId）插入时保存为
+clientId，之后重复提交同一本地ID会匹配到已插入的记录而不会重复创建。
+被删除的记录会级联删除引用它们的课程与调整历史（cascade_service）。
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Type
+
+from bson import ObjectId
+from pydantic import BaseModel, ValidationError
+from pymongo import DeleteMany, InsertOne, UpdateOne
+
+from app.models.scheduling import StudentBase, TeacherBase, ClassroomBase
+from app.services.cascade_service import cascade_references, entity_refs
+from app.services.change_log_service import record_deletions
+from app.services.course_hours_service import total_hours_update
+
+
+@dataclass(frozen=True)
+class SyncCollection:
+    """Sync configuration for one collection"""
+    name: str
+    model: Type[BaseModel]
+    versioned: bool
+
+
+SYNC_COLLECTIONS = {
+    "students": SyncCollection("students", StudentBase, versioned=True),
+    "teachers": SyncCollection("teachers", TeacherBase, versioned=True),
+    "classrooms": SyncCollection("classrooms", ClassroomBase, versioned=False),
+}
+
+# Fields managed by the server and never taken from the client payload
+SERVER_FIELDS = {"id", "_id", "userId", "clientId", "createdAt", "updatedAt", "version"}
+
+
+@dataclass
+class SyncPlan:
+    """Operations and bookkeeping produced by plan_sync"""
+    operations: List[Any] = field(default_factory=list)
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    conflicts: List[str] = field(default_factory=list)
+    raced: int = 0
+    id_map: Dict[str, str] = field(default_factory=dict)
+    inserted_ids: List[ObjectId] = field(default_factory=list)
+    updated_ids: List[ObjectId] = field(default_factory=list)
+    versions: Dict[str, int] = field(default_factory=dict)  # filled in by sync_collection
+    deleted_ids: List[str] = field(default_factory=list)
+    deleted_refs: List[str] = field(default_factory=list)  # deleted ids plus their clientIds
+    errors: List[dict] = field(default_factory=list)
+
+
+def _changed_fields(data: dict, existing: dict) -> dict:
+    """Fields of data whose value differs from the stored document"""
+    return {key: value for key, value in data.items() if existing.get(key) != value}
+
+
+def plan_sync(
+    config: SyncCollection,
+    user_id: str,
+    items: List[Dict[str, Any]],
+    existing_docs: List[dict],
+    delete_missing: bool = False,
+    now: Optional[datetime] = None
+) -> SyncPlan:
+    """
+    Diff the client's list against the stored documents
+
+    Args:
+        config: Collection configuration
+        user_id: Tenant id
+        items: Client documents, each optionally carrying id / version
+        existing_docs: All of the tenant's stored documents
+        delete_missing: Delete stored documents absent from items (and cascade
+            to the courses and adjustments referencing them); must be requested
+            explicitly, a stale client list would otherwise delete data
+        now: Timestamp for createdAt/updatedAt
+
+    Returns:
+        SyncPlan; plan.errors is non-empty if any item failed validation
+    """
+    now = now or datetime.utcnow()
+    plan = SyncPlan()
+
+    by_id = {str(doc["_id"]): doc for doc in existing_docs}
+    by_client_id = {doc["clientId"]: doc for doc in existing_docs if doc.get("clientId")}
+    seen = set()
+
+    for index, item in enumerate(items):
+        payload = {k: v for k, v in item.items() if k not in SERVER_FIELDS}
+        try:
+            data = config.model(**payload).model_dump()
+        except ValidationError as e:
+            plan.errors.append({
+                "index": index,
+                "id": item.get("id"),
+                "errors": e.errors(include_url=False, include_context=False),
+            })
+            continue
+
+        item_id = str(item.get("id") or "")
+        existing = by_id.get(item_id) or by_client_id.get(item_id)
+        # used/remaining hours are server-maintained; only totalHours is taken
+        has_hours = "courseHours" in data
+        client_hours = data.pop("courseHours", None)
+
+        if existing is None:
+            new_id = ObjectId()
+            doc = {**data, "_id": new_id, "userId": user_id, "createdAt": now, "updatedAt": now}
+            if has_hours:
+                doc["courseHours"] = total_hours_update(client_hours, None)[0].get("courseHours")
+            if config.versioned:
+                doc["version"] = 1
+            if item_id:
+                # Also covers ObjectIds deleted on the server: the client keeps
+                # its id, so later syncs must match it to the re-inserted record
+                doc["clientId"] = item_id
+                plan.id_map[item_id] = str(new_id)
+            plan.operations.append(InsertOne(doc))
+            plan.inserted_ids.append(new_id)
+            plan.inserted += 1
+            continue
+
+        existing_id = str(existing["_id"])
+        seen.add(existing_id)
+        if item_id != existing_id:
+            plan.id_map[item_id] = existing_id
+
+        server_version = existing.get("version", 1)
+        client_version = item.get("version")
+        if config.versioned and client_version is not None and client_version != server_version:
+            plan.conflicts.append(existing_id)
+            continue
+
+        changes = _changed_fields(data, existing)
+        hours_set, hours_inc = total_hours_update(client_hours, existing.get("courseHours"))
+        if not changes and not hours_set:
+            plan.unchanged += 1
+            continue
+
+        update = {"$set": {**changes, **hours_set, "updatedAt": now}}
+        filter_ = {"_id": existing["_id"], "userId": user_id}
+        if hours_inc:
+            update["$inc"] = hours_inc
+        if config.versioned:
+            # Documents written before versioning have no version and count as 1
+            update["$set"]["version"] = server_version + 1
+            # Guard against writes that land between our read and bulk_write
+            filter_["version"] = existing.get("version")
+        plan.operations.append(UpdateOne(filter_, update))
+        plan.updated_ids.append(existing["_id"])
+        plan.updated += 1
+
+    if delete_missing and not plan.errors:
+        missing = [doc for doc in existing_docs if str(doc["_id"]) not in seen]
+        if missing:
+            plan.operations.append(DeleteMany({"_id": {"$in": [doc["_id"] for doc in missing]}, "userId": user_id}))
+            plan.deleted = len(missing)
+            plan.deleted_ids = [str(doc["_id"]) for doc in missing]
+            plan.deleted_refs = [ref for doc in missing for ref in entity_refs(doc)]
+
+    return plan
+
+
+async def sync_collection(
+    db,
+    config: SyncCollection,
+    user_id: str,
+    items: List[Dict[str, Any]],
+    delete_missing: bool = False
+) -> SyncPlan:
+    """
+    Read the tenant's documents once, diff, and apply in one bulk_write
+
+    Nothing is written if any item fails validation. For versioned
+    collections plan.versions holds the stored version of every written
+    document, so the client can carry it into its next save; updated
+    documents are left out when an update raced, since the stored version
+    may then belong to someone else's write.
+    """
+    existing_docs = await db[config.name].find({"userId": user_id}).to_list(length=None)
+    plan = plan_sync(config, user_id, items, existing_docs, delete_missing)
+
+    if plan.errors or not plan.operations:
+        return plan
+
+    result = await db[config.name].bulk_write(plan.operations, ordered=False)
+    if result.deleted_count:
+        await record_deletions(db, user_id, config.name, plan.deleted_ids)
+        await cascade_references(db, user_id, config.name, plan.deleted_refs)
+    plan.deleted = result.deleted_count
+    plan.raced = plan.updated - result.matched_count
+    plan.updated = result.matched_count
+    written = plan.inserted_ids + ([] if plan.raced else plan.updated_ids)
+    if config.versioned and written:
+        cursor = db[config.name].find({"_id": {"$in": written}}, {"version": 1})
+        plan.versions = {str(doc["_id"]): doc.get("version", 1) async for doc in cursor}
+    return plan
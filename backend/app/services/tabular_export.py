@@ -0,0 +1,104 @@
+"""
+Tabular Export Helpers
+CSV / XLSX 流式导出工具
+"""
+import csv
+import io
+import tempfile
+from typing import Iterable, List, Sequence
+
+from fastapi.responses import StreamingResponse
+from openpyxl import Workbook
+from starlette.concurrency import run_in_threadpool
+
+CSV_MEDIA_TYPE = "text/csv"  # Starlette appends charset=utf-8
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Rows buffered per CSV chunk
+CSV_CHUNK_ROWS = 500
+# Bytes per chunk when streaming a spooled file
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def iter_csv(header: Sequence[str], rows: Iterable[Sequence]) -> Iterable[bytes]:
+    """
+    Encode rows as CSV in chunks
+
+    A UTF-8 BOM is written first so Excel opens Chinese text correctly.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(header)
+
+    for index, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if index % CSV_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode("utf-8")
+
+
+def write_xlsx(file_obj, sheet_title: str, header: Sequence[str], rows: Iterable[Sequence]) -> None:
+    """Write rows to file_obj using openpyxl's write-only mode"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    sheet.append(list(header))
+    for row in rows:
+        sheet.append(list(row))
+    workbook.save(file_obj)
+
+
+def iter_file(file_obj, chunk_size: int = FILE_CHUNK_SIZE) -> Iterable[bytes]:
+    """Yield a file object's content from the start, then close it"""
+    try:
+        file_obj.seek(0)
+        while True:
+            chunk = file_obj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file_obj.close()
+
+
+def attachment_headers(filename: str) -> dict:
+    """Content-Disposition header for a download"""
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+
+async def tabular_response(
+    fmt: str,
+    filename: str,
+    header: List[str],
+    rows: Iterable[Sequence],
+    sheet_title: str = "Sheet1"
+) -> StreamingResponse:
+    """
+    Build a streaming CSV or XLSX download
+
+    The workbook is written in a worker thread so the event loop stays free.
+
+    Args:
+        fmt: "csv" or "xlsx"
+        filename: Download filename without extension
+        header: Column names
+        rows: Row iterable (consumed lazily for CSV)
+        sheet_title: Worksheet title for XLSX
+    """
+    if fmt == "xlsx":
+        spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        await run_in_threadpool(write_xlsx, spool, sheet_title, header, rows)
+        return StreamingResponse(
+            iter_file(spool),
+            media_type=XLSX_MEDIA_TYPE,
+            headers=attachment_headers(f"{filename}.xlsx")
+        )
+
+    return StreamingResponse(
+        iter_csv(header, rows),
+        media_type=CSV_MEDIA_TYPE,
+        headers=attachment_headers(f"{filename}.csv")
+    )
@@ -0,0 +1,204 @@
+"""
+Teacher Hours Service
+教师课时统计（用于兼职工资核算）
+
+一次聚合得到 (教师, 星期, 校区) 粒度的基础行，按排课会话物化到
+teacher_hours_summaries；报表在此基础上按日/周/月/校区汇总，
+不再扫描 scheduled_courses。
+"""
+import calendar
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.core.constants import SLOTS_PER_HOUR
+from app.services.columnar_service import is_columnar_session, load_columnar_courses
+
+GROUP_BY_OPTIONS = ("day", "week", "month", "campus")
+
+WEEKDAY_LABELS = {1: "周一", 2: "周二", 3: "周三", 4: "周四", 5: "周五", 6: "周六", 7: "周日"}
+
+
+def _teacher_hours_pipeline(user_id: str, schedule_session_id: str) -> List[dict]:
+    """Aggregation producing one row per (teacher, day, campus)"""
+    return [
+        {"$match": {
+            "userId": user_id,
+            "scheduleSessionId": schedule_session_id,
+            "status": "scheduled",
+            "isVirtual": {"$ne": True},
+        }},
+        {"$group": {
+            "_id": {"teacherId": "$teacherId", "day": "$day", "campus": "$campus"},
+            "teacherName": {"$first": "$teacherName"},
+            "courses": {"$sum": 1},
+            "slots": {"$sum": "$duration"},
+            "confirmedSlots": {"$sum": {"$cond": [
+                {"$eq": ["$confirmationStatus", "confirmed"]}, "$duration", 0
+            ]}},
+        }},
+        {"$project": {
+            "_id": 0,
+            "teacherId": "$_id.teacherId",
+            "teacherName": 1,
+            "day": "$_id.day",
+            "campus": "$_id.campus",
+            "courses": 1,
+            "slots": 1,
+            "confirmedSlots": 1,
+        }},
+    ]
+
+
+def base_rows(courses: List[dict]) -> List[dict]:
+    """Same rows as _teacher_hours_pipeline, computed from decoded courses (columnar sessions)"""
+    groups: Dict[Tuple, dict] = {}
+    for course in courses:
+        if course.get("status") != "scheduled" or course.get("isVirtual"):
+            continue
+        key = (course.get("teacherId"), course.get("day"), course.get("campus"))
+        row = groups.get(key)
+        if row is None:
+            row = groups[key] = {
+                "teacherId": key[0], "teacherName": course.get("teacherName"),
+                "day": key[1], "campus": key[2],
+                "courses": 0, "slots": 0, "confirmedSlots": 0,
+            }
+        row["courses"] += 1
+        row["slots"] += course.get("duration", 0)
+        if course.get("confirmationStatus") == "confirmed":
+            row["confirmedSlots"] += course.get("duration", 0)
+    return list(groups.values())
+
+
+async def refresh_teacher_hours_summary(db, user_id: str, schedule_session_id: str) -> List[dict]:
+    """
+    Recompute and store the materialized summary for one session
+
+    Called whenever a session's courses are written.
+    """
+    if await is_columnar_session(db, user_id, schedule_session_id):
+        rows = base_rows(await load_columnar_courses(db, user_id, schedule_session_id))
+    else:
+        rows = await db.scheduled_courses.aggregate(
+            _teacher_hours_pipeline(user_id, schedule_session_id)
+        ).to_list(length=None)
+
+    key = {"userId": user_id, "scheduleSessionId": schedule_session_id}
+    if rows:
+        await db.teacher_hours_summaries.replace_one(
+            key,
+            {**key, "rows": rows, "updatedAt": datetime.utcnow()},
+            upsert=True
+        )
+    else:
+        await db.teacher_hours_summaries.delete_one(key)
+    return rows
+
+
+async def get_teacher_hours_rows(db, user_id: str, schedule_session_id: str) -> List[dict]:
+    """Read the materialized summary, computing it on first access"""
+    doc = await db.teacher_hours_summaries.find_one(
+        {"userId": user_id, "scheduleSessionId": schedule_session_id},
+        {"rows": 1}
+    )
+    if doc is not None:
+        return doc["rows"]
+    return await refresh_teacher_hours_summary(db, user_id, schedule_session_id)
+
+
+def weekday_occurrences(month: str) -> Dict[int, int]:
+    """
+    Count how many times each weekday (1=Mon .. 7=Sun) occurs in a month
+
+    Args:
+        month: "YYYY-MM"
+    """
+    year, month_number = (int(part) for part in month.split("-"))
+    counts = defaultdict(int)
+    for week in calendar.monthcalendar(year, month_number):
+        for index, day in enumerate(week):
+            if day:
+                counts[index + 1] += 1
+    return dict(counts)
+
+
+def _normalize_day(day: int) -> int:
+    """Courses use 1-7 with Sunday as 7 (or 0 in some legacy data)"""
+    return 7 if day in (0, 7) else day
+
+
+def rollup_teacher_hours(
+    rows: List[dict],
+    group_by: str,
+    month: Optional[str] = None,
+    confirmed_only: bool = False
+) -> List[dict]:
+    """
+    Roll base rows up to the requested granularity
+
+    Args:
+        rows: Base rows from the summary
+        group_by: day / week / month / campus
+        month: "YYYY-MM", required for group_by=month
+        confirmed_only: Count confirmed courses only
+
+    Returns:
+        Report rows sorted by teacher name then period
+    """
+    slot_field = "confirmedSlots" if confirmed_only else "slots"
+    occurrences = weekday_occurrences(month) if group_by == "month" else None
+
+    totals: Dict[Tuple, Dict[str, float]] = defaultdict(lambda: {"courses": 0, "slots": 0})
+    names: Dict[str, str] = {}
+
+    for row in rows:
+        slots = row.get(slot_field, 0)
+        if not slots:
+            continue
+        teacher_id = row["teacherId"]
+        names[teacher_id] = row.get("teacherName") or teacher_id
+        day = _normalize_day(row.get("day", 0))
+
+        if group_by == "day":
+            period = day
+            multiplier = 1
+        elif group_by == "campus":
+            period = row.get("campus") or ""
+            multiplier = 1
+        elif group_by == "month":
+            period = month
+            multiplier = occurrences.get(day, 0)
+        else:
+            period = "week"
+            multiplier = 1
+
+        bucket = totals[(teacher_id, period)]
+        bucket["courses"] += row.get("courses", 0) * multiplier
+        bucket["slots"] += slots * multiplier
+
+    report = []
+    for (teacher_id, period), bucket in totals.items():
+        report.append({
+            "teacherId": teacher_id,
+            "teacherName": names[teacher_id],
+            group_by: period,
+            "courses": bucket["courses"],
+            "hours": round(bucket["slots"] / SLOTS_PER_HOUR, 2),
+        })
+
+    report.sort(key=lambda r: (r["teacherName"], str(r[group_by])))
+    return report
+
+
+def report_table(report: List[dict], group_by: str) -> Tuple[List[str], List[list]]:
+    """Header and rows for CSV/XLSX export"""
+    period_header = {"day": "星期", "week": "周期", "month": "月份", "campus": "校区"}[group_by]
+    header = ["教师ID", "教师姓名", period_header, "课程数", "课时（小时）"]
+    rows = []
+    for row in report:
+        period = row[group_by]
+        if group_by == "day":
+            period = WEEKDAY_LABELS.get(period, period)
+        rows.append([row["teacherId"], row["teacherName"], period, row["courses"], row["hours"]])
+    return header, rows
@@ -0,0 +1,223 @@
+"""
+Utilization Service
+教室/教师/校区/时段占用率统计
+
+占用率 = 被占用的时间槽数 / 标准周时间槽数（7 × 150）。
+统计在排课写入时计算一次并存入 utilization_summaries，读取只需一次 find_one。
+计算使用 numpy 差分数组：每门课在起止槽位各记一次 ±1，按行 cumsum 即得占用矩阵。
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.constants import SLOTS_PER_DAY, SLOTS_PER_HOUR, STANDARD_START, DAYS_PER_WEEK
+from app.services.columnar_service import is_columnar_session, iter_columnar_courses
+
+WEEK_SLOTS = SLOTS_PER_DAY * DAYS_PER_WEEK
+HOURS_PER_DAY = -(-SLOTS_PER_DAY // SLOTS_PER_HOUR)  # ceil: 9:00-21:30 → 13 hour buckets
+
+COURSE_PROJECTION = {
+    "_id": 0, "day": 1, "startSlot": 1, "duration": 1,
+    "teacherId": 1, "teacherName": 1, "classroomId": 1, "classroomName": 1, "campus": 1,
+}
+
+
+def occupancy_matrix(keys: np.ndarray, days: np.ndarray, starts: np.ndarray,
+                     durations: np.ndarray, n_keys: int) -> np.ndarray:
+    """
+    Build a boolean (n_keys, WEEK_SLOTS) occupancy matrix
+
+    Args:
+        keys: Resource index per course
+        days: Course day (1-7, Sunday may be 0 or 7)
+        starts: Start slot within the day
+        durations: Duration in slots
+        n_keys: Number of resources
+    """
+    diff = np.zeros((n_keys, WEEK_SLOTS + 1), dtype=np.int32)
+    if len(keys):
+        day_index = np.where((days == 0) | (days == 7), 6, days - 1)
+        valid = (day_index >= 0) & (day_index < DAYS_PER_WEEK) & (durations > 0)
+        day_start = day_index[valid] * SLOTS_PER_DAY
+        begin = day_start + np.clip(starts[valid], 0, SLOTS_PER_DAY)
+        end = day_start + np.clip(starts[valid] + durations[valid], 0, SLOTS_PER_DAY)
+        np.add.at(diff, (keys[valid], begin), 1)
+        np.add.at(diff, (keys[valid], end), -1)
+    return np.cumsum(diff[:, :-1], axis=1) > 0
+
+
+def hour_of_day_ratios(occupancy: np.ndarray) -> List[float]:
+    """Share of resource-slots occupied in each hour bucket across the week"""
+    n_keys = occupancy.shape[0]
+    if n_keys == 0:
+        return [0.0] * HOURS_PER_DAY
+    padded_width = HOURS_PER_DAY * SLOTS_PER_HOUR
+    by_day = occupancy.reshape(n_keys, DAYS_PER_WEEK, SLOTS_PER_DAY)
+    padded = np.zeros((n_keys, DAYS_PER_WEEK, padded_width), dtype=bool)
+    padded[:, :, :SLOTS_PER_DAY] = by_day
+    busy = padded.reshape(n_keys, DAYS_PER_WEEK, HOURS_PER_DAY, SLOTS_PER_HOUR).sum(axis=(0, 1, 3))
+    slots_per_bucket = np.minimum(
+        SLOTS_PER_HOUR,
+        SLOTS_PER_DAY - np.arange(HOURS_PER_DAY) * SLOTS_PER_HOUR
+    )
+    capacity = slots_per_bucket * n_keys * DAYS_PER_WEEK
+    return [round(float(r), 4) for r in busy / capacity]
+
+
+def _index(values: List[Optional[str]]) -> Tuple[np.ndarray, List[str]]:
+    """Map string ids to dense integer indexes (-1 for missing)"""
+    lookup: Dict[str, int] = {}
+    indexes = np.empty(len(values), dtype=np.int64)
+    for position, value in enumerate(values):
+        if value:
+            indexes[position] = lookup.setdefault(value, len(lookup))
+        else:
+            indexes[position] = -1
+    return indexes, list(lookup)
+
+
+def compute_utilization(courses: List[dict], classrooms: Optional[List[dict]] = None) -> dict:
+    """
+    Compute the utilization summary for one session's courses
+
+    Args:
+        courses: Course documents (COURSE_PROJECTION fields)
+        classrooms: Tenant classrooms ({"_id", "name"}) so idle rooms show up as 0
+
+    Returns:
+        Summary with classrooms, teachers, campuses and hourOfDay sections
+    """
+    days = np.fromiter((c.get("day", 0) for c in courses), dtype=np.int64, count=len(courses))
+    starts = np.fromiter((c.get("startSlot", 0) for c in courses), dtype=np.int64, count=len(courses))
+    durations = np.fromiter((c.get("duration", 0) for c in courses), dtype=np.int64, count=len(courses))
+
+    names: Dict[str, str] = {}
+    room_campus: Dict[str, str] = {}
+    for course in courses:
+        if course.get("teacherId"):
+            names[course["teacherId"]] = course.get("teacherName") or course["teacherId"]
+        if course.get("classroomId"):
+            names[course["classroomId"]] = course.get("classroomName") or course["classroomId"]
+            if course.get("campus"):
+                room_campus.setdefault(course["classroomId"], course["campus"])
+
+    room_values = [c.get("classroomId") for c in courses]
+    for room in classrooms or []:
+        room_id = str(room["_id"])
+        names.setdefault(room_id, room.get("name") or room_id)
+        room_values.append(room_id)
+    room_keys, room_ids = _index(room_values)
+    room_keys = room_keys[:len(courses)]
+
+    teacher_keys, teacher_ids = _index([c.get("teacherId") for c in courses])
+
+    room_mask = room_keys >= 0
+    room_occupancy = occupancy_matrix(
+        room_keys[room_mask], days[room_mask], starts[room_mask], durations[room_mask], len(room_ids)
+    )
+    teacher_mask = teacher_keys >= 0
+    teacher_occupancy = occupancy_matrix(
+        teacher_keys[teacher_mask], days[teacher_mask], starts[teacher_mask],
+        durations[teacher_mask], len(teacher_ids)
+    )
+
+    room_busy = room_occupancy.sum(axis=1)
+    teacher_busy = teacher_occupancy.sum(axis=1)
+
+    campus_busy: Dict[str, List[int]] = {}
+    for position, room_id in enumerate(room_ids):
+        campus = room_campus.get(room_id)
+        if campus:
+            totals = campus_busy.setdefault(campus, [0, 0])
+            totals[0] += int(room_busy[position])
+            totals[1] += 1
+
+    def resource_rows(ids: List[str], busy: np.ndarray) -> List[dict]:
+        return [
+            {
+                "id": resource_id,
+                "name": names.get(resource_id, resource_id),
+                "occupiedSlots": int(busy[position]),
+                "ratio": round(float(busy[position]) / WEEK_SLOTS, 4),
+            }
+            for position, resource_id in enumerate(ids)
+        ]
+
+    room_hours = hour_of_day_ratios(room_occupancy)
+    teacher_hours = hour_of_day_ratios(teacher_occupancy)
+
+    return {
+        "capacitySlots": WEEK_SLOTS,
+        "totalCourses": len(courses),
+        "classrooms": resource_rows(room_ids, room_busy),
+        "teachers": resource_rows(teacher_ids, teacher_busy),
+        "campuses": [
+            {
+                "campus": campus,
+                "classrooms": rooms,
+                "occupiedSlots": busy,
+                "ratio": round(busy / (rooms * WEEK_SLOTS), 4),
+            }
+            for campus, (busy, rooms) in sorted(campus_busy.items())
+        ],
+        "hourOfDay": [
+            {
+                "hour": STANDARD_START + bucket,
+                "classroomRatio": room_hours[bucket],
+                "teacherRatio": teacher_hours[bucket],
+            }
+            for bucket in range(HOURS_PER_DAY)
+        ],
+    }
+
+
+async def refresh_utilization_summary(db, user_id: str, schedule_session_id: str) -> dict:
+    """Recompute and store the utilization summary for one session"""
+    if await is_columnar_session(db, user_id, schedule_session_id):
+        courses = [
+            course async for course in iter_columnar_courses(
+                db, user_id, schedule_session_id,
+                filters={"status": "scheduled", "isVirtual": 0},
+                fields=[field for field, included in COURSE_PROJECTION.items() if included]
+            )
+        ]
+    else:
+        courses = await db.scheduled_courses.find(
+            {
+                "userId": user_id,
+                "scheduleSessionId": schedule_session_id,
+                "status": "scheduled",
+                "isVirtual": {"$ne": True},
+            },
+            COURSE_PROJECTION
+        ).to_list(length=None)
+    classrooms = await db.classrooms.find(
+        {"userId": user_id}, {"_id": 1, "name": 1}
+    ).to_list(length=None)
+
+    key = {"userId": user_id, "scheduleSessionId": schedule_session_id}
+    summary = compute_utilization(courses, classrooms)
+    summary.update(key)
+    summary["updatedAt"] = datetime.utcnow()
+
+    if courses:
+        await db.utilization_summaries.replace_one(key, summary, upsert=True)
+    else:
+        await db.utilization_summaries.delete_one(key)
+    return summary
+
+
+async def get_utilization_summary(db, user_id: str, schedule_session_id: str,
+                                  recompute: bool = False) -> dict:
+    """Read the stored summary (one find_one), computing it if missing"""
+    if not recompute:
+        doc = await db.utilization_summaries.find_one(
+            {"userId": user_id, "scheduleSessionId": schedule_session_id},
+            {"_id": 0}
+        )
+        if doc is not None:
+            return doc
+    summary = await refresh_utilization_summary(db, user_id, schedule_session_id)
+    summary.pop("_id", None)
+    return summary
@@ -0,0 +1,94 @@
+"""
+Versioning Service
+乐观并发控制
+
+更新在一次 find_one_and_update 中完成：过滤条件带上期望版本号，
+同时把版本加一并返回新文档。版本号通过 HTTP ETag / If-Match 暴露给客户端；
+引入版本号之前写入的文档没有 version 字段，按版本 1 处理。
+"""
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+
+class VersionConflictError(Exception):
+    """The document exists but its version no longer matches If-Match"""
+
+    def __init__(self, current_version: Optional[int] = None):
+        super().__init__("Version conflict")
+        self.current_version = current_version
+
+
+def make_etag(version: int) -> str:
+    """Strong ETag for a document version"""
+    return f'"{version}"'
+
+
+def parse_if_match(header: Optional[str]) -> Optional[int]:
+    """
+    Extract the expected version from an If-Match header
+
+    Returns None when the header is absent or "*" (unconditional update).
+
+    Raises:
+        ValueError: If the header is not a version ETag
+    """
+    if header is None:
+        return None
+    value = header.strip()
+    if value == "*":
+        return None
+    if value.startswith("W/"):
+        value = value[2:]
+    return int(value.strip('"'))
+
+
+async def update_versioned(
+    collection,
+    doc_id: ObjectId,
+    user_id: str,
+    fields: dict,
+    expected_version: Optional[int] = None,
+    increments: Optional[dict] = None
+) -> Optional[dict]:
+    """
+    Apply fields and bump version in one round-trip
+
+    Args:
+        collection: Motor collection
+        doc_id: Document id
+        user_id: Tenant id
+        fields: Fields to $set
+        expected_version: Version the client last saw (None = unconditional)
+        increments: Extra fields to $inc alongside the version
+
+    Returns:
+        Updated document, or None if it does not exist
+
+    Raises:
+        VersionConflictError: If expected_version is stale
+    """
+    query = {"_id": doc_id, "userId": user_id}
+    update = {"$set": {**fields, "updatedAt": datetime.utcnow()}, "$inc": dict(increments or {})}
+    if expected_version is None:
+        update["$inc"]["version"] = 1
+    else:
+        # Documents written before versioning have no version and are served as 1
+        query["version"] = {"$in": [1, None]} if expected_version == 1 else expected_version
+        update["$set"]["version"] = expected_version + 1
+    if not update["$inc"]:
+        del update["$inc"]
+
+    updated = await collection.find_one_and_update(
+        query, update, return_document=ReturnDocument.AFTER
+    )
+    if updated is not None or expected_version is None:
+        return updated
+
+    # Only on the failure path: distinguish "gone" from "stale"
+    current = await collection.find_one({"_id": doc_id, "userId": user_id}, {"version": 1})
+    if current is None:
+        return None
+    raise VersionConflictError(current.get("version"))
@@ -0,0 +1 @@
+# Benchmarks (run manually against a MongoDB instance)
@@ -0,0 +1,161 @@
+"""
+Columnar Storage Benchmark
+排课会话存储格式基准：每课程一个文档 vs 列式块文档（columnar_service）
+
+默认只测量应用侧：BSON 体积、写入前编码时间、整会话解码为课程字典的时间，
+不需要数据库。设置 --mongo 时额外对真实 MongoDB 测量 insert 与整会话读取耗时。
+
+Usage (from backend/):
+    python -m benchmarks.bench_columnar_storage --courses 20000
+    MONGODB_URL=mongodb://localhost:27017 python -m benchmarks.bench_columnar_storage --courses 20000 --mongo
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+from typing import List
+
+import bson
+from bson import ObjectId
+
+from app.services.columnar_service import CHUNK_ROWS, decode_chunk, encode_chunk
+from app.services.listing_service import iter_json_array
+from benchmarks.bench_list_serialization import ListCursor
+
+USER_ID = "bench-user"
+SESSION_ID = "session-bench"
+
+
+def make_courses(count: int) -> List[dict]:
+    """Courses drawn from realistic pools (500 students, 60 teachers, 30 rooms)"""
+    rng = random.Random(42)
+    students = [(str(ObjectId()), f"学生{i}") for i in range(500)]
+    teachers = [(str(ObjectId()), f"老师{i}") for i in range(60)]
+    rooms = [(str(ObjectId()), f"教室{i}") for i in range(30)]
+    now = datetime.utcnow()
+    courses = []
+    for _ in range(count):
+        student, teacher, room = rng.choice(students), rng.choice(teachers), rng.choice(rooms)
+        courses.append({
+            "_id": ObjectId(),
+            "studentId": student[0], "studentName": student[1],
+            "teacherId": teacher[0], "teacherName": teacher[1],
+            "classroomId": room[0], "classroomName": room[1],
+            "day": rng.randint(1, 7), "startSlot": rng.randint(0, 126), "duration": rng.choice((12, 18, 24)),
+            "subject": rng.choice(("数学", "英语", "物理")), "campus": rng.choice(("新宿", "高田马场")),
+            "mode": "offline", "isVirtual": False, "status": "scheduled",
+            "confirmationStatus": rng.choice(("pending", "confirmed")),
+            "color": "#5A6C7D", "score": round(rng.random(), 3),
+            "userId": USER_ID, "scheduleSessionId": SESSION_ID, "createdAt": now, "updatedAt": now,
+        })
+    return courses
+
+
+def make_chunks(courses: List[dict]) -> List[dict]:
+    now = datetime.utcnow()
+    return [
+        {
+            "userId": USER_ID, "scheduleSessionId": SESSION_ID, "chunk": index,
+            "createdAt": now, "updatedAt": now,
+            **encode_chunk(courses[start:start + CHUNK_ROWS]),
+        }
+        for index, start in enumerate(range(0, len(courses), CHUNK_ROWS))
+    ]
+
+
+def json_size(docs: List[dict]) -> int:
+    async def consume():
+        size = 0
+        async for chunk in iter_json_array(ListCursor(docs)):
+            size += len(chunk)
+        return size
+    return asyncio.run(consume())
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, round((time.perf_counter() - started) * 1000, 1)
+
+
+def offline(courses: List[dict]) -> None:
+    encoded_docs, docs_encode_ms = timed(lambda: [bson.encode(doc) for doc in courses])
+    encoded_chunks, chunks_encode_ms = timed(lambda: [bson.encode(chunk) for chunk in make_chunks(courses)])
+
+    def read_docs():
+        docs = [bson.decode(raw) for raw in encoded_docs]
+        for doc in docs:
+            doc.pop("userId")
+        return docs
+
+    def read_chunks():
+        docs = []
+        for raw in encoded_chunks:
+            docs.extend(decode_chunk(bson.decode(raw)))
+        return docs
+
+    docs, docs_read_ms = timed(read_docs)
+    decoded, chunks_read_ms = timed(read_chunks)
+    _, json_ms = timed(lambda: json_size(decoded))
+
+    print(f"documents bson={sum(map(len, encoded_docs)) / 1024:.0f}KB "
+          f"encode={docs_encode_ms}ms decode={docs_read_ms}ms docs={len(encoded_docs)}")
+    print(f"columnar  bson={sum(map(len, encoded_chunks)) / 1024:.0f}KB "
+          f"encode={chunks_encode_ms}ms decode={chunks_read_ms}ms docs={len(encoded_chunks)}")
+    print(f"json output (same for both) {json_ms}ms")
+
+
+async def against_mongo(courses: List[dict]) -> None:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    db = client["classarranger_bench"]
+    try:
+        await db.scheduled_courses.drop()
+        await db.scheduled_course_chunks.drop()
+
+        started = time.perf_counter()
+        await db.scheduled_courses.insert_many([dict(doc) for doc in courses], ordered=False)
+        docs_insert = time.perf_counter() - started
+        started = time.perf_counter()
+        docs = await db.scheduled_courses.find(
+            {"userId": USER_ID, "scheduleSessionId": SESSION_ID}
+        ).to_list(length=None)
+        docs_read = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await db.scheduled_course_chunks.insert_many(make_chunks(courses), ordered=False)
+        chunks_insert = time.perf_counter() - started
+        started = time.perf_counter()
+        decoded = []
+        async for chunk in db.scheduled_course_chunks.find({"userId": USER_ID, "scheduleSessionId": SESSION_ID}):
+            decoded.extend(decode_chunk(chunk))
+        chunks_read = time.perf_counter() - started
+
+        docs_stats = await db.command("collStats", "scheduled_courses")
+        chunks_stats = await db.command("collStats", "scheduled_course_chunks")
+        print(f"mongo documents insert={docs_insert * 1000:.0f}ms read={docs_read * 1000:.0f}ms "
+              f"storage={docs_stats['storageSize'] / 1024:.0f}KB ({len(docs)} docs)")
+        print(f"mongo columnar  insert={chunks_insert * 1000:.0f}ms read={chunks_read * 1000:.0f}ms "
+              f"storage={chunks_stats['storageSize'] / 1024:.0f}KB ({len(decoded)} courses)")
+    finally:
+        await client.drop_database("classarranger_bench")
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=20000)
+    parser.add_argument("--mongo", action="store_true", help="Also measure against MONGODB_URL")
+    args = parser.parse_args()
+
+    courses = make_courses(args.courses)
+    offline(courses)
+    if args.mongo:
+        asyncio.run(against_mongo(courses))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+List Serialization Benchmark
+列表接口序列化基准：10k 课程会话
+
+legacy : ScheduledCourseResponse(**doc) 逐条构建 → response_model 再校验 → jsonable_encoder → json.dumps
+fast   : listing_service.iter_json_array 直接 orjson 编码 Mongo 文档，分块输出
+
+只测量服务端 CPU 时间与峰值内存（tracemalloc），不需要数据库。
+
+Usage (from backend/):
+    python -m benchmarks.bench_list_serialization --courses 10000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime
+from typing import List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.models.scheduling import ScheduledCourseResponse
+from app.services.listing_service import iter_json_array
+
+
+def make_courses(count: int) -> List[dict]:
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(),
+            "studentId": str(ObjectId()), "studentName": f"学生{i % 500}",
+            "teacherId": str(ObjectId()), "teacherName": f"老师{i % 60}",
+            "classroomId": str(ObjectId()), "classroomName": f"教室{i % 30}",
+            "day": rng.randint(1, 7), "startSlot": rng.randint(0, 126), "duration": 24,
+            "subject": "数学", "campus": "新宿", "mode": "offline",
+            "isVirtual": False, "status": "scheduled", "confirmationStatus": "pending",
+            "color": "#5A6C7D", "score": rng.random(),
+            "scheduleSessionId": "session-bench", "createdAt": now,
+        }
+        for i in range(count)
+    ]
+
+
+class ListCursor:
+    """Minimal async cursor over in-memory documents"""
+
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return dict(next(self._docs))
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def legacy(docs: List[dict]) -> int:
+    models = []
+    for doc in docs:
+        doc = dict(doc)
+        doc["id"] = str(doc.pop("_id"))
+        models.append(ScheduledCourseResponse(**doc))
+    validated = TypeAdapter(List[ScheduledCourseResponse]).validate_python(models)
+    body = json.dumps(jsonable_encoder(validated), ensure_ascii=False).encode("utf-8")
+    return len(body)
+
+
+def fast(docs: List[dict]) -> int:
+    async def consume():
+        size = 0
+        async for chunk in iter_json_array(ListCursor(docs)):
+            size += len(chunk)
+        return size
+    return asyncio.run(consume())
+
+
+def measure(fn, docs):
+    # CPU without tracemalloc overhead, then a separate pass for peak memory
+    started = time.process_time()
+    size = fn(docs)
+    cpu = time.process_time() - started
+
+    tracemalloc.start()
+    fn(docs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"cpu_ms": round(cpu * 1000, 1), "peak_mb": round(peak / 1024 / 1024, 2), "bytes": size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=10000)
+    args = parser.parse_args()
+
+    docs = make_courses(args.courses)
+    for name, fn in (("legacy", legacy), ("fast", fast)):
+        print(f"{name:7s} {measure(fn, docs)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Update Contention Benchmark
+并发编辑基准：对比旧的 读→写→读 更新与单次往返的版本化更新
+
+N 个编辑者同时修改同一个学生：读取 rawData，追加自己的标记后写回。
+旧方式会丢失更新；版本化方式遇到 412 冲突后重读重试，不丢更新。
+
+Usage (from backend/):
+    MONGODB_URL=mongodb://localhost:27017 python -m benchmarks.bench_update_contention --editors 50 --rounds 20
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.services.versioning_service import VersionConflictError, update_versioned
+
+USER_ID = "bench-user"
+
+
+async def legacy_edit(collection, doc_id, token):
+    """Baseline: find → update (no version check) → find"""
+    existing = await collection.find_one({"_id": doc_id, "userId": USER_ID})
+    await collection.update_one(
+        {"_id": doc_id, "userId": USER_ID},
+        {"$set": {
+            "rawData": existing["rawData"] + token,
+            "updatedAt": datetime.utcnow(),
+            "version": existing.get("version", 1) + 1,
+        }}
+    )
+    await collection.find_one({"_id": doc_id})
+    return 0
+
+
+async def versioned_edit(collection, doc_id, token):
+    """find_one_and_update filtered on the version; retry on conflict"""
+    conflicts = 0
+    existing = await collection.find_one({"_id": doc_id, "userId": USER_ID}, {"rawData": 1, "version": 1})
+    while True:
+        try:
+            await update_versioned(
+                collection, doc_id, USER_ID,
+                {"rawData": existing["rawData"] + token},
+                expected_version=existing["version"]
+            )
+            return conflicts
+        except VersionConflictError:
+            conflicts += 1
+            existing = await collection.find_one({"_id": doc_id, "userId": USER_ID}, {"rawData": 1, "version": 1})
+
+
+async def run(collection, edit, editors: int, rounds: int):
+    result = await collection.insert_one({
+        "userId": USER_ID, "name": "bench", "color": "#000", "rawData": "", "version": 1
+    })
+    doc_id = result.inserted_id
+
+    async def editor(index):
+        total_conflicts = 0
+        for round_number in range(rounds):
+            total_conflicts += await edit(collection, doc_id, f"[{index}:{round_number}]")
+        return total_conflicts
+
+    started = time.perf_counter()
+    conflicts = sum(await asyncio.gather(*(editor(i) for i in range(editors))))
+    elapsed = time.perf_counter() - started
+
+    final = await collection.find_one({"_id": doc_id})
+    applied = final["rawData"].count("[")
+    await collection.delete_one({"_id": doc_id})
+    return {
+        "expected": editors * rounds,
+        "applied": applied,
+        "lost": editors * rounds - applied,
+        "conflicts_retried": conflicts,
+        "seconds": round(elapsed, 3),
+        "edits_per_sec": round(editors * rounds / elapsed, 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--editors", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    collection = client["classarranger_bench"]["students"]
+    try:
+        for name, edit in (("legacy", legacy_edit), ("versioned", versioned_edit)):
+            stats = await run(collection, edit, args.editors, args.rounds)
+            print(f"{name:10s} {stats}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,30 @@
+import pytest
+
+from app.services.adjustment_log_service import replay
+
+
+def _event(target_id, field, value, result="success"):
+    return {
+        "targetType": "course", "targetId": target_id, "result": result,
+        "modificationData": {"field": field, "oldValue": None, "newValue": value},
+    }
+
+
+@pytest.mark.unit
+def test_replay_keeps_last_value_per_field():
+    state = replay([
+        _event("c1", "day", 1),
+        _event("c1", "day", 3),
+        _event("c2", "startSlot", 96),
+        _event("c1", "day", 5, result="failed"),
+        {"targetType": "course", "targetId": "c1", "result": "success", "modificationData": {}},
+    ])
+    assert state == {"course": {"c1": {"day": 3}, "c2": {"startSlot": 96}}}
+
+
+@pytest.mark.unit
+def test_replay_from_snapshot_does_not_mutate_it():
+    snapshot = {"course": {"c1": {"day": 1}}}
+    state = replay([_event("c1", "day", 2), _event("c3", "day", 4)], snapshot)
+    assert state == {"course": {"c1": {"day": 2}, "c3": {"day": 4}}}
+    assert snapshot == {"course": {"c1": {"day": 1}}}
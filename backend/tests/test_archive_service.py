@@ -0,0 +1,25 @@
+import bson
+import pytest
+from bson import ObjectId
+
+from app.services.archive_service import compress_chunk, decompress_chunk
+from app.services.columnar_service import decode_chunk, encode_chunk
+
+
+@pytest.mark.unit
+def test_compressed_chunk_round_trip():
+    courses = [
+        {
+            "_id": ObjectId(), "studentId": f"s{i % 20}", "studentName": f"学生{i % 20}",
+            "teacherId": "t1", "teacherName": "王老师", "classroomId": "r1", "classroomName": "A101",
+            "day": 1 + i % 7, "startSlot": i % 120, "duration": 12,
+            "subject": "数学", "campus": "新宿", "mode": "offline", "isVirtual": False,
+            "status": "scheduled", "confirmationStatus": "pending", "color": None, "score": None,
+        }
+        for i in range(500)
+    ]
+    body = encode_chunk(courses)
+    data = compress_chunk(body)
+
+    assert decode_chunk(decompress_chunk(data)) == courses
+    assert len(data) * 10 < len(bson.encode({"courses": courses}))
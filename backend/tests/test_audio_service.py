@@ -0,0 +1,35 @@
+import asyncio
+import os
+
+import pytest
+
+from app.services.audio_service import UploadTooLargeError, save_audio_upload
+
+
+class FakeUpload:
+    def __init__(self, data: bytes, filename: str = "talk.MP3"):
+        self.data = data
+        self.filename = filename
+
+    async def read(self, size: int) -> bytes:
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+
+@pytest.mark.unit
+def test_save_audio_upload_streams_to_disk():
+    path, size = asyncio.run(save_audio_upload(FakeUpload(b"x" * 3000), max_bytes=4000))
+    try:
+        assert size == 3000
+        assert path.endswith(".mp3")
+        assert os.path.getsize(path) == 3000
+    finally:
+        os.unlink(path)
+
+
+@pytest.mark.unit
+def test_save_audio_upload_rejects_oversized_upload_and_removes_partial_file(tmp_path, monkeypatch):
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(save_audio_upload(FakeUpload(b"x" * (3 * 1024 * 1024)), max_bytes=2 * 1024 * 1024))
+    assert os.listdir(tmp_path) == []
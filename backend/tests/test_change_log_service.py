@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.services.change_log_service import get_changes, to_watermark
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return [dict(doc) for doc in self.docs]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return FakeCursor(self.docs)
+
+
+class FakeDB(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+@pytest.mark.unit
+def test_columnar_sessions_are_reported_as_session_changes():
+    db = FakeDB()
+    session = {"scheduleSessionId": "session-1", "storage": "columnar", "updatedAt": datetime.utcnow()}
+    db["scheduling_metadata"] = FakeCollection([session])
+
+    result = asyncio.run(get_changes(db, "u1", to_watermark(datetime.utcnow()), ["courses"]))
+
+    assert result["changes"]["courseSessions"] == [session]
+    query = db["scheduling_metadata"].queries[0]
+    assert query["storage"] == "columnar"
+    assert query["archivedAt"] == {"$exists": False}
+    assert "courseSessions" in result["deleted"]  # archived sessions arrive as tombstones
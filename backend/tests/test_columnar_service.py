@@ -0,0 +1,61 @@
+import bson
+import pytest
+from bson import ObjectId
+
+from app.services.columnar_service import confirmed_hours_by_student, decode_chunk, encode_chunk
+from app.services.teacher_hours_service import base_rows
+
+
+def _course(**overrides):
+    course = {
+        "_id": ObjectId(),
+        "studentId": "s1", "studentName": "小明",
+        "teacherId": "t1", "teacherName": "王老师",
+        "classroomId": "r1", "classroomName": "A101",
+        "day": 1, "startSlot": 0, "duration": 12,
+        "subject": "数学", "campus": "新宿", "mode": "offline",
+        "isVirtual": False, "status": "scheduled", "confirmationStatus": "pending",
+        "color": None, "score": None,
+    }
+    course.update(overrides)
+    return course
+
+
+@pytest.mark.unit
+def test_chunk_round_trip_through_bson():
+    courses = [
+        _course(),
+        _course(studentId="s2", studentName="小红", day=7, startSlot=149, duration=300, score=0.25),
+        _course(teacherId="t2", teacherName="李老师", subject=None, isVirtual=True),
+    ]
+    chunk = bson.decode(bson.encode(encode_chunk(courses)))
+
+    assert decode_chunk(chunk) == courses
+    assert chunk["tables"]["students"]["ids"] == ["s1", "s2"]
+
+
+@pytest.mark.unit
+def test_decode_filters_and_fields():
+    courses = [_course(), _course(teacherId="t2", teacherName="李老师", day=3), _course(day=3)]
+    chunk = encode_chunk(courses)
+
+    decoded = decode_chunk(chunk, filters={"day": 3, "teacherId": "t1"}, fields=["teacherName"])
+    assert decoded == [{"_id": courses[2]["_id"], "teacherName": "王老师"}]
+    assert decode_chunk(chunk, filters={"teacherId": "missing"}) == []
+    with pytest.raises(ValueError):
+        decode_chunk(chunk, filters={"score": 1})
+
+
+@pytest.mark.unit
+def test_python_summaries_match_pipeline_rules():
+    courses = [
+        _course(confirmationStatus="confirmed"),
+        _course(confirmationStatus="confirmed", isVirtual=True),
+        _course(status="unscheduled"),
+        _course(duration=24),
+    ]
+    assert confirmed_hours_by_student(courses) == {"s1": 1.0}
+    assert base_rows(courses) == [{
+        "teacherId": "t1", "teacherName": "王老师", "day": 1, "campus": "新宿",
+        "courses": 2, "slots": 36, "confirmedSlots": 12,
+    }]
@@ -0,0 +1,55 @@
+import pytest
+
+from app.services.constraint_parser import parse_constraint
+
+
+@pytest.mark.unit
+def test_weekday_range_with_afternoon_clock_range():
+    result = parse_constraint("周一到周五下午1-5点")
+    assert result["allowedDays"] == [1, 2, 3, 4, 5]
+    assert result["allowedTimeRanges"] == [{"day": None, "start": 48, "end": 96}]
+    assert result["strictness"] == "strict"
+    assert result["confidence"] >= 0.9
+
+
+@pytest.mark.unit
+def test_exclusion_and_per_day_segments():
+    excluded = parse_constraint("除了平日下午，其他都可以")
+    assert excluded["allowedTimeRanges"] == []
+    assert [entry["day"] for entry in excluded["excludedTimeRanges"]] == [1, 2, 3, 4, 5]
+    assert excluded["strictness"] == "flexible"
+
+    mixed = parse_constraint("平日的上午晚上，周末全天 尽量排周末")
+    assert {"day": 6, "start": 0, "end": 150} in mixed["allowedTimeRanges"]
+    assert {"day": 3, "start": 108, "end": 150} in mixed["allowedTimeRanges"]
+    assert mixed["strictness"] == "preferred"
+
+
+@pytest.mark.unit
+def test_chinese_clock_times_and_bounds():
+    assert parse_constraint("平日晚上的话五点半之后可以")["allowedTimeRanges"] == [
+        {"day": None, "start": 102, "end": 150}
+    ]
+    assert parse_constraint("平日需12：30之前，18点之后")["allowedTimeRanges"] == [
+        {"day": None, "start": 0, "end": 42}, {"day": None, "start": 108, "end": 150}
+    ]
+
+
+@pytest.mark.unit
+def test_dates_and_unknown_text_lower_confidence():
+    assert parse_constraint("12/5的12：30~18点之间不能排课")["confidence"] < 0.6
+    assert parse_constraint("pm130-")["confidence"] < 0.6
+    assert parse_constraint("一周两次")["timesPerWeek"] == 2
+
+
+@pytest.mark.unit
+def test_day_lists_share_the_period_that_follows_them():
+    evening = [{"day": 2, "start": 108, "end": 150}, {"day": 4, "start": 108, "end": 150}]
+    for text in ("周二、周四晚上", "周二和周四晚上"):
+        result = parse_constraint(text)
+        assert result["allowedDays"] == [2, 4]
+        assert result["allowedTimeRanges"] == evening
+
+    short = parse_constraint("周二、四晚上")
+    assert short["allowedDays"] == [2, 4]
+    assert short["allowedTimeRanges"] == [{"day": None, "start": 108, "end": 150}]
@@ -0,0 +1,15 @@
+import pytest
+
+from app.services.counter_service import counter_label, counter_names
+
+
+@pytest.mark.unit
+def test_counter_label_continues_past_z():
+    assert [counter_label(value) for value in (0, 25, 26, 51, 52, 701, 702)] == [
+        "A", "Z", "AA", "AZ", "BA", "ZZ", "AAA"
+    ]
+
+
+@pytest.mark.unit
+def test_counter_names_cover_reserved_range():
+    assert counter_names("teacher", 24, 27) == ["教师Y", "教师Z", "教师AA"]
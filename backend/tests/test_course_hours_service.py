@@ -0,0 +1,53 @@
+import pytest
+
+from app.services.course_hours_service import course_hours, hours_delta, merge_deltas, total_hours_update
+
+
+def _course(**overrides):
+    course = {
+        "studentId": "s1",
+        "duration": 24,
+        "status": "scheduled",
+        "confirmationStatus": "confirmed",
+        "isVirtual": False,
+    }
+    course.update(overrides)
+    return course
+
+
+@pytest.mark.unit
+def test_course_hours_only_counts_confirmed_real_courses():
+    assert course_hours(_course()) == 2
+    assert course_hours(_course(confirmationStatus="pending")) == 0
+    assert course_hours(_course(isVirtual=True)) == 0
+    assert course_hours(_course(status="unscheduled")) == 0
+    assert course_hours(None) == 0
+
+
+@pytest.mark.unit
+def test_hours_delta_on_confirmation_and_unconfirmation():
+    pending = _course(confirmationStatus="pending")
+    confirmed = _course()
+    assert hours_delta(pending, confirmed) == {"s1": 2}
+    assert hours_delta(confirmed, pending) == {"s1": -2}
+    assert hours_delta(confirmed, confirmed) == {}
+
+
+@pytest.mark.unit
+def test_hours_delta_moves_hours_between_students():
+    assert hours_delta(_course(), _course(studentId="s2", duration=12)) == {"s1": -2, "s2": 1}
+
+
+@pytest.mark.unit
+def test_merge_deltas_drops_zero_entries():
+    assert merge_deltas({"s1": 2, "s2": 1}, {"s1": -2}) == {"s2": 1}
+
+
+@pytest.mark.unit
+def test_total_hours_update_ignores_client_used_and_remaining_hours():
+    stored = {"totalHours": 10, "usedHours": 4, "remainingHours": 6}
+    stale = {"totalHours": 10, "usedHours": 0, "remainingHours": 10}
+    assert total_hours_update(stale, stored) == ({}, {})
+    assert total_hours_update({**stale, "totalHours": 12}, stored) == (
+        {"courseHours.totalHours": 12}, {"courseHours.remainingHours": 2}
+    )
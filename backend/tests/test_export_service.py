@@ -0,0 +1,41 @@
+from datetime import date, datetime
+
+import pytest
+
+from app.services.export_service import course_row, ics_event, ics_line, monday_of
+
+
+@pytest.mark.unit
+def test_course_row_formats_slots_as_clock_times():
+    row = course_row({"studentName": "学生A", "day": 0, "startSlot": 6, "duration": 18})
+    assert row[:8] == ["学生A", "", "", "", "周日", "09:30", "11:00", 1.5]
+
+
+@pytest.mark.unit
+def test_ics_line_folds_at_75_octets_without_splitting_characters():
+    folded = ics_line("SUMMARY:" + "数学" * 40)
+    lines = folded.split("\r\n")
+    assert all(len(line.encode("utf-8")) <= 75 for line in lines)
+    assert "".join(line[1:] if i else line for i, line in enumerate(lines)) == "SUMMARY:" + "数学" * 40
+
+
+@pytest.mark.unit
+def test_ics_event_starts_in_requested_week():
+    event = ics_event(
+        {"_id": "c1", "day": 3, "startSlot": 12, "duration": 24, "subject": "数学", "classroomName": "A,1"},
+        monday_of(date(2026, 10, 18)), datetime(2026, 10, 1), weeks=10
+    )
+    assert "DTSTART:20261014T100000\r\n" in event
+    assert "DTEND:20261014T120000\r\n" in event
+    assert "RRULE:FREQ=WEEKLY;COUNT=10\r\n" in event
+    assert "LOCATION:A\\,1\r\n" in event
+
+
+@pytest.mark.unit
+def test_ics_event_places_sunday_at_end_of_week():
+    event = ics_event(
+        {"_id": "c2", "day": 0, "startSlot": 0, "duration": 12},
+        monday_of(date(2026, 10, 14)), datetime(2026, 10, 1), weeks=None
+    )
+    assert "DTSTART:20261018T090000\r\n" in event
+    assert "RRULE:FREQ=WEEKLY\r\n" in event
@@ -0,0 +1,42 @@
+from datetime import time
+
+import pytest
+
+from app.services.import_service import (
+    RowImporter, parse_duration_slots, parse_mode, time_to_slot
+)
+
+
+@pytest.mark.unit
+def test_cell_parsers():
+    assert parse_duration_slots("2小时/节") == 24
+    assert parse_duration_slots("90分钟") == 18
+    assert parse_mode("线上线下皆可") == "hybrid"
+    assert parse_mode("线下") == "offline"
+    assert time_to_slot(time(9, 30)) == 6
+    assert time_to_slot("21:30") == 150
+
+
+@pytest.mark.unit
+def test_importer_maps_columns_by_header_and_batches():
+    rows = iter([
+        ("课表", None),
+        ("校区", "教室名", "时间段开始", "时间段结束", "班容"),
+        ("本校", "A101", time(10, 0), time(18, 0), 6),
+        (None, None, None, None, None),
+        ("本校", "A102", None, None, None),
+        ("本校", "A101", None, None, None),
+    ])
+    importer = RowImporter(rows)
+    assert importer.kind == "classrooms"
+
+    batch = importer.next_batch(size=1)
+    assert [doc["name"] for doc in batch] == ["A101"]
+    assert batch[0]["capacity"] == 6
+    assert batch[0]["availableTimeRanges"][0] == {"day": 1, "startSlot": 12, "endSlot": 108}
+
+    batch = importer.next_batch(size=10)
+    assert [doc["name"] for doc in batch] == ["A102"]
+    assert batch[0]["capacity"] == 2
+    assert importer.next_batch() is None
+    assert (importer.report.rows, importer.report.skipped) == (3, 1)
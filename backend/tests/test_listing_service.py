@@ -0,0 +1,24 @@
+import pytest
+from bson import ObjectId
+
+from app.models.scheduling import StudentResponse
+from app.services.listing_service import apply_cursor, build_projection
+
+
+@pytest.mark.unit
+def test_build_projection():
+    assert build_projection(None, StudentResponse) == {"userId": 0, "clientId": 0}
+    assert build_projection("id,name, courseHours", StudentResponse) == {
+        "_id": 1, "name": 1, "courseHours": 1
+    }
+    with pytest.raises(ValueError):
+        build_projection("name,password", StudentResponse)
+
+
+@pytest.mark.unit
+def test_apply_cursor():
+    cursor = str(ObjectId())
+    assert apply_cursor({"userId": "u1"}, None) == {"userId": "u1"}
+    assert apply_cursor({"userId": "u1"}, cursor) == {"userId": "u1", "_id": {"$gt": ObjectId(cursor)}}
+    with pytest.raises(ValueError):
+        apply_cursor({}, "not-an-id")
@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_cache_service import LLMCache, llm_cache_key
+
+
+@pytest.mark.unit
+def test_cache_key_ignores_whitespace_and_newline_style():
+    assert llm_cache_key("S", "周一\r\n下午  ", "gpt-4o-mini", 0) == llm_cache_key(" S", "周一\n下午", "gpt-4o-mini", 0)
+    assert llm_cache_key("S", "周一", "gpt-4o-mini", 0) != llm_cache_key("S", "周一", "gpt-4o", 0)
+
+
+@pytest.mark.unit
+def test_lru_evicts_least_recently_used_and_counts_hits():
+    cache = LLMCache(max_entries=2, ttl_seconds=60)
+
+    async def scenario():
+        await cache.put(None, "a", {"content": "1"}, "m")
+        await cache.put(None, "b", {"content": "2"}, "m")
+        assert await cache.get(None, "a") == ({"content": "1"}, "memory")
+        await cache.put(None, "c", {"content": "3"}, "m")
+        assert await cache.get(None, "b") is None
+
+    asyncio.run(scenario())
+    assert cache.metrics()["hits"] == 1
+    assert cache.metrics()["misses"] == 1
+    assert cache.metrics()["memoryEntries"] == 2
@@ -0,0 +1,60 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.core.config import settings
+from app.services import openai_service
+
+
+def status_error(error_type, status_code, headers=None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status_code, request=request, headers=headers or {})
+    return error_type("error", response=response, body=None)
+
+
+@pytest.mark.unit
+def test_retries_transient_errors_then_succeeds(monkeypatch):
+    monkeypatch.setattr(settings, "openai_retry_base_seconds", 0)
+    monkeypatch.setattr(openai_service, "_semaphore", None)
+    errors = [
+        status_error(openai.RateLimitError, 429, {"retry-after": "0"}),
+        status_error(openai.InternalServerError, 503),
+    ]
+
+    async def operation():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert asyncio.run(openai_service.with_retries(operation)) == "ok"
+
+
+@pytest.mark.unit
+def test_client_errors_are_not_retried(monkeypatch):
+    monkeypatch.setattr(openai_service, "_semaphore", None)
+    calls = []
+
+    async def operation():
+        calls.append(1)
+        raise status_error(openai.BadRequestError, 400)
+
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(openai_service.with_retries(operation))
+    assert len(calls) == 1
+
+
+@pytest.mark.unit
+def test_token_bucket_allows_burst_then_paces():
+    bucket = openai_service.TokenBucket(rate=50, capacity=2)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(4):
+            await bucket.acquire()
+        return loop.time() - start
+
+    elapsed = asyncio.run(scenario())
+    assert 0.03 <= elapsed < 0.5
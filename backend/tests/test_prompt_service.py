@@ -0,0 +1,26 @@
+import pytest
+
+from app.services.prompt_service import PromptTemplate, get_template, register_template
+
+
+@pytest.mark.unit
+def test_render_keeps_static_prefix_and_fills_defaults():
+    template = get_template("constraint-parsing")
+    system, first = template.render({"studentName": "张三", "campus": "", "nlText": "周末下午"})
+    other_system, second = template.render({"studentName": "李四", "nlText": None})
+
+    assert system == other_system == template.system
+    assert first.endswith("周末下午\n---")
+    assert "Campus: 未知校区" in first
+    assert "{nlText}" not in second and "无约束" in second
+    assert first.split("Student:")[0] == second.split("Student:")[0]
+
+
+@pytest.mark.unit
+def test_get_template_resolves_latest_or_exact_version():
+    register_template(PromptTemplate(id="test-template", version=1, system="S1", user="{x}", defaults={"x": "-"}))
+    register_template(PromptTemplate(id="test-template", version=2, system="S2", user="{x}", defaults={"x": "-"}))
+
+    assert get_template("test-template").system == "S2"
+    assert get_template("test-template@1").system == "S1"
+    assert get_template("missing") is None
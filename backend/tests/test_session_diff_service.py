@@ -0,0 +1,62 @@
+import pytest
+
+from app.services.session_diff_service import SessionDiff, kpi_delta
+
+
+def _course(i, **overrides):
+    course = {
+        "_id": f"c{i}",
+        "studentId": "s1", "studentName": "小明",
+        "teacherId": "t1", "teacherName": "王老师",
+        "classroomId": "r1", "classroomName": "A101",
+        "subject": "数学", "day": 1, "startSlot": i * 12, "duration": 12,
+        "status": "scheduled",
+    }
+    course.update(overrides)
+    return course
+
+
+def _diff(base, target):
+    diff = SessionDiff()
+    for course in base:
+        diff.add_base(course)
+    for course in target:
+        diff.add_target(course)
+    return diff.result()
+
+
+@pytest.mark.unit
+def test_diff_classifies_changes_by_join_key():
+    base = [_course(0), _course(1), _course(2, studentId="s2", studentName="小红")]
+    target = [
+        _course(0),                                     # unchanged
+        _course(1, day=3),                              # same key, new slot -> moved
+        _course(5, teacherId="t2", teacherName="李老师"),  # new key -> added
+    ]
+    result = _diff(base, target)
+
+    assert result["summary"] == {"added": 1, "removed": 1, "moved": 1, "unchanged": 1}
+    assert result["moved"][0]["from"]["day"] == 1 and result["moved"][0]["to"]["day"] == 3
+    assert result["removed"][0]["studentId"] == "s2"
+    by_student = {row["studentId"]: row for row in result["students"]}
+    assert by_student["s1"] == {
+        "studentId": "s1", "studentName": "小明", "added": 1, "removed": 0, "moved": 1,
+    }
+
+
+@pytest.mark.unit
+def test_duplicate_placements_match_one_to_one():
+    result = _diff([_course(0), _course(0)], [_course(0)])
+    assert result["summary"] == {"added": 0, "removed": 1, "moved": 0, "unchanged": 1}
+
+
+@pytest.mark.unit
+def test_kpis_and_delta():
+    base = [_course(0), _course(1, status="unscheduled"), _course(2, isVirtual=True)]
+    target = [_course(0), _course(1, teacherId="t2", duration=36)]
+    kpis = _diff(base, target)["kpis"]
+
+    assert kpis["base"]["courses"] == 2
+    assert kpis["base"]["scheduledRate"] == 0.5
+    assert kpis["target"]["teacherHoursSpread"] == 2.0
+    assert kpi_delta(kpis["base"], kpis["target"])["scheduledRate"] == 0.5
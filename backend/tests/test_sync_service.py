@@ -0,0 +1,84 @@
+import pytest
+from bson import ObjectId
+from pymongo import DeleteMany, InsertOne, UpdateOne
+
+from app.services.sync_service import SYNC_COLLECTIONS, plan_sync
+
+STUDENTS = SYNC_COLLECTIONS["students"]
+
+
+def _stored(name, version=1, **extra):
+    doc = {"_id": ObjectId(), "userId": "u1", "name": name, "color": "#fff", "version": version}
+    doc.update(STUDENTS.model(name=name, color="#fff").model_dump())
+    doc.update(extra)
+    return doc
+
+
+@pytest.mark.unit
+def test_plan_sync_inserts_updates_deletes_and_skips_unchanged():
+    keep, edit, drop = _stored("甲"), _stored("乙", version=3), _stored("丙")
+    items = [
+        {"id": str(keep["_id"]), "name": "甲", "color": "#fff", "version": 1},
+        {"id": str(edit["_id"]), "name": "乙", "color": "#000", "version": 3},
+        {"id": "student-1", "name": "丁", "color": "#fff"},
+    ]
+
+    plan = plan_sync(STUDENTS, "u1", items, [keep, edit, drop], delete_missing=True)
+
+    assert (plan.inserted, plan.updated, plan.deleted, plan.unchanged) == (1, 1, 1, 1)
+    ops = {type(op): op for op in plan.operations}
+    insert, update, delete = ops[InsertOne], ops[UpdateOne], ops[DeleteMany]
+    assert insert._doc["clientId"] == "student-1"
+    assert plan.id_map == {"student-1": str(insert._doc["_id"])}
+    assert update._filter["version"] == 3
+    assert update._doc["$set"]["color"] == "#000"
+    assert "name" not in update._doc["$set"]
+    assert delete._filter["_id"] == {"$in": [drop["_id"]]}
+
+
+@pytest.mark.unit
+def test_plan_sync_matches_previously_inserted_client_id():
+    stored = _stored("甲", clientId="student-1")
+    plan = plan_sync(STUDENTS, "u1", [{"id": "student-1", "name": "甲", "color": "#fff"}], [stored])
+    assert plan.inserted == 0
+    assert plan.unchanged == 1
+    assert plan.id_map == {"student-1": str(stored["_id"])}
+
+
+@pytest.mark.unit
+def test_plan_sync_maps_unknown_object_ids_to_the_new_record():
+    stale_id = str(ObjectId())
+    plan = plan_sync(STUDENTS, "u1", [{"id": stale_id, "name": "甲", "color": "#fff"}], [])
+    insert = plan.operations[0]
+    assert insert._doc["clientId"] == stale_id
+    assert plan.id_map == {stale_id: str(insert._doc["_id"])}
+
+
+@pytest.mark.unit
+def test_plan_sync_reports_stale_versions_as_conflicts():
+    stored = _stored("甲", version=5)
+    plan = plan_sync(STUDENTS, "u1", [{"id": str(stored["_id"]), "name": "乙", "color": "#fff", "version": 4}], [stored])
+    assert plan.conflicts == [str(stored["_id"])]
+    assert plan.operations == []
+
+
+@pytest.mark.unit
+def test_plan_sync_validation_errors_block_deletes():
+    stored = _stored("甲")
+    plan = plan_sync(STUDENTS, "u1", [{"id": "student-1", "color": "#fff"}], [stored], delete_missing=True)
+    assert plan.errors and plan.errors[0]["index"] == 0
+    assert not any(isinstance(op, DeleteMany) for op in plan.operations)
+
+
+@pytest.mark.unit
+def test_plan_sync_collects_refs_of_deleted_documents():
+    stored = _stored("甲", clientId="student-1")
+    plan = plan_sync(STUDENTS, "u1", [], [stored], delete_missing=True)
+    assert plan.deleted_refs == [str(stored["_id"]), "student-1"]
+
+
+@pytest.mark.unit
+def test_plan_sync_keeps_missing_documents_by_default():
+    plan = plan_sync(STUDENTS, "u1", [], [_stored("甲")])
+    assert plan.deleted == 0
+    assert plan.operations == []
@@ -0,0 +1,52 @@
+import pytest
+
+from app.services.teacher_hours_service import (
+    rollup_teacher_hours, weekday_occurrences, report_table
+)
+
+ROWS = [
+    {"teacherId": "t1", "teacherName": "王老师", "day": 1, "campus": "新宿",
+     "courses": 2, "slots": 48, "confirmedSlots": 24},
+    {"teacherId": "t1", "teacherName": "王老师", "day": 7, "campus": "池袋",
+     "courses": 1, "slots": 12, "confirmedSlots": 0},
+    {"teacherId": "t2", "teacherName": "李老师", "day": 3, "campus": "新宿",
+     "courses": 1, "slots": 18, "confirmedSlots": 18},
+]
+
+
+@pytest.mark.unit
+def test_weekday_occurrences():
+    # 2026-03 starts on a Sunday and has 31 days
+    counts = weekday_occurrences("2026-03")
+    assert counts[7] == 5
+    assert counts[1] == 5
+    assert counts[3] == 4
+    assert sum(counts.values()) == 31
+
+
+@pytest.mark.unit
+def test_rollup_by_week_and_campus():
+    week = {r["teacherId"]: r for r in rollup_teacher_hours(ROWS, "week")}
+    assert week["t1"]["hours"] == 5
+    assert week["t1"]["courses"] == 3
+
+    campus = rollup_teacher_hours(ROWS, "campus", confirmed_only=True)
+    assert [(r["teacherId"], r["campus"], r["hours"]) for r in campus] == [
+        ("t2", "新宿", 1.5),
+        ("t1", "新宿", 2),
+    ]
+
+
+@pytest.mark.unit
+def test_rollup_by_month_expands_weekly_schedule():
+    report = {r["teacherId"]: r for r in rollup_teacher_hours(ROWS, "month", month="2026-03")}
+    # Monday 4h x 5 + Sunday 1h x 5
+    assert report["t1"]["hours"] == 25
+    assert report["t2"]["hours"] == 6
+
+
+@pytest.mark.unit
+def test_report_table_labels_weekdays():
+    header, rows = report_table(rollup_teacher_hours(ROWS, "day"), "day")
+    assert header[2] == "星期"
+    assert ["t1", "王老师", "周一", 2, 4.0] in rows
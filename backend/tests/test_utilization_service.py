@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from app.services.utilization_service import (
+    WEEK_SLOTS, compute_utilization, occupancy_matrix
+)
+
+
+def _course(**overrides):
+    course = {
+        "day": 1, "startSlot": 0, "duration": 12,
+        "teacherId": "t1", "teacherName": "王老师",
+        "classroomId": "r1", "classroomName": "A101", "campus": "新宿",
+    }
+    course.update(overrides)
+    return course
+
+
+@pytest.mark.unit
+def test_occupancy_matrix_merges_overlaps_and_clips_to_day():
+    occupancy = occupancy_matrix(
+        keys=np.array([0, 0, 0]),
+        days=np.array([1, 1, 7]),
+        starts=np.array([0, 6, 145]),
+        durations=np.array([12, 12, 20]),
+        n_keys=1,
+    )
+    # 0-18 on Monday plus the last 5 slots of Sunday
+    assert occupancy.sum() == 18 + 5
+    assert occupancy[0, -1]
+
+
+@pytest.mark.unit
+def test_compute_utilization_sections():
+    courses = [
+        _course(),
+        _course(day=2, teacherId="t2", teacherName="李老师"),
+        _course(classroomId="", classroomName="", campus=None),
+    ]
+    summary = compute_utilization(courses, classrooms=[{"_id": "r2", "name": "B201"}])
+
+    rooms = {r["id"]: r for r in summary["classrooms"]}
+    assert rooms["r1"]["occupiedSlots"] == 24
+    assert rooms["r2"]["occupiedSlots"] == 0
+
+    teachers = {t["id"]: t for t in summary["teachers"]}
+    assert teachers["t1"]["occupiedSlots"] == 12
+    assert teachers["t1"]["ratio"] == round(12 / WEEK_SLOTS, 4)
+
+    assert summary["campuses"] == [{
+        "campus": "新宿", "classrooms": 1, "occupiedSlots": 24,
+        "ratio": round(24 / WEEK_SLOTS, 4),
+    }]
+
+    nine_am = summary["hourOfDay"][0]
+    assert nine_am["hour"] == 9
+    # r1 busy 2 of 7 days in the 9:00 bucket, r2 idle
+    assert nine_am["classroomRatio"] == round(24 / (2 * 7 * 12), 4)
+    assert summary["hourOfDay"][-1]["hour"] == 21
+
+
+@pytest.mark.unit
+def test_compute_utilization_empty_session():
+    summary = compute_utilization([])
+    assert summary["classrooms"] == []
+    assert all(h["classroomRatio"] == 0 for h in summary["hourOfDay"])
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from app.services.versioning_service import VersionConflictError, update_versioned
+
+
+class FakeCollection:
+    """Single-document stand-in for the two motor calls update_versioned makes"""
+
+    def __init__(self, doc):
+        self.doc = doc
+
+    def _matches(self, query):
+        version = query.get("version")
+        if isinstance(version, dict):
+            return self.doc.get("version") in version["$in"]
+        return version is None or self.doc.get("version") == version
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        if not self._matches(query):
+            return None
+        self.doc.update(update["$set"])
+        for key, amount in update.get("$inc", {}).items():
+            self.doc[key] = self.doc.get(key, 0) + amount
+        return dict(self.doc)
+
+    async def find_one(self, query, projection=None):
+        return dict(self.doc)
+
+
+@pytest.mark.unit
+def test_legacy_document_without_version_accepts_if_match_1():
+    legacy = FakeCollection({"_id": ObjectId(), "userId": "u1", "name": "甲"})
+
+    updated = asyncio.run(update_versioned(legacy, legacy.doc["_id"], "u1", {"name": "乙"}, expected_version=1))
+    assert updated["name"] == "乙"
+    assert updated["version"] == 2
+
+    with pytest.raises(VersionConflictError):
+        asyncio.run(update_versioned(legacy, legacy.doc["_id"], "u1", {"name": "丙"}, expected_version=1))
@@ -47,6 +47,7 @@ import {
   countersStorage,
   adjustmentHistoryStorage,
   clearAllLocalStorage,
+  applySyncVersions,
 } from '../services/databaseService'; // 🔥 使用MongoDB后端API
 import './Experiment3.css';
 
@@ -1716,9 +1717,11 @@ const Experiment3 = () => {
     if (!isDataLoaded) return; // 只在数据加载完成后才保存
     
     const saveTimer = setTimeout(() => {
-      studentsStorage.save(students).catch(err => 
-        console.error('[Experiment3] Error saving students:', err)
-      );
+      studentsStorage.save(students)
+        .then(result => setStudents(prev => applySyncVersions(prev, result)))
+        .catch(err =>
+          console.error('[Experiment3] Error saving students:', err)
+        );
     }, 1000); // 1秒防抖
     
     // Sync with ScheduleContext
@@ -1731,9 +1734,11 @@ const Experiment3 = () => {
     if (!isDataLoaded) return;
     
     const saveTimer = setTimeout(() => {
-      teachersStorage.save(teachers).catch(err =>
-        console.error('[Experiment3] Error saving teachers:', err)
-      );
+      teachersStorage.save(teachers)
+        .then(result => setTeachers(prev => applySyncVersions(prev, result)))
+        .catch(err =>
+          console.error('[Experiment3] Error saving teachers:', err)
+        );
     }, 1000);
     
     // Sync with ScheduleContext
@@ -6,8 +6,6 @@
  * 将自然语言时间偏好转换为结构化约束
  */
 
-import { SYSTEM_PROMPT, USER_PROMPT_TEMPLATE } from '../prompts/constraintParsingPrompt';
-import { NEW_SYSTEM_PROMPT, generateUserPrompt as generateNewUserPrompt } from '../prompts/newConstraintParsingPrompt';
 import { validateConstraint, createDefaultConstraint } from '../constraints/newConstraintTypes';
 
 class OpenAIConstraintParser {
@@ -19,6 +17,7 @@ class OpenAIConstraintParser {
     // Use backend proxy instead of direct OpenAI API call
     const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000';
     this.baseURL = `${apiUrl}/ai/openai/parse-constraint`;  // Corrected path
+    this.batchURL = `${apiUrl}/ai/openai/parse-constraints/batch`;
     
     this.model = 'gpt-4o-mini'; // Cost-effective for batch processing
     this.temperature = 0; // Consistency is important
@@ -44,116 +43,133 @@ class OpenAIConstraintParser {
    * @returns {Promise<Object>} Parsed constraint object
    */
   async parseStudentConstraints(studentData) {
-    if (this.useNewSystem) {
-      return this.parseStudentConstraintsNew(studentData);
-    }
-    
-    // Legacy system
-    const userPrompt = USER_PROMPT_TEMPLATE
-      .replace('{studentName}', studentData.studentName || '未知学生')
-      .replace('{campus}', studentData.campus || '未知校区')
-      .replace('{nlText}', studentData.combinedText || '无约束');
-
     try {
-      const response = await this.callOpenAI(userPrompt);
-      const parsed = this.extractJSON(response);
-      
-      return {
-        ...parsed,
-        studentName: studentData.studentName,
-        campus: studentData.campus,
-        originalText: studentData.combinedText,
-        success: true,
-        error: null
-      };
+      const response = await this.callOpenAI({
+        template_id: this.templateId(),
+        variables: this.templateVariables(studentData),
+      });
+      return this.resultFromContent(studentData, response);
     } catch (error) {
-      console.error(`Error parsing constraints for ${studentData.studentName}:`, error);
-      return {
-        studentName: studentData.studentName,
-        campus: studentData.campus,
-        originalText: studentData.combinedText,
-        success: false,
-        error: error.message,
-        confidence: 0,
-        allowedDays: [0, 1, 2, 3, 4, 5, 6], // Default: all days
-        allowedTimeRanges: [],
-        excludedTimeRanges: [],
-        strictness: 'flexible'
-      };
+      console.error(`❌ Error parsing constraints for ${studentData.studentName}:`, error);
+      return this.failureResult(studentData, error);
     }
   }
 
   /**
-   * Parse student constraints using new 10-type system
-   * 使用新的10类约束系统解析学生约束
+   * Server-side prompt template for the active constraint system
+   * 当前约束系统对应的服务端提示词模板（提示词保存在后端 app/prompts/）
+   */
+  templateId() {
+    return this.useNewSystem ? 'constraint-types' : 'constraint-parsing';
+  }
+
+  /**
+   * Template variables for one student
+   * 单个学生的模板变量
+   */
+  templateVariables(studentData) {
+    return {
+      studentName: studentData.studentName,
+      campus: studentData.campus,
+      nlText: studentData.combinedText,
+    };
+  }
+
+  /**
+   * Turn a model response into the parsed result for one student
+   * 将模型返回内容转换为单个学生的解析结果
    * 
    * @param {Object} studentData
-   * @returns {Promise<Object>}
+   * @param {string} content - JSON content returned by the model
+   * @returns {Object}
    */
-  async parseStudentConstraintsNew(studentData) {
-    const userPrompt = generateNewUserPrompt(studentData);
-
-    try {
-      const response = await this.callOpenAI(userPrompt, NEW_SYSTEM_PROMPT);
-      const parsed = this.extractJSON(response);
-      
-      // Validate each constraint
-      const validatedConstraints = [];
-      const invalidConstraints = [];
-      
-      for (const constraint of (parsed.constraints || [])) {
-        const validation = validateConstraint(constraint);
-        if (validation.valid) {
-          validatedConstraints.push(constraint);
-        } else {
-          invalidConstraints.push({
-            constraint,
-            errors: validation.errors
-          });
-        }
-      }
-      
-      // If confidence is too low or too many errors, use inferred defaults
-      const avgConfidence = validatedConstraints.length > 0
-        ? validatedConstraints.reduce((sum, c) => sum + (c.confidence || 0), 0) / validatedConstraints.length
-        : 0;
-      
-      if (avgConfidence < 0.5 || invalidConstraints.length > validatedConstraints.length) {
-        console.warn(`⚠️ Low confidence (${avgConfidence.toFixed(2)}) or many errors for ${studentData.studentName}, using inferred defaults`);
-        const inferredConstraints = this.inferDefaultConstraints(studentData);
-        validatedConstraints.push(...inferredConstraints);
-      }
-      
+  resultFromContent(studentData, content) {
+    const parsed = this.extractJSON(content);
+    
+    if (!this.useNewSystem) {
       return {
+        ...parsed,
         studentName: studentData.studentName,
         campus: studentData.campus,
         originalText: studentData.combinedText,
-        constraints: validatedConstraints,
-        inferredDefaults: parsed.inferredDefaults || {},
-        invalidConstraints,
         success: true,
-        error: null,
-        avgConfidence
+        error: null
       };
-    } catch (error) {
-      console.error(`❌ Error parsing constraints for ${studentData.studentName}:`, error);
-      
-      // Fallback: use inferred default constraints
+    }
+    
+    // Validate each constraint
+    const validatedConstraints = [];
+    const invalidConstraints = [];
+    
+    for (const constraint of (parsed.constraints || [])) {
+      const validation = validateConstraint(constraint);
+      if (validation.valid) {
+        validatedConstraints.push(constraint);
+      } else {
+        invalidConstraints.push({
+          constraint,
+          errors: validation.errors
+        });
+      }
+    }
+    
+    // If confidence is too low or too many errors, use inferred defaults
+    const avgConfidence = validatedConstraints.length > 0
+      ? validatedConstraints.reduce((sum, c) => sum + (c.confidence || 0), 0) / validatedConstraints.length
+      : 0;
+    
+    if (avgConfidence < 0.5 || invalidConstraints.length > validatedConstraints.length) {
+      console.warn(`⚠️ Low confidence (${avgConfidence.toFixed(2)}) or many errors for ${studentData.studentName}, using inferred defaults`);
       const inferredConstraints = this.inferDefaultConstraints(studentData);
-      
+      validatedConstraints.push(...inferredConstraints);
+    }
+    
+    return {
+      studentName: studentData.studentName,
+      campus: studentData.campus,
+      originalText: studentData.combinedText,
+      constraints: validatedConstraints,
+      inferredDefaults: parsed.inferredDefaults || {},
+      invalidConstraints,
+      success: true,
+      error: null,
+      avgConfidence
+    };
+  }
+
+  /**
+   * Fallback result when parsing failed
+   * 解析失败时的默认结果
+   */
+  failureResult(studentData, error) {
+    if (!this.useNewSystem) {
       return {
         studentName: studentData.studentName,
         campus: studentData.campus,
         originalText: studentData.combinedText,
-        constraints: inferredConstraints,
-        inferredDefaults: {
-          rationale: 'AI解析失败，使用默认约束（最大自由度）'
-        },
         success: false,
         error: error.message,
-        avgConfidence: 0.3
+        confidence: 0,
+        allowedDays: [0, 1, 2, 3, 4, 5, 6], // Default: all days
+        allowedTimeRanges: [],
+        excludedTimeRanges: [],
+        strictness: 'flexible'
       };
     }
+    
+    // Fallback: use inferred default constraints
+    return {
+      studentName: studentData.studentName,
+      campus: studentData.campus,
+      originalText: studentData.combinedText,
+      constraints: this.inferDefaultConstraints(studentData),
+      inferredDefaults: {
+        rationale: 'AI解析失败，使用默认约束（最大自由度）'
+      },
+      success: false,
+      error: error.message,
+      avgConfidence: 0.3
+    };
   }
 
   /**
@@ -187,48 +203,91 @@ class OpenAIConstraintParser {
    * @returns {Promise<Array<Object>>} Array of parsed constraints
    */
   async batchParse(students, onProgress = null) {
-    const results = [];
-    const batchSize = 5; // Process 5 at a time to avoid rate limits
+    // One request for the whole roster; the backend dedupes identical texts,
+    // bounds concurrency and streams NDJSON lines as each student finishes
+    const response = await fetch(this.batchURL, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        // Batch parsing spends the server's OpenAI key, so it requires a login
+        Authorization: `Bearer ${localStorage.getItem('auth_token')}`,
+      },
+      body: JSON.stringify({
+        items: students.map((student, index) => ({
+          id: String(index),
+          text: student.combinedText || '',
+          student_name: student.studentName,
+          campus: student.campus,
+        })),
+        template_id: this.templateId(),
+        model: this.model,
+        temperature: this.temperature
+      })
+    });
     
-    for (let i = 0; i < students.length; i += batchSize) {
-      const batch = students.slice(i, i + batchSize);
-      
-      // Process batch in parallel
-      const batchPromises = batch.map(student => 
-        this.parseStudentConstraints(student)
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(
+        `Backend API error: ${response.status} - ${errorData.detail?.message || errorData.detail || response.statusText}`
       );
-      
-      const batchResults = await Promise.all(batchPromises);
-      results.push(...batchResults);
-      
-      // Report progress
-      if (onProgress) {
-        onProgress(Math.min(i + batchSize, students.length), students.length);
+    }
+    
+    const results = new Array(students.length);
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let completed = 0;
+    
+    const handleLine = (line) => {
+      const message = JSON.parse(line);
+      if (message.type === 'done') {
+        console.log(`OpenAI batch: ${message.unique} unique of ${message.total}, ${message.cached} cached, ${message.totalTokens} tokens`);
+        return;
       }
-      
-      // Delay between batches to avoid rate limiting
-      if (i + batchSize < students.length) {
-        await this.delay(1000);
+      const student = students[message.index];
+      if (message.type === 'result') {
+        try {
+          results[message.index] = this.resultFromContent(student, message.content);
+        } catch (error) {
+          results[message.index] = this.failureResult(student, error);
+        }
+      } else {
+        results[message.index] = this.failureResult(student, new Error(message.message));
+      }
+      completed += 1;
+      if (onProgress) {
+        onProgress(completed, students.length);
       }
+    };
+    
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      lines.filter(Boolean).forEach(handleLine);
+    }
+    if (buffer.trim()) {
+      handleLine(buffer);
     }
     
-    return results;
+    // Students the stream never reported (e.g. connection dropped)
+    return results.map((result, index) =>
+      result || this.failureResult(students[index], new Error('No result returned'))
+    );
   }
 
   /**
    * Call OpenAI API via backend proxy with retry logic
    * 通过后端代理调用OpenAI API（带重试逻辑）
    * 
-   * @param {string} userPrompt - User prompt
-   * @param {string} [systemPrompt] - System prompt (optional, uses default based on useNewSystem flag)
+   * @param {Object} prompt - { template_id, variables } or { system_prompt, user_prompt }
    * @param {number} retryCount - Current retry attempt
    * @returns {Promise<string>} API response content
    */
-  async callOpenAI(userPrompt, systemPrompt = null, retryCount = 0) {
+  async callOpenAI(prompt, retryCount = 0) {
     try {
-      // Determine which system prompt to use
-      const effectiveSystemPrompt = systemPrompt || (this.useNewSystem ? NEW_SYSTEM_PROMPT : SYSTEM_PROMPT);
-      
       // Call backend proxy instead of OpenAI directly
       const response = await fetch(this.baseURL, {
         method: 'POST',
@@ -237,8 +296,7 @@ class OpenAIConstraintParser {
           // No Authorization header needed - backend handles OpenAI API key
         },
         body: JSON.stringify({
-          system_prompt: effectiveSystemPrompt,
-          user_prompt: userPrompt,
+          ...prompt,
           model: this.model,
           temperature: this.temperature
         })
@@ -289,7 +347,7 @@ class OpenAIConstraintParser {
         const delay = this.retryDelay * Math.pow(2, retryCount);
         console.warn(`Retrying OpenAI call (${retryCount + 1}/${this.maxRetries}) after ${delay}ms...`);
         await this.delay(delay);
-        return this.callOpenAI(userPrompt, retryCount + 1);
+        return this.callOpenAI(prompt, retryCount + 1);
       }
       
       throw error;
@@ -345,7 +403,10 @@ class OpenAIConstraintParser {
   async testConnection() {
     try {
       const testPrompt = '测试连接：请返回 {"status": "ok", "confidence": 1.0}';
-      const response = await this.callOpenAI(testPrompt);
+      const response = await this.callOpenAI({
+        template_id: this.templateId(),
+        variables: { nlText: testPrompt },
+      });
       const parsed = JSON.parse(response);
       return parsed.status === 'ok';
     } catch (error) {
@@ -6,8 +6,6 @@
  * 将自然语言时间偏好转换为结构化约束
  */
 
-import { SYSTEM_PROMPT, USER_PROMPT_TEMPLATE } from '../prompts/constraintParsingPrompt';
-
 class OpenAIConstraintParser {
   constructor(apiKey) {
     // ⚠️ Note: API key is now managed by backend proxy
@@ -38,13 +36,16 @@ class OpenAIConstraintParser {
    * @returns {Promise<Object>} Parsed constraint object
    */
   async parseStudentConstraints(studentData) {
-    const userPrompt = USER_PROMPT_TEMPLATE
-      .replace('{studentName}', studentData.studentName || '未知学生')
-      .replace('{campus}', studentData.campus || '未知校区')
-      .replace('{nlText}', studentData.combinedText || '无约束');
-
     try {
-      const response = await this.callOpenAI(userPrompt);
+      // Prompt text lives on the server (template "constraint-parsing")
+      const response = await this.callOpenAI({
+        template_id: 'constraint-parsing',
+        variables: {
+          studentName: studentData.studentName,
+          campus: studentData.campus,
+          nlText: studentData.combinedText,
+        },
+      });
       const parsed = this.extractJSON(response);
       
       return {
@@ -113,11 +114,11 @@ class OpenAIConstraintParser {
    * Call OpenAI API via backend proxy with retry logic
    * 通过后端代理调用OpenAI API（带重试逻辑）
    * 
-   * @param {string} userPrompt - User prompt
+   * @param {Object} prompt - { template_id, variables } or { system_prompt, user_prompt }
    * @param {number} retryCount - Current retry attempt
    * @returns {Promise<string>} API response content
    */
-  async callOpenAI(userPrompt, retryCount = 0) {
+  async callOpenAI(prompt, retryCount = 0) {
     try {
       // Call backend proxy instead of OpenAI directly
       const response = await fetch(this.baseURL, {
@@ -127,8 +128,7 @@ class OpenAIConstraintParser {
           // No Authorization header needed - backend handles OpenAI API key
         },
         body: JSON.stringify({
-          system_prompt: SYSTEM_PROMPT,
-          user_prompt: userPrompt,
+          ...prompt,
           model: this.model,
           temperature: this.temperature
         })
@@ -179,7 +179,7 @@ class OpenAIConstraintParser {
         const delay = this.retryDelay * Math.pow(2, retryCount);
         console.warn(`Retrying OpenAI call (${retryCount + 1}/${this.maxRetries}) after ${delay}ms...`);
         await this.delay(delay);
-        return this.callOpenAI(userPrompt, retryCount + 1);
+        return this.callOpenAI(prompt, retryCount + 1);
       }
       
       throw error;
@@ -235,7 +235,10 @@ class OpenAIConstraintParser {
   async testConnection() {
     try {
       const testPrompt = '测试连接：请返回 {"status": "ok", "confidence": 1.0}';
-      const response = await this.callOpenAI(testPrompt);
+      const response = await this.callOpenAI({
+        template_id: 'constraint-parsing',
+        variables: { nlText: testPrompt },
+      });
       const parsed = JSON.parse(response);
       return parsed.status === 'ok';
     } catch (error) {
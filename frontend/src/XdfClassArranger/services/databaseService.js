@@ -31,8 +31,9 @@ async function apiCall(endpoint, options = {}) {
     headers['Authorization'] = `Bearer ${token}`;
   }
   
+  const { withHeaders, ...fetchOptions } = options;
   const response = await fetch(`${API_BASE_URL}${endpoint}`, {
-    ...options,
+    ...fetchOptions,
     headers,
   });
   
@@ -53,9 +54,102 @@ async function apiCall(endpoint, options = {}) {
     return null;
   }
   
+  if (options.withHeaders) {
+    return { data: await response.json(), headers: response.headers };
+  }
+  
   return response.json();
 }
 
+/**
+ * 读取分页列表的全部数据
+ * 后端使用游标分页（limit 指定每页条数），下一页游标在 X-Next-Cursor 响应头中返回
+ */
+const PAGE_SIZE = 1000;
+
+async function apiCallAllPages(endpoint) {
+  const items = [];
+  const separator = endpoint.includes('?') ? '&' : '?';
+  let cursor = null;
+  
+  do {
+    const pageEndpoint = `${endpoint}${separator}limit=${PAGE_SIZE}` +
+      (cursor ? `&cursor=${encodeURIComponent(cursor)}` : '');
+    const { data, headers } = await apiCall(pageEndpoint, { withHeaders: true });
+    items.push(...data);
+    cursor = headers.get('X-Next-Cursor');
+  } while (cursor);
+  
+  return items;
+}
+
+/**
+ * 各集合中已同步到服务端的记录：本地ID -> 数据库ID（load / save 后更新）
+ * 保存时只删除本地同步过、之后又从列表中移除的记录；
+ * 其他人新建而本地列表里没有的记录不会被删除
+ */
+const syncedIds = { students: new Map(), teachers: new Map(), classrooms: new Map() };
+
+function rememberLoaded(collection, items) {
+  syncedIds[collection] = new Map(items.map(item => [item.id, item.id]));
+}
+
+/**
+ * 批量差异同步：提交完整列表，由服务端计算新增/更新并一次性写入
+ * 本地删除的记录先通过 batch-delete 显式删除（不使用 deleteMissing，
+ * 过期的列表不会删掉别人的数据）
+ * 返回 { inserted, updated, deleted, unchanged, conflicts, raced, idMap, versions }
+ */
+async function syncCollection(collection, items) {
+  const current = new Set(items.map(item => item.id));
+  const removed = [...syncedIds[collection]]
+    .filter(([clientId]) => !current.has(clientId))
+    .map(([, serverId]) => serverId);
+  if (removed.length > 0) {
+    await deleteEntities(collection, removed);
+  }
+
+  const result = await apiCall(`/api/scheduling/${collection}/sync`, {
+    method: 'POST',
+    body: JSON.stringify({ items }),
+  });
+  if (result.conflicts && result.conflicts.length > 0) {
+    console.warn(`[DatabaseService] ${result.conflicts.length} ${collection} skipped due to version conflicts`);
+  }
+  syncedIds[collection] = new Map(
+    items.filter(item => item.id).map(item => [item.id, result.idMap?.[item.id] || item.id])
+  );
+  return result;
+}
+
+/**
+ * 将同步结果中的版本号合并回本地列表，下次保存时携带最新 version
+ * 没有变化时返回原数组（不触发多余的保存）
+ */
+export function applySyncVersions(items, result) {
+  const versions = result?.versions || {};
+  const idMap = result?.idMap || {};
+  let changed = false;
+  const merged = items.map(item => {
+    const version = versions[idMap[item.id] || item.id];
+    if (version === undefined || version === item.version) return item;
+    changed = true;
+    return { ...item, version };
+  });
+  return changed ? merged : items;
+}
+
+/**
+ * 批量删除学生/教师/教室，服务端级联删除引用它们的课程与调整历史
+ * 返回 { deleted, deletedIds, coursesDeleted, adjustmentsDeleted }
+ */
+async function deleteEntities(collection, ids) {
+  return apiCall(`/api/scheduling/${collection}/batch-delete`, {
+    method: 'POST',
+    body: JSON.stringify({ ids }),
+  });
+}
+
 // ============================================================================
 // 学生数据服务 (Students Data Service)
 // ============================================================================
@@ -67,8 +161,9 @@ export const studentsStorage = {
   load: async () => {
     try {
       console.log('[DatabaseService] Loading students from MongoDB...');
-      const students = await apiCall('/api/scheduling/students');
+      const students = await apiCallAllPages('/api/scheduling/students');
       console.log(`[DatabaseService] Loaded ${students.length} students`);
+      rememberLoaded('students', students);
       return students;
     } catch (error) {
       console.error('[DatabaseService] Error loading students:', error);
@@ -83,15 +178,10 @@ export const studentsStorage = {
     try {
       console.log(`[DatabaseService] Saving ${students.length} students to MongoDB...`);
       
-      // 批量创建/更新
-      // 注意：这里采用简化策略 - 先删除所有旧数据，再批量创建
-      // 更复杂的实现可以做差异对比，只更新变化的数据
-      const updates = students.map(student => 
-        studentsStorage.saveOne(student)
-      );
-      
-      await Promise.all(updates);
-      console.log(`[DatabaseService] Saved ${students.length} students`);
+      // 服务端差异同步：一次请求完成新增/更新/删除
+      const result = await syncCollection('students', students);
+      console.log(`[DatabaseService] Saved ${students.length} students`, result);
+      return result;
     } catch (error) {
       console.error('[DatabaseService] Error saving students:', error);
       throw error;
@@ -113,9 +203,11 @@ export const studentsStorage = {
         return created;
       } else {
         // 已存在的学生，更新
-        const { id, createdAt, updatedAt, ...studentData } = student;
+        const { id, createdAt, updatedAt, version, ...studentData } = student;
+        // 乐观并发控制：版本不一致时后端返回 412
         const updated = await apiCall(`/api/scheduling/students/${id}`, {
           method: 'PUT',
+          headers: version ? { 'If-Match': `"${version}"` } : {},
           body: JSON.stringify(studentData),
         });
         return updated;
@@ -147,8 +239,9 @@ export const studentsStorage = {
   clear: async () => {
     try {
       const students = await studentsStorage.load();
-      const deletions = students.map(s => studentsStorage.deleteOne(s.id));
-      await Promise.all(deletions);
+      if (students.length > 0) {
+        await deleteEntities('students', students.map(s => s.id));
+      }
       console.log('[DatabaseService] Cleared all students');
     } catch (error) {
       console.error('[DatabaseService] Error clearing students:', error);
@@ -165,8 +258,9 @@ export const teachersStorage = {
   load: async () => {
     try {
       console.log('[DatabaseService] Loading teachers from MongoDB...');
-      const teachers = await apiCall('/api/scheduling/teachers');
+      const teachers = await apiCallAllPages('/api/scheduling/teachers');
       console.log(`[DatabaseService] Loaded ${teachers.length} teachers`);
+      rememberLoaded('teachers', teachers);
       return teachers;
     } catch (error) {
       console.error('[DatabaseService] Error loading teachers:', error);
@@ -177,9 +271,9 @@ export const teachersStorage = {
   save: async (teachers) => {
     try {
       console.log(`[DatabaseService] Saving ${teachers.length} teachers to MongoDB...`);
-      const updates = teachers.map(teacher => teachersStorage.saveOne(teacher));
-      await Promise.all(updates);
-      console.log(`[DatabaseService] Saved ${teachers.length} teachers`);
+      const result = await syncCollection('teachers', teachers);
+      console.log(`[DatabaseService] Saved ${teachers.length} teachers`, result);
+      return result;
     } catch (error) {
       console.error('[DatabaseService] Error saving teachers:', error);
       throw error;
@@ -196,9 +290,11 @@ export const teachersStorage = {
         });
         return created;
       } else {
-        const { id, createdAt, updatedAt, ...teacherData } = teacher;
+        const { id, createdAt, updatedAt, version, ...teacherData } = teacher;
+        // 乐观并发控制：版本不一致时后端返回 412
         const updated = await apiCall(`/api/scheduling/teachers/${id}`, {
           method: 'PUT',
+          headers: version ? { 'If-Match': `"${version}"` } : {},
           body: JSON.stringify(teacherData),
         });
         return updated;
@@ -224,8 +320,9 @@ export const teachersStorage = {
   clear: async () => {
     try {
       const teachers = await teachersStorage.load();
-      const deletions = teachers.map(t => teachersStorage.deleteOne(t.id));
-      await Promise.all(deletions);
+      if (teachers.length > 0) {
+        await deleteEntities('teachers', teachers.map(t => t.id));
+      }
       console.log('[DatabaseService] Cleared all teachers');
     } catch (error) {
       console.error('[DatabaseService] Error clearing teachers:', error);
@@ -242,8 +339,9 @@ export const classroomsStorage = {
   load: async () => {
     try {
       console.log('[DatabaseService] Loading classrooms from MongoDB...');
-      const classrooms = await apiCall('/api/scheduling/classrooms');
+      const classrooms = await apiCallAllPages('/api/scheduling/classrooms');
       console.log(`[DatabaseService] Loaded ${classrooms.length} classrooms`);
+      rememberLoaded('classrooms', classrooms);
       return classrooms;
     } catch (error) {
       console.error('[DatabaseService] Error loading classrooms:', error);
@@ -254,9 +352,9 @@ export const classroomsStorage = {
   save: async (classrooms) => {
     try {
       console.log(`[DatabaseService] Saving ${classrooms.length} classrooms to MongoDB...`);
-      const updates = classrooms.map(classroom => classroomsStorage.saveOne(classroom));
-      await Promise.all(updates);
-      console.log(`[DatabaseService] Saved ${classrooms.length} classrooms`);
+      const result = await syncCollection('classrooms', classrooms);
+      console.log(`[DatabaseService] Saved ${classrooms.length} classrooms`, result);
+      return result;
     } catch (error) {
       console.error('[DatabaseService] Error saving classrooms:', error);
       throw error;
@@ -299,8 +397,9 @@ export const classroomsStorage = {
   clear: async () => {
     try {
       const classrooms = await classroomsStorage.load();
-      const deletions = classrooms.map(c => classroomsStorage.deleteOne(c.id));
-      await Promise.all(deletions);
+      if (classrooms.length > 0) {
+        await deleteEntities('classrooms', classrooms.map(c => c.id));
+      }
       console.log('[DatabaseService] Cleared all classrooms');
     } catch (error) {
       console.error('[DatabaseService] Error clearing classrooms:', error);
@@ -309,6 +408,55 @@ export const classroomsStorage = {
   },
 };
 
+// ============================================================================
+// 导入服务 (Excel / CSV Import Service)
+// ============================================================================
+
+export const importStorage = {
+  /**
+   * 上传 Excel/CSV，由服务端流式导入学生/教师/教室
+   * kind 为 null 时按表头识别；onProgress 收到每批的 {rows, inserted, skipped}
+   * 返回最终报告 {kind, rows, inserted, skipped, errors, errorCount}
+   */
+  importFile: async (file, kind = null, onProgress = null) => {
+    const body = new FormData();
+    body.append('file', file);
+    const query = kind ? `?kind=${kind}` : '';
+    const token = getAuthToken();
+    const response = await fetch(`${API_BASE_URL}/api/scheduling/import${query}`, {
+      method: 'POST',
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+      body,
+    });
+    if (!response.ok) {
+      const error = await response.json().catch(() => ({ detail: 'Unknown error' }));
+      throw new Error(error.detail || `HTTP ${response.status}`);
+    }
+
+    // NDJSON：每行一个进度报告，最后一行 type === 'done'（中途读文件失败则为 'error'）
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let report = null;
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      for (const line of lines.filter(Boolean)) {
+        report = JSON.parse(line);
+        if (report.type === 'progress' && onProgress) onProgress(report);
+      }
+    }
+    if (report?.type === 'error') {
+      throw new Error(`${report.detail} (${report.inserted} rows imported before the error)`);
+    }
+    console.log(`[DatabaseService] Imported ${report?.inserted ?? 0} ${report?.kind}`);
+    return report;
+  },
+};
+
 // ============================================================================
 // 排课课程服务 (Scheduled Courses Service)
 // ============================================================================
@@ -320,7 +468,7 @@ export const scheduledCoursesStorage = {
       const endpoint = scheduleSessionId 
         ? `/api/scheduling/courses?schedule_session_id=${scheduleSessionId}`
         : '/api/scheduling/courses';
-      const courses = await apiCall(endpoint);
+      const courses = await apiCallAllPages(endpoint);
       console.log(`[DatabaseService] Loaded ${courses.length} courses`);
       return courses;
     } catch (error) {
@@ -351,6 +499,25 @@ export const scheduledCoursesStorage = {
     }
   },
 
+  /**
+   * 发布完整排课结果并原子替换当前活动会话
+   * 返回 { scheduleSessionId, previousSessionId, totalCoursesScheduled }
+   */
+  publish: async (courses, metadata = {}) => {
+    try {
+      const realCourses = courses.filter(course => !course.isVirtual && course.status !== 'unscheduled');
+      const result = await apiCall('/api/scheduling/sessions/publish', {
+        method: 'POST',
+        body: JSON.stringify({ courses: realCourses, ...metadata }),
+      });
+      console.log(`[DatabaseService] Published ${result.totalCoursesScheduled} courses (session: ${result.scheduleSessionId})`);
+      return result;
+    } catch (error) {
+      console.error('[DatabaseService] Error publishing courses:', error);
+      throw error;
+    }
+  },
+
   clear: async (scheduleSessionId = null) => {
     try {
       if (scheduleSessionId) {
@@ -367,6 +534,28 @@ export const scheduledCoursesStorage = {
       throw error;
     }
   },
+
+  /**
+   * 导出会话课表为 Blob（format: csv / xlsx / ics）
+   * options: { teacherId, studentId, weekStart: 'YYYY-MM-DD', weeks }
+   */
+  exportSession: async (scheduleSessionId, format = 'csv', options = {}) => {
+    const params = new URLSearchParams({ format });
+    if (options.teacherId) params.set('teacher_id', options.teacherId);
+    if (options.studentId) params.set('student_id', options.studentId);
+    if (options.weekStart) params.set('week_start', options.weekStart);
+    if (options.weeks) params.set('weeks', options.weeks);
+    const token = getAuthToken();
+    const response = await fetch(
+      `${API_BASE_URL}/api/scheduling/sessions/${scheduleSessionId}/export?${params}`,
+      { headers: token ? { Authorization: `Bearer ${token}` } : {} }
+    );
+    if (!response.ok) {
+      const error = await response.json().catch(() => ({ detail: 'Unknown error' }));
+      throw new Error(error.detail || `HTTP ${response.status}`);
+    }
+    return response.blob();
+  },
 };
 
 // ============================================================================
@@ -406,9 +595,8 @@ export const countersStorage = {
 
   incrementStudent: async () => {
     try {
-      const result = await apiCall('/api/scheduling/counters/increment', {
+      const result = await apiCall('/api/scheduling/counters/increment?counter_type=student', {
         method: 'POST',
-        body: JSON.stringify({ counter_type: 'student' }),
       });
       return result.studentCounter;
     } catch (error) {
@@ -419,9 +607,8 @@ export const countersStorage = {
 
   incrementTeacher: async () => {
     try {
-      const result = await apiCall('/api/scheduling/counters/increment', {
+      const result = await apiCall('/api/scheduling/counters/increment?counter_type=teacher', {
         method: 'POST',
-        body: JSON.stringify({ counter_type: 'teacher' }),
       });
       return result.teacherCounter;
     } catch (error) {
@@ -430,6 +617,15 @@ export const countersStorage = {
     }
   },
 
+  /**
+   * 一次预留 count 个连续计数器值，返回 {start, end, names}（区间为 [start, end)）
+   */
+  reserve: async (counterType, count) => {
+    return apiCall(`/api/scheduling/counters/reserve?counter_type=${counterType}&count=${count}`, {
+      method: 'POST',
+    });
+  },
+
   clear: async () => {
     console.log('[DatabaseService] Counters are user-scoped, no clear needed');
   },
@@ -478,11 +674,81 @@ export const adjustmentHistoryStorage = {
     }
   },
 
+  /**
+   * 批量追加调整记录（一次请求、一次插入）
+   */
+  addRecords: async (records, scheduleSessionId = null) => {
+    const query = scheduleSessionId ? `?schedule_session_id=${encodeURIComponent(scheduleSessionId)}` : '';
+    const result = await apiCall(`/api/scheduling/adjustments/batch${query}`, {
+      method: 'POST',
+      body: JSON.stringify(records),
+    });
+    console.log(`[DatabaseService] Added ${result.inserted} adjustment records`);
+    return result.events;
+  },
+
+  /**
+   * 撤销 / 重做 / 按时间点查询：服务端从最近快照重放，返回 {seq, position, lastSeq, state}
+   * state 结构: {targetType: {targetId: {field: value}}}
+   */
+  undo: async (scheduleSessionId = null) => {
+    const query = scheduleSessionId ? `?schedule_session_id=${encodeURIComponent(scheduleSessionId)}` : '';
+    return apiCall(`/api/scheduling/adjustments/undo${query}`, { method: 'POST' });
+  },
+
+  redo: async (scheduleSessionId = null) => {
+    const query = scheduleSessionId ? `?schedule_session_id=${encodeURIComponent(scheduleSessionId)}` : '';
+    return apiCall(`/api/scheduling/adjustments/redo${query}`, { method: 'POST' });
+  },
+
+  getState: async (scheduleSessionId = null, at = null) => {
+    const params = new URLSearchParams();
+    if (scheduleSessionId) params.set('schedule_session_id', scheduleSessionId);
+    if (at) params.set('at', new Date(at).toISOString());
+    const query = params.toString();
+    return apiCall(`/api/scheduling/adjustments/state${query ? `?${query}` : ''}`);
+  },
+
   clear: async () => {
     console.log('[DatabaseService] Adjustment history clear not implemented (use with caution)');
   },
 };
 
+// ============================================================================
+// 增量同步服务 (Delta Sync Service)
+// ============================================================================
+
+export const changesStorage = {
+  /**
+   * 获取水位之后的变更
+   * 返回 { watermark, reset, changes: {students, teachers, classrooms, courses, courseSessions}, deleted: {...} }
+   * reset 为 true 时需全量重新加载；下次调用传入返回的 watermark
+   * changes.courseSessions 为列式存储的会话（课程不单独列出），需按会话重新读取课程
+   */
+  since: async (watermark = null, collections = null) => {
+    const params = new URLSearchParams();
+    if (watermark !== null) params.set('since', watermark);
+    if (collections) params.set('collections', collections.join(','));
+    const query = params.toString();
+    return apiCall(`/api/scheduling/changes${query ? `?${query}` : ''}`);
+  },
+
+  /**
+   * 订阅实时变更推送（WebSocket）
+   * onMessage 收到 {type: 'hello'|'changes'|'resync', ...}；
+   * 推送只含变更ID，具体数据用 since(watermark) 拉取
+   * 返回取消订阅函数
+   */
+  subscribe: (onMessage) => {
+    const url = new URL('/api/scheduling/ws', API_BASE_URL.replace(/^http/, 'ws'));
+    url.searchParams.set('token', getAuthToken() || '');
+    const socket = new WebSocket(url);
+    socket.onmessage = (event) => onMessage(JSON.parse(event.data));
+    socket.onerror = (error) => console.error('[DatabaseService] Live updates error:', error);
+    return () => socket.close();
+  },
+};
+
 // ============================================================================
 // 其他存储（暂时保留在LocalStorage）
 // ============================================================================
@@ -595,9 +861,11 @@ export default {
   studentsStorage,
   teachersStorage,
   classroomsStorage,
+  importStorage,
   scheduledCoursesStorage,
   countersStorage,
   adjustmentHistoryStorage,
+  changesStorage,
   eventsStorage,
   aiResultStorage,
   schedulingMetadataStorage,